@@ -0,0 +1,40 @@
+# ================== access.py ==================
+import ast
+from file_utils import FileWatcher, write_atomic
+
+WHITELIST_FILE = "whitelist.py"
+
+
+def load_whitelist(path=WHITELIST_FILE):
+    try:
+        with open(path, "r") as f:
+            data = f.read().strip()
+    except FileNotFoundError:
+        return []
+    # Expecting something like: WHITELIST = [123, 456]
+    if data.startswith("WHITELIST"):
+        return list(ast.literal_eval(data.split("=", 1)[1].strip()))
+    return []
+
+
+def save_whitelist(wl, path=WHITELIST_FILE):
+    write_atomic(path, f"WHITELIST = {list(wl)}\n")
+
+
+class Whitelist:
+    """Authorized user IDs as an in-memory frozenset, reloaded when whitelist.py changes."""
+
+    def __init__(self, path=WHITELIST_FILE, interval=2):
+        self.watcher = FileWatcher(path, lambda p: frozenset(load_whitelist(p)), interval)
+
+    def __contains__(self, user_id):
+        return user_id in self.watcher.value
+
+    def __len__(self):
+        return len(self.watcher.value)
+
+    def start(self):
+        self.watcher.start()
+
+    async def stop(self):
+        await self.watcher.stop()
@@ -1,28 +1,11 @@
 # add_to_whitelist.py
-import ast
-
-WHITELIST_FILE = "whitelist.py"
-
-def load_whitelist():
-    try:
-        with open(WHITELIST_FILE, "r") as f:
-            data = f.read().strip()
-            # Expecting something like: WHITELIST = [123, 456]
-            if data.startswith("WHITELIST"):
-                wl = ast.literal_eval(data.split("=", 1)[1].strip())
-                return wl
-    except FileNotFoundError:
-        return []
-    return []
-
-def save_whitelist(wl):
-    with open(WHITELIST_FILE, "w") as f:
-        f.write(f"WHITELIST = {wl}\n")
+from access import load_whitelist, save_whitelist
 
 def add_user(user_id: int):
     wl = load_whitelist()
     if user_id not in wl:
         wl.append(user_id)
+        # Atomic replace: the running bot never reads a half-written file
         save_whitelist(wl)
         print(f"✅ User {user_id} added to whitelist.")
     else:
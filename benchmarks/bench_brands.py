@@ -0,0 +1,168 @@
+# ================== benchmarks/bench_brands.py ==================
+# BrandMatcher against the lookups handlers used to run per message: brand
+# correction with get_close_matches over a freshly lowered brands.txt, and
+# the substring scan that picked the brand to show. Checks that corrections
+# are identical, that tags only differ where the scan matched inside another
+# word, that brand-narrowed searches return the same rows, and that an edit
+# to brands.txt retags the cached index.
+#   python benchmarks/bench_brands.py [--rows 20000] [--queries 2000]
+import argparse
+import asyncio
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+from difflib import get_close_matches
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_lifecycle import StubSheet
+from brands import BRANDS_FILE, BrandMatcher, Brands, load_brands
+from catalogue import make_articles, make_queries
+from handlers import search_inventory
+from inventory_cache import InventoryCache
+from inventory_index import InventoryIndex
+from sheet import Article
+
+KEYWORDS = ["LCD", "BATTERIE", "CC", "GLASS", "COVER", "SERSOU"]
+# Accessories whose names contain a brand's letters but no brand
+EXTRA = [("Cover Silicone Blue", ""), ("Cover Algerie", ""), ("Sersou Flux Catalyseur", ""),
+         ("Cover Samsung A12 Blue", "samsung"), ("Lcd Iphone 11 Apple", "iphone"),
+         ("Lcd IPHONE11 PRO", "iphone"), ("Lcd REDMI9A", "redmi"), ("Batterie IPHONEX", "iphone"),
+         ("Cover Bluetooth Speaker", ""), ("Glass CONDORPLUME P8", "")]
+# (keyword, query, designation) handlers.search_inventory must find; the
+# last one is only tagged through its glued word, so the narrowed search is empty
+GLUED = [("lcd", "iphone", "Lcd IPHONE11 PRO"), ("lcd", "redmi9a", "Lcd REDMI9A"),
+         ("batterie", "iphonex", "Batterie IPHONEX"),
+         ("glass", "condor", "Glass CONDORPLUME P8")]
+
+
+def legacy_correct(word, known):
+    matched = get_close_matches(word, [b.lower() for b in known], n=1, cutoff=0.8)
+    return matched[0] if matched else None
+
+
+def legacy_tag(designation, known):
+    return next((b for b in known if b.lower() in designation.lower()), "")
+
+
+def words(known, n, seed=4):
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        brand = rng.choice(known).lower()
+        kind = rng.randrange(4)
+        if kind == 0:
+            out.append(brand)
+        elif kind == 1:
+            pos = rng.randrange(len(brand))
+            out.append(brand[:pos] + brand[pos + 1:])
+        elif kind == 2:
+            pos = rng.randrange(len(brand))
+            out.append(brand[:pos] + rng.choice(string.ascii_lowercase) + brand[pos + 1:])
+        else:
+            out.append("".join(rng.choice(string.ascii_lowercase + string.digits) for _ in range(rng.randint(1, 9))))
+    return out
+
+
+def timed(fn, items):
+    t0 = time.perf_counter()
+    result = [fn(item) for item in items]
+    return result, (time.perf_counter() - t0) / len(items)
+
+
+def corrected(query, matcher):
+    # What handle_model searches for
+    first = query.split()[0]
+    brand = matcher.correct(first)
+    return (query.replace(first, brand), brand) if brand else (query, None)
+
+
+async def hot_reload(rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "brands.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(load_brands(BRANDS_FILE)) + "\n")
+        brands = Brands(path)
+        cache = InventoryCache(StubSheet(rows + [Article("Cover Universal 6.5", 500.0, 3.0)]), KEYWORDS,
+                               check_interval=0, brands=brands)
+        index = (await cache.get()).index
+        i = index.find_ids("cover", "universal")[0]
+        before = index.brand(i)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("Universal\n")
+        brands.watcher.check()
+        await cache.get()
+        snapshot = await cache.refresh()
+        return (before == "" and snapshot.index is index and index.brand(i) == "universal"
+                and index.find_ids("cover", "universal 6.5", brand="universal") == [i]
+                and cache.stats["retags"] == 1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    known = load_brands(BRANDS_FILE)
+    t0 = time.perf_counter()
+    matcher = BrandMatcher(known)
+    build = time.perf_counter() - t0
+
+    # Query correction
+    sample = words(known, args.queries)
+    old, old_t = timed(lambda w: legacy_correct(w, known), sample)
+    new_cold, cold_t = timed(matcher.correct, sample)
+    new_warm, warm_t = timed(matcher.correct, sample)
+    print(f"{len(known)} brands, matcher built in {build * 1000:.2f} ms")
+    print(f"{'brand correction':<28}{'legacy us':>10}{'cold us':>10}{'warm us':>10}")
+    print(f"{'':<28}{old_t * 1e6:>10.1f}{cold_t * 1e6:>10.1f}{warm_t * 1e6:>10.1f}")
+
+    # Designation tags
+    rows = make_articles(args.rows) + [Article(name, 1000.0, 1.0) for name, _ in EXTRA]
+    names = [row.designation for row in rows]
+    old_tags, old_tag_t = timed(lambda name: legacy_tag(name, known).lower(), names)
+    t0 = time.perf_counter()
+    index = InventoryIndex(rows, KEYWORDS, brands=matcher)
+    index_t = time.perf_counter() - t0
+    new_tags, new_tag_t = timed(index.brand, range(len(rows)))
+    differ = [(name, a, b) for name, a, b in zip(names, old_tags, new_tags) if a != b]
+    print(f"{'brand tag per result':<28}{old_tag_t * 1e6:>10.1f}{new_tag_t * 1e6:>10.2f}"
+          f"   (index build {index_t * 1000:.0f} ms for {len(rows)} rows)")
+    for name, a, b in differ[:10]:
+        print(f"  {name!r}: scan {a!r}, tokens {b!r}")
+
+    # Brand-narrowed search
+    queries = [(KEYWORDS[i % len(KEYWORDS)].lower(), *corrected(q, matcher))
+               for i, (_, q) in enumerate(make_queries(rows, args.queries))]
+    plain, plain_t = timed(lambda q: index.find_ids(q[0], q[1]) or index.closest_id(q[0], q[1]), queries)
+    narrowed, narrowed_t = timed(lambda q: index.find_ids(q[0], q[1], brand=q[2])
+                                 or index.closest_id(q[0], q[1], brand=q[2]), queries)
+    branded = sum(q[2] is not None for q in queries)
+    print(f"{'search (find + fuzzy)':<28}{plain_t * 1e6:>10.1f}{narrowed_t * 1e6:>10.1f}"
+          f"   ({branded}/{len(queries)} queries with a known brand)")
+
+    glued = all(names.index(designation) in search_inventory(index, keyword, query)[1]
+                for keyword, query, designation in GLUED)
+
+    reloaded = asyncio.run(hot_reload(make_articles(500)))
+    checks = {
+        "corrections identical": old == new_cold == new_warm,
+        "tags differ only inside words": all(b == "" for _, _, b in differ) and len(differ) >= 3,
+        "crafted tags": all(index.brand(len(rows) - len(EXTRA) + k) == tag for k, (_, tag) in enumerate(EXTRA)),
+        "narrowed results identical": plain == narrowed,
+        "glued designations found": glued,
+        "brands.txt hot reload": reloaded,
+    }
+    for name, passed in checks.items():
+        print(f"  {name:<30}{'ok' if passed else 'FAILED'}")
+    ok = all(checks.values())
+    print("OK" if ok else "MISMATCH")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
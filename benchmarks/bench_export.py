@@ -0,0 +1,175 @@
+# ================== benchmarks/bench_export.py ==================
+# csvUPDATE.export_articles against a stub mdb-export, one path at a time:
+#   unchanged    same mtime, then touched with the same bytes: the exporter
+#                is not run again
+#   identical    the export gives the published CSV back: CSV and manifest
+#                stay as they are
+#   failed       the exporter exits non-zero halfway: the live CSV and
+#                manifest stay, the temp file is removed
+#   broken       the exporter writes bytes that don't decode and hangs: the
+#                error is raised at once and the child is killed
+# Reports the export time of a full catalogue for reference.
+#   python benchmarks/bench_export.py [--rows 20000]
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import csvUPDATE
+from catalogue import write_csv
+
+STUB_MDB_EXPORT = """#!{python}
+import os, sys, time
+mdb = sys.argv[1]
+with open(mdb + ".runs", "a") as f:
+    f.write(f"{{os.getpid()}}\\n")
+with open(mdb + ".mode") as f:
+    mode = f.read().strip()
+with open(mdb + ".src", "rb") as f:
+    data = f.read()
+out = sys.stdout.buffer
+if mode == "fail":
+    out.write(data[:len(data) // 2])
+    sys.stderr.write("mdb-export: table Article is corrupt\\n")
+    sys.exit(1)
+if mode == "broken":
+    out.write(data[:len(data) // 2] + b"\\xff\\xfe\\xfd\\n")
+    out.flush()
+    time.sleep(60)
+out.write(data)
+"""
+
+
+def mode(name):
+    with open("Detail.mdb.mode", "w") as f:
+        f.write(name)
+
+
+def runs():
+    try:
+        with open("Detail.mdb.runs") as f:
+            return [int(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def published():
+    # What a bot would read: the CSV's bytes and inode, and the manifest
+    with open(csvUPDATE.CSV_FILE, "rb") as f:
+        data = f.read()
+    with open(csvUPDATE.manifest_path(), encoding="utf-8") as f:
+        manifest = json.load(f)
+    return data, os.stat(csvUPDATE.CSV_FILE).st_ino, manifest
+
+
+def temp_files():
+    return glob.glob(".tmp-*")
+
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def touch_mdb(data=None):
+    # A new mtime, with new bytes when given
+    if data is not None:
+        with open("Detail.mdb", "w") as f:
+            f.write(data)
+    st = os.stat("Detail.mdb")
+    os.utime("Detail.mdb", ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+
+def run(rows):
+    write_csv("Detail.mdb.src", rows)
+    with open("Detail.mdb", "w") as f:
+        f.write("generation 1")
+    mode("ok")
+    checks = {}
+
+    t0 = time.perf_counter()
+    first = csvUPDATE.export_articles()
+    export_time = time.perf_counter() - t0
+    checks["first export publishes"] = first and len(runs()) == 1 and published()[2]["generation"] == 1
+
+    # Unchanged: same mtime, then a new mtime over the same bytes
+    before = published()
+    skipped = not csvUPDATE.export_articles()
+    touch_mdb()
+    skipped &= not csvUPDATE.export_articles()
+    after = published()
+    checks["unchanged mdb skips"] = (skipped and len(runs()) == 1 and after[:2] == before[:2]
+                                     and after[2]["generation"] == 1
+                                     and after[2]["mdb_stat"] == csvUPDATE.file_stat("Detail.mdb"))
+
+    # Identical: the database changed, the Article table did not
+    touch_mdb("generation 2")
+    before = published()
+    kept = not csvUPDATE.export_articles()
+    after = published()
+    checks["identical output kept"] = (kept and len(runs()) == 2 and after[:2] == before[:2]
+                                       and after[2]["generation"] == before[2]["generation"]
+                                       and after[2]["sha256"] == before[2]["sha256"]
+                                       and not os.path.exists(csvUPDATE.delta_path(2)) and not temp_files())
+
+    # Failed: non-zero exit after half the table
+    touch_mdb("generation 3")
+    mode("fail")
+    before = published()
+    failed = not csvUPDATE.export_articles()
+    checks["failed export keeps live CSV"] = (failed and len(runs()) == 3 and published() == before
+                                              and not temp_files())
+
+    # Broken: undecodable bytes, then the exporter hangs
+    touch_mdb("generation 4")
+    mode("broken")
+    before = published()
+    t0 = time.perf_counter()
+    try:
+        csvUPDATE.export_articles()
+        raised = False
+    except UnicodeDecodeError:
+        raised = True
+    broken_time = time.perf_counter() - t0
+    child = runs()[-1]
+    checks["broken stream kills child"] = (raised and broken_time < 30 and not alive(child)
+                                           and published() == before and not temp_files())
+    return checks, export_time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            stub = os.path.join(tmp, "stub-mdb-export")
+            with open(stub, "w") as f:
+                f.write(STUB_MDB_EXPORT.format(python=sys.executable))
+            os.chmod(stub, 0o755)
+            csvUPDATE.MDB_EXPORT = stub
+            checks, export_time = run(args.rows)
+        finally:
+            os.chdir(cwd)
+    print(f"{args.rows} articles exported in {export_time * 1000:.0f} ms")
+    print()
+    for name, passed in checks.items():
+        print(f"  {name:<30}{'ok' if passed else 'FAILED'}")
+    ok = all(checks.values())
+    print("OK" if ok else "MISMATCH")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
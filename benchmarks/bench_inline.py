@@ -0,0 +1,227 @@
+# ================== benchmarks/bench_inline.py ==================
+# Inline queries ("@bot lcd a52") through the real handler wiring
+# (bot.build_application() with a stub Bot API, as in bench_load). Users
+# type their queries one keystroke at a time, and every keystroke is an
+# inline query:
+#   uncached   no prefix cache, no debounce: every keystroke is searched
+#              and answered, each user waiting for the previous answer
+#   cached     the same with InlineSearch's per-prefix cache
+#   typing     cache and debounce, keystrokes 50-350 ms apart: only the
+#              queries a user pauses on are searched and answered
+# Reports sustained inline queries per second and answers per keystroke,
+# and checks every answer against a scan of the whole catalogue.
+#   python benchmarks/bench_inline.py [--rows 50000] [--users 50] [--queries 3]
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import Update
+from telegram.ext import ApplicationBuilder
+from telegram.warnings import PTBUserWarning
+
+from catalogue import BRAND_MODELS, make_queries, write_csv
+from fake_telegram import StubRequest, inline_update
+import handlers
+from bot import build_application
+from inline_search import MAX_RESULTS, PAGE_SIZE, Debouncer, InlineSearch, normalize
+from inventory_cache import InventoryCache
+from lifecycle import CallCounter
+from sheet import SheetHandler
+
+warnings.filterwarnings("ignore", category=PTBUserWarning)  # build_application's per_message note
+
+FIRST_USER = 5000
+
+
+def make_typing(rows, users, queries, seed=6):
+    """Per user, the texts they end up typing: a category word and a model, or just a model."""
+    rng = random.Random(seed)
+    models = [q for kind, q in make_queries(rows, users * queries * 2, seed=seed) if kind in ("exact", "multi")]
+    plans = []
+    for _ in range(users):
+        texts = []
+        for _ in range(queries):
+            model = rng.choice(models)
+            category = rng.choice(["lcd", "batterie", "glass", "cc", ""])
+            if rng.random() < 0.2:
+                brand = rng.choice(list(BRAND_MODELS)).lower()
+                model = f"{brand} {rng.choice(['zz9', 'pro max 99', 'nova 3'])}"
+            texts.append(f"{category} {model}".strip())
+        plans.append(texts)
+    return plans
+
+
+def expected_ids(index, keywords, query):
+    names, rows = index.names, index.rows
+    ids = [i for i, name in enumerate(names) if name and any(k in name for k in keywords) and query in name]
+    ids.sort(key=lambda i: (rows[i].qt <= 0, len(names[i]), i))
+    if not ids and len(keywords) == 1:
+        close = index.closest_id(keywords[0], query)
+        ids = [close] if close is not None else []
+    return ids
+
+
+def parse_text(index, text):
+    words = text.split(None, 1)
+    category = handlers.categories.find(words[0]) if words else None
+    if category is None:
+        return handlers.INLINE_KEYWORDS, normalize(text, index.brand_matcher)
+    return (category.keyword.lower(),), normalize(words[1] if len(words) > 1 else "", index.brand_matcher)
+
+
+def answer_ids(params):
+    results = params.get("results", [])
+    if isinstance(results, str):
+        results = json.loads(results)
+    return [result["id"] for result in results]
+
+
+async def run_mode(mode, app, stub, plans, snapshot, args, expected_cache):
+    handlers.inline_search = InlineSearch(size=0 if mode == "uncached" else 2048)
+    handlers.inline_debouncer = Debouncer(delay=args.debounce if mode == "typing" else 0)
+    rng = random.Random(8)
+    update_ids = iter(range(1, 10 ** 9))
+    queries = {}    # inline query id -> (user, text typed so far)
+    finals = {}     # inline query id of each text's last keystroke -> final keystroke time
+    calls_before = len(stub.calls)
+
+    async def user(n, texts):
+        user_id = FIRST_USER + n
+        for text in texts:
+            for k in range(1, len(text) + 1):
+                update_id = next(update_ids)
+                queries[str(update_id)] = (user_id, text[:k])
+                if k == len(text):
+                    finals[str(update_id)] = time.monotonic()
+                await app.process_update(Update.de_json(inline_update(update_id, user_id, text[:k]), app.bot))
+                if mode == "typing":
+                    await asyncio.sleep(rng.uniform(0.05, 0.35))
+                else:
+                    task = handlers.inline_debouncer.pending.get(user_id)
+                    if task is not None:
+                        await task
+            if mode == "typing":
+                await asyncio.sleep(1.0)  # reads the results before the next search
+
+    t0 = time.perf_counter()
+    cpu0 = time.process_time()
+    await asyncio.gather(*(user(n, texts) for n, texts in enumerate(plans)))
+    await asyncio.gather(*handlers.inline_debouncer.pending.values(), return_exceptions=True)
+    wall = time.perf_counter() - t0
+    cpu = time.process_time() - cpu0
+
+    answers = [(at, params) for at, name, params in stub.calls[calls_before:] if name == "answerInlineQuery"]
+    index = snapshot.index
+    tokens = {handlers.article_token(snapshot, i): i for i in range(len(index.rows)) if index.rows[i] is not None}
+    correct = True
+    latencies = []
+    for at, params in answers:
+        _, text = queries[params["inline_query_id"]]
+        keywords, query = parse_text(index, text)
+        if not query:
+            correct &= not answer_ids(params)
+            continue
+        if (keywords, query) not in expected_cache:
+            expected_cache[keywords, query] = expected_ids(index, keywords, query)[:PAGE_SIZE]
+        correct &= [tokens[token] for token in answer_ids(params)] == expected_cache[keywords, query]
+        if params["inline_query_id"] in finals:
+            latencies.append(at - finals[params["inline_query_id"]])
+    keystrokes = len(queries)
+    answered_finals = sum(params["inline_query_id"] in finals for _, params in answers)
+    return {
+        "mode": mode, "keystrokes": keystrokes, "answers": len(answers), "wall": wall, "cpu": cpu,
+        "qps": keystrokes / wall, "correct": correct, "finals": len(finals), "answered_finals": answered_finals,
+        "latency_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "search": dict(handlers.inline_search.stats), "debounce": dict(handlers.inline_debouncer.stats),
+    }
+
+
+async def check_pages(app, stub, snapshot):
+    # Scrolling a long result list pages through next_offset
+    index = snapshot.index
+    keywords, query = parse_text(index, "lcd samsung")
+    expected = expected_ids(index, keywords, query)[:MAX_RESULTS]
+    tokens = []
+    offset = ""
+    for update_id in range(10 ** 8, 10 ** 8 + MAX_RESULTS // PAGE_SIZE + 2):
+        await app.process_update(Update.de_json(inline_update(update_id, FIRST_USER, "lcd samsung", offset), app.bot))
+        await asyncio.gather(*handlers.inline_debouncer.pending.values(), return_exceptions=True)
+        params = stub.calls_to("answerInlineQuery")[-1]
+        tokens += answer_ids(params)
+        offset = params.get("next_offset", "")
+        if not offset:
+            break
+    by_token = {handlers.article_token(snapshot, i): i for i in expected}
+    return len(expected) > PAGE_SIZE and [by_token.get(token) for token in tokens] == expected
+
+
+async def run(args, workdir):
+    csv_path = os.path.join(workdir, "Article.csv")
+    write_csv(csv_path, args.rows)
+    handlers.inventory_cache = InventoryCache(SheetHandler(csv_path), handlers.categories.keywords(),
+                                              brands=handlers.brands)
+    snapshot = await handlers.inventory_cache.get()
+    plans = make_typing(snapshot.index.articles(), args.users, args.queries)
+    handlers.whitelist = {FIRST_USER + n for n in range(args.users)}
+
+    stub = StubRequest(args.latency)
+    app = build_application(ApplicationBuilder().token("1:stub").request(stub).updater(None)
+                            .rate_limiter(CallCounter()))
+    await app.initialize()
+    expected = {}  # (keywords, query) -> first page of a full scan
+    results = [await run_mode(mode, app, stub, plans, snapshot, args, expected)
+               for mode in ("uncached", "cached", "typing")]
+    pages = await check_pages(app, stub, snapshot)
+    await app.shutdown()
+    return results, pages
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=3, help="texts typed per user")
+    parser.add_argument("--debounce", type=float, default=0.3)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per stub Bot API call")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results, pages = asyncio.run(run(args, workdir))
+    print(f"{args.rows} articles, {args.users} users typing {args.queries} queries each, one inline query per keystroke")
+    print(f"{'mode':<10}{'keystrokes':>11}{'answers':>9}{'wall s':>9}{'cpu s':>8}{'queries/s':>11}"
+          f"{'final ms':>10}  search stats")
+    for r in results:
+        print(f"{r['mode']:<10}{r['keystrokes']:>11}{r['answers']:>9}{r['wall']:>9.2f}{r['cpu']:>8.2f}"
+              f"{r['qps']:>11.0f}{r['latency_ms']:>10.1f}  {r['search']}")
+    uncached, cached, typing = results
+    print(f"prefix cache: {cached['qps'] / uncached['qps']:.1f}x the queries per second; "
+          f"debounce: {typing['answers'] / typing['keystrokes']:.2f} answers per keystroke, "
+          f"{typing['debounce'].get('superseded', 0)} superseded")
+
+    checks = {
+        "answers match a scan": all(r["correct"] for r in results),
+        "every keystroke answered": all(r["answers"] == r["keystrokes"] for r in (uncached, cached)),
+        "every final query answered": typing["answered_finals"] == typing["finals"],
+        "debounce drops keystrokes": typing["answers"] < typing["keystrokes"] / 2,
+        "cache faster": cached["qps"] > uncached["qps"],
+        "pages": pages,
+    }
+    print()
+    for name, passed in checks.items():
+        print(f"  {name:<28}{'ok' if passed else 'FAILED'}")
+    ok = all(checks.values())
+    print("OK" if ok else "MISMATCH")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
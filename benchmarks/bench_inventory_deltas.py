@@ -0,0 +1,189 @@
+# ================== benchmarks/bench_inventory_deltas.py ==================
+# Replays export rounds through csvUPDATE and InventoryCache: each round
+# changes a few QT/PU values, removes and adds articles, exports with a fake
+# mdb-export, lets the bot apply the delta, and checks the result against a
+# full reload of the new CSV. Article ids handed out in the first round must
+# keep naming the same article through deltas and full reloads, and the
+# snapshot's restocked rows must be the ones whose QT went from 0 to above 0.
+# Searches must return rows in the reload's order (new articles are appended
+# to the fake export, and a delta adds rows at the end), and a delta that
+# doesn't apply must leave the index untouched.
+# A restart keeps the id epoch through the saved snapshot and a cold start
+# (no snapshot to restore) gets a new one.
+#   python benchmarks/bench_inventory_deltas.py [--rows 20000] [--rounds 10]
+import argparse
+import asyncio
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import csvUPDATE
+from catalogue import make_queries, write_csv
+from inventory_cache import InventoryCache
+from inventory_index import InventoryIndex
+from sheet import SheetHandler
+
+KEYWORDS = ["LCD", "BATTERIE", "CC", "GLASS", "COVER", "SERSOU"]
+
+FAKE_MDB_EXPORT = """#!{python}
+import sys
+with open(sys.argv[1] + ".src", encoding="utf-8", newline="") as f:
+    sys.stdout.write(f.read())
+"""
+
+
+def write_source(path, header, records):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(records)
+
+
+def mutate(rng, records, changes, next_id):
+    for record in rng.sample(records, changes):
+        record[3] = str(rng.choice([800, 1500, 2500, 3200]))
+        record[4] = str(rng.choice([0, 1, 4, 9]))
+    for _ in range(max(changes // 10, 1)):
+        records.pop(rng.randrange(len(records)))
+    for _ in range(max(changes // 10, 1)):
+        next_id += 1
+        records.append([f"N{next_id:06d}", f"Lcd Samsung New {next_id}", "PIECES", "2000", "3"])
+    # Touch an existing duplicate designation too
+    records.append(list(records[0]))
+    return next_id
+
+
+def export(mdb_file, round_no):
+    with open(mdb_file, "w") as f:
+        f.write(f"generation {round_no}")
+    assert csvUPDATE.export_articles(), "export did not publish"
+
+
+def same_results(index, fresh, queries):
+    # In order, not just the same rows
+    for keyword, q in queries:
+        if index.find(keyword, q) != fresh.find(keyword, q):
+            return False
+        if index.closest(keyword, q) != fresh.closest(keyword, q):
+            return False
+    return True
+
+
+def stocked(index):
+    return {key: index.rows[i].qt for key, i in index.keys.items()}
+
+
+def same_restocked(snapshot, before):
+    restocked = set(snapshot.restocked)
+    expected = {key for key, qt in stocked(snapshot.index).items() if qt > 0 and before.get(key, 0) <= 0}
+    return {key for key, i in snapshot.index.keys.items() if i in restocked} == expected
+
+
+def bad_delta_untouched(cache):
+    # The second delta removes an unknown article: nothing of the first applies
+    snapshot = cache.snapshot
+    index = snapshot.index
+    rows, keys, ids = list(index.rows), dict(index.keys), list(index.article_ids)
+    deltas = [{"removed": [list(next(iter(index.keys)))], "changed": [], "added": [["Lcd Bad Delta", 0, "100", "1"]]},
+              {"removed": [["No Such Article", 0]], "changed": [], "added": []}]
+    try:
+        cache._apply_deltas(snapshot, {}, None, deltas)
+    except KeyError:
+        return index.rows == rows and index.keys == keys and index.article_ids == ids
+    return False
+
+
+def stable_ids(index, fresh, tracked):
+    # Same id for every key after a reload, and old ids name the same article
+    if fresh.id_epoch != index.id_epoch:
+        return False
+    for key, i in index.keys.items():
+        if fresh.article_ids[fresh.keys[key]] != index.article_ids[i]:
+            return False
+    for article_id, key in tracked.items():
+        i = index.by_id.get(article_id)
+        if (i is not None) != (key in index.keys) or (i is not None and index.keys[key] != i):
+            return False
+    return True
+
+
+async def replay(rows, rounds, changes):
+    rng = random.Random(7)
+    write_csv("Detail.mdb.src", rows)
+    with open("Detail.mdb.src", encoding="utf-8", newline="") as f:
+        records = list(csv.reader(f))
+    header, records = records[0], records[1:]
+    export("Detail.mdb", 0)
+
+    cache = InventoryCache(SheetHandler("Article.csv"), KEYWORDS, check_interval=0)
+    first = (await cache.get()).index
+    tracked = {first.article_ids[i]: key for key, i in list(first.keys.items())[::50]}
+    next_id = 0
+    failures = 0
+    for round_no in range(1, rounds + 1):
+        next_id = mutate(rng, records, changes, next_id)
+        write_source("Detail.mdb.src", header, records)
+        export("Detail.mdb", round_no)
+
+        before = stocked(cache.snapshot.index)
+        t0 = time.perf_counter()
+        snapshot = await cache.refresh()
+        delta_time = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        reloaded = SheetHandler("Article.csv").load_inventory()
+        fresh = InventoryIndex(reloaded, KEYWORDS, previous=snapshot.index)
+        reload_time = time.perf_counter() - t0
+
+        queries = [(KEYWORDS[i % len(KEYWORDS)], q) for i, (_, q) in enumerate(make_queries(reloaded, 100, seed=round_no))]
+        same_rows = sorted(snapshot.index.articles()) == sorted(reloaded)
+        same_search = same_results(snapshot.index, fresh, queries)
+        ok = (same_rows and same_search and stable_ids(snapshot.index, fresh, tracked)
+              and same_restocked(snapshot, before) and snapshot.export_generation == round_no + 1)
+        failures += not ok
+        print(f"round {round_no:>2}: delta refresh {delta_time * 1e3:7.2f} ms  full reload {reload_time * 1e3:8.2f} ms  "
+              f"{'OK' if ok else 'MISMATCH'}")
+    print(f"cache stats: {dict(cache.stats)}")
+
+    untouched = bad_delta_untouched(cache)
+    print(f"delta that doesn't apply: {'index untouched' if untouched else 'MISMATCH'}")
+
+    epoch = cache.snapshot.index.id_epoch
+    restored = (await InventoryCache(SheetHandler("Article.csv"), KEYWORDS).get()).index
+    os.remove("Article.snapshot.pickle")
+    cold = (await InventoryCache(SheetHandler("Article.csv"), KEYWORDS).get()).index
+    epochs = restored.id_epoch == epoch and cold.id_epoch != epoch
+    print(f"id epoch: restart {'kept' if restored.id_epoch == epoch else 'CHANGED'}, "
+          f"cold start {'new' if cold.id_epoch != epoch else 'SAME'}")
+    return failures + (not untouched) + (not epochs)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--changes", type=int, default=20)
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            fake = os.path.join(tmp, "fake-mdb-export")
+            with open(fake, "w") as f:
+                f.write(FAKE_MDB_EXPORT.format(python=sys.executable))
+            os.chmod(fake, 0o755)
+            csvUPDATE.MDB_EXPORT = fake
+            failures = asyncio.run(replay(args.rows, args.rounds, args.changes))
+        finally:
+            os.chdir(cwd)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
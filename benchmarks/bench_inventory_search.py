@@ -0,0 +1,93 @@
+# ================== benchmarks/bench_inventory_search.py ==================
+# Per-query latency of InventoryIndex versus the old full-category scan, and a
+# golden comparison of their results.
+#   python benchmarks/bench_inventory_search.py [--sizes 1000 5000 20000]
+import argparse
+import os
+import statistics
+import sys
+import time
+from difflib import get_close_matches
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalogue import make_articles, make_queries
+from inventory_index import InventoryIndex
+
+CATEGORY_MAPPING = {
+    "LCD": "LCD",
+    "Battery": "BATTERIE",
+    "Connector": "CC",
+    "Glass": "GLASS",
+    "COVER": "COVER",
+    "SERSOU": "SERSOU"
+}
+
+
+def legacy_search(data, keyword, user_input):
+    # The lookup handle_model used to run on every message
+    filtered_data = [row for row in data if keyword.lower() in row.designation.lower()]
+    potential_matches = [row for row in filtered_data if user_input in row.designation.lower()]
+    if potential_matches:
+        return potential_matches, None
+    all_model_names = [row.designation.lower() for row in filtered_data]
+    close = get_close_matches(user_input, all_model_names, n=1, cutoff=0.9)
+    if close:
+        for row in filtered_data:
+            if close[0] == row.designation.lower():
+                return [], row
+    return [], None
+
+
+def indexed_search(index, keyword, user_input):
+    potential_matches = index.find(keyword, user_input)
+    if potential_matches:
+        return potential_matches, None
+    return [], index.closest(keyword, user_input, cutoff=0.9)
+
+
+def run(size, n_queries, legacy_queries):
+    rows = make_articles(size)
+    t0 = time.perf_counter()
+    index = InventoryIndex(rows, CATEGORY_MAPPING.values())
+    build = time.perf_counter() - t0
+
+    keywords = list(CATEGORY_MAPPING.values())
+    queries = [(keywords[i % len(keywords)], q) for i, (_, q) in enumerate(make_queries(rows, n_queries))]
+
+    indexed = []
+    for keyword, q in queries:
+        t0 = time.perf_counter()
+        indexed_search(index, keyword, q)
+        indexed.append(time.perf_counter() - t0)
+
+    legacy = []
+    mismatches = 0
+    for keyword, q in queries[:legacy_queries]:
+        t0 = time.perf_counter()
+        expected = legacy_search(rows, keyword, q)
+        legacy.append(time.perf_counter() - t0)
+        if indexed_search(index, keyword, q) != expected:
+            mismatches += 1
+            print(f"  MISMATCH {keyword!r} {q!r}")
+
+    print(f"{size:>7} rows  build {build * 1e3:8.1f} ms  "
+          f"indexed mean {statistics.mean(indexed) * 1e3:7.3f} ms  "
+          f"p95 {sorted(indexed)[int(len(indexed) * .95)] * 1e3:7.3f} ms  "
+          f"legacy mean {statistics.mean(legacy) * 1e3:8.3f} ms  "
+          f"golden mismatches {mismatches}/{len(legacy)}")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--legacy-queries", type=int, default=200)
+    args = parser.parse_args()
+    failures = sum(run(size, args.queries, args.legacy_queries) for size in args.sizes)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# ================== benchmarks/bench_keyboards.py ==================
+# Keyboard construction cost per reply: the literals the handlers used to
+# rebuild versus the prebuilt registry markups, and handle_model's overhead
+# for a multi-match reply with a cold and a warm MatchKeyboards cache.
+#   python benchmarks/bench_keyboards.py [--rows 5000] [--matches 5 40]
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from catalogue import make_articles
+from bench_lifecycle import FakeBot, StubSheet, USER_ID, text_update
+import handlers
+from inventory_cache import InventoryCache
+from search_stats import SearchStatsWriter
+
+
+def legacy_category_menu():
+    buttons = [
+        [InlineKeyboardButton("📱 LCD", callback_data="LCD")],
+        [InlineKeyboardButton("🔋 Batterie", callback_data="Battery")],
+        [InlineKeyboardButton("🔌 Connecteur", callback_data="Connector")],
+        [InlineKeyboardButton("🧿 Glass", callback_data="Glass")],
+        [InlineKeyboardButton("📦 Cover", callback_data="COVER")],
+        [InlineKeyboardButton("🛠 Sersou", callback_data="SERSOU")]
+    ]
+    return InlineKeyboardMarkup(buttons)
+
+
+def legacy_result_markup():
+    buttons = [
+        [InlineKeyboardButton("📍 Voir l'emplacement du magasin", url=handlers.STORE_LOCATION_URL)],
+        [InlineKeyboardButton("🔁 Démarrer une nouvelle recherche", callback_data="restart")]
+    ]
+    return InlineKeyboardMarkup(buttons)
+
+
+def legacy_match_keyboard(rows):
+    buttons = [[InlineKeyboardButton(row.designation, callback_data=f"select::{row.designation}")] for row in rows]
+    return InlineKeyboardMarkup(buttons)
+
+
+def per_call(fn, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+async def per_call_async(fn, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        await fn()
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def multi_match_query(rows, matches):
+    # The shortest "lcd <brand> <model>" prefix with at least `matches` hits
+    index = handlers.inventory_cache.snapshot.index
+    for row in rows:
+        words = row.designation.lower().split()
+        if words[0] != "lcd" or len(words) < 3:
+            continue
+        query = " ".join(words[1:3])
+        if len(index.find("LCD", query)) >= matches:
+            return query
+    return "a"
+
+
+async def handler_overhead(rows, matches, n):
+    bot = FakeBot(0)
+    await handlers.inventory_cache.refresh()
+    query = multi_match_query(rows, matches)
+    found = len(handlers.inventory_cache.snapshot.index.find("LCD", query))
+
+    async def reply():
+        context = SimpleNamespace(user_data={"category": "LCD"})
+        await handlers.handle_model(text_update(bot, query), context)
+
+    def cold():
+        handlers.match_keyboards._pages.clear()
+        return reply()
+
+    return query, found, await per_call_async(cold, n), await per_call_async(reply, n)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--matches", type=int, nargs="+", default=[5, 40])
+    parser.add_argument("--n", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'markup':<28}{'legacy us':>12}{'prebuilt us':>14}")
+    print(f"{'category menu':<28}{per_call(legacy_category_menu, args.n):>12.2f}"
+          f"{per_call(lambda: handlers.categories.menu, args.n):>14.2f}")
+    print(f"{'result buttons':<28}{per_call(legacy_result_markup, args.n):>12.2f}"
+          f"{per_call(lambda: handlers.RESULT_MARKUP, args.n):>14.2f}")
+
+    rows = make_articles(args.rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        handlers.whitelist = {USER_ID}
+        handlers.stats_writer = SearchStatsWriter(tmp, handlers.CATEGORIES)
+        handlers.inventory_cache = InventoryCache(StubSheet(rows), handlers.categories.keywords(),
+                                                  brands=handlers.brands)
+        print(f"\n{'handle_model multi-match':<28}{'matches':>8}{'legacy kb us':>14}{'cold us':>10}{'warm us':>10}")
+        for matches in args.matches:
+            query, found, cold, warm = asyncio.run(handler_overhead(rows, matches, args.n // 10))
+            snapshot_rows = handlers.inventory_cache.snapshot.index.find("LCD", query)
+            legacy = per_call(lambda: legacy_match_keyboard(snapshot_rows), args.n // 10)
+            print(f"{query!r:<28}{found:>8}{legacy:>14.1f}{cold:>10.1f}{warm:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# ================== benchmarks/bench_lifecycle.py ==================
+# Bot API calls per interaction for a scripted conversation, with every call
+# taking --latency ms. Calls are routed through CallCounter like in bot.py,
+# so the numbers are what RequestLifecycle logs in production.
+#   python benchmarks/bench_lifecycle.py [--rows 5000] [--latency 80 400]
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalogue import make_articles
+import handlers
+from inventory_cache import InventoryCache
+from lifecycle import CallCounter
+from search_stats import SearchStatsWriter
+
+USER_ID = 42
+
+
+class FakeBot:
+    def __init__(self, latency):
+        self.latency = latency
+        self.limiter = CallCounter()
+        self.message_ids = 0
+        self.last_markup = None
+        self.sent = []
+
+    async def call(self, endpoint):
+        async def request():
+            await asyncio.sleep(self.latency)
+            self.message_ids += 1
+            return FakeMessage(self, text="", message_id=self.message_ids)
+        return await self.limiter.process_request(request, (), {}, endpoint, {}, None)
+
+
+class FakeMessage:
+    def __init__(self, bot, text, message_id=0):
+        self.bot = bot
+        self.text = text
+        self.message_id = message_id
+
+    async def reply_text(self, text, reply_markup=None):
+        self.bot.sent.append(text)
+        if reply_markup is not None:
+            # The progress message can land after the reply with the buttons
+            self.bot.last_markup = reply_markup
+        return await self.bot.call("sendMessage")
+
+    async def edit_text(self, text, reply_markup=None):
+        return await self.bot.call("editMessageText")
+
+    async def delete(self):
+        return await self.bot.call("deleteMessage")
+
+
+class FakeQuery:
+    def __init__(self, bot, data):
+        self.bot = bot
+        self.data = data
+        self.message = FakeMessage(bot, "")
+
+    async def answer(self):
+        return await self.bot.call("answerCallbackQuery")
+
+
+def text_update(bot, text):
+    message = FakeMessage(bot, text)
+    return SimpleNamespace(effective_user=SimpleNamespace(id=USER_ID), message=message,
+                           effective_message=message, callback_query=None)
+
+
+def callback_update(bot, data):
+    query = FakeQuery(bot, data)
+    return SimpleNamespace(effective_user=SimpleNamespace(id=USER_ID), message=None,
+                           effective_message=query.message, callback_query=query)
+
+
+class StubSheet:
+    csv_path = os.path.join(tempfile.gettempdir(), "bench-lifecycle-missing.csv")
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def load_inventory(self):
+        return self.rows
+
+
+def script(rows):
+    # One designation reachable by exact search, one ambiguous query
+    lcd = next(row for row in rows if row.designation.lower().startswith("lcd "))
+    words = lcd.designation.lower().split()
+    return [
+        ("start", lambda bot: text_update(bot, "/start")),
+        ("category_selected", lambda bot: callback_update(bot, "LCD")),
+        ("handle_model", lambda bot: text_update(bot, " ".join(words[1:]))),
+        ("restart_search", lambda bot: callback_update(bot, "restart")),
+        # A button of an older message pressed on the category menu
+        ("category_selected", lambda bot: callback_update(bot, "page::1")),
+        ("category_selected", lambda bot: callback_update(bot, "LCD")),
+        ("handle_model", lambda bot: text_update(bot, words[1])),
+        ("handle_model_selection", lambda bot: callback_update(bot, bot.last_markup.inline_keyboard[0][0].callback_data)),
+    ]
+
+
+async def run(rows, latency):
+    bot = FakeBot(latency)
+    handlers.lifecycle.stats.clear()
+    context = SimpleNamespace(user_data={})
+    await handlers.inventory_cache.refresh()
+    timings = []
+    for name, make_update in script(rows):
+        t0 = time.perf_counter()
+        await getattr(handlers, name)(make_update(bot), context)
+        timings.append((name, time.perf_counter() - t0))
+    return handlers.lifecycle, bot.limiter.calls, timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--latency", type=float, nargs="+", default=[80, 400],
+                        help="milliseconds per Bot API call")
+    args = parser.parse_args()
+
+    rows = make_articles(args.rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        handlers.whitelist = {USER_ID}
+        handlers.stats_writer = SearchStatsWriter(tmp, handlers.CATEGORIES)
+        handlers.inventory_cache = InventoryCache(StubSheet(rows), handlers.CATEGORY_MAPPING.values(),
+                                                  brands=handlers.brands)
+        for latency in args.latency:
+            lifecycle, calls, timings = asyncio.run(run(rows, latency / 1000))
+            print(f"latency {latency:.0f} ms per call, endpoints {dict(calls)}")
+            print(f"  {'handler':<24}{'calls/interaction':>18}{'slow':>6}{'timeouts':>10}")
+            per_handler = lifecycle.calls_per_interaction()
+            for name, stats in lifecycle.stats.items():
+                print(f"  {name:<24}{per_handler[name]:>18.1f}{stats['slow']:>6}{stats['timeouts']:>10}")
+            total = Counter()
+            for name, elapsed in timings:
+                total[name] += elapsed
+            print("  wall time " + ", ".join(f"{name} {elapsed * 1000:.0f} ms" for name, elapsed in total.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+# ================== benchmarks/bench_load.py ==================
+# Offline load test of the real bot: updates go through the handlers and
+# ConversationHandler wiring of bot.build_application(), and the Bot API is
+# an in-process StubRequest with --latency seconds per call. Every chat runs
+# --sessions conversations (/start, category, a query from the mix, and a
+# pick from the list on multi-match) while all chats run concurrently.
+# Each catalogue size runs in its own interpreter so memory numbers are
+# comparable. Results go to stdout and, with --json, to a file for tracking
+# regressions in handle_model, inventory_cache.get and log_request.
+#   python benchmarks/bench_load.py [--rows 1000 10000 100000] [--chats 50]
+#       [--sessions 4] [--latency 0.02] [--mix exact=4,typo=2,miss=2,multi=2]
+#       [--limiter counter|outbound] [--json results.json]
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FIRST_CHAT = 100_000
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {"n": 0}
+
+    def at(q):
+        return samples[min(int(q * len(samples)), len(samples) - 1)] * 1000
+
+    return {"n": len(samples), "p50_ms": at(0.5), "p95_ms": at(0.95), "p99_ms": at(0.99),
+            "max_ms": samples[-1] * 1000}
+
+
+def parse_mix(spec):
+    mix = {}
+    for item in spec.split(","):
+        kind, _, weight = item.partition("=")
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+
+def make_plan(rows, mix, n, categories, seed=3):
+    """(kind, category, query) per search, drawn from the catalogue."""
+    from catalogue import BRAND_MODELS
+    rng = random.Random(seed)
+    kinds, weights = zip(*mix.items())
+    by_keyword = sorted(categories.items(), key=lambda item: -len(item[1]))
+    plan = []
+    for _ in range(n):
+        kind = rng.choices(kinds, weights)[0]
+        name = rng.choice(rows)["Designation1"]
+        category = next((cat for cat, keyword in by_keyword if name.upper().startswith(keyword)),
+                        rng.choice(list(categories)))
+        words = name.lower().split()[1:] if name.upper().startswith(categories[category]) else name.lower().split()
+        model = " ".join(words[:3])
+        if kind == "exact":
+            query = model
+        elif kind == "typo":
+            pos = rng.randrange(len(model))
+            query = model[:pos] + model[pos + 1:]
+        elif kind == "miss":
+            query = f"{rng.choice(['nokia', 'pixel', 'xperia'])} {rng.randint(1, 99)}"
+        else:
+            brand = rng.choice(list(BRAND_MODELS))
+            query = f"{brand} {rng.choice(BRAND_MODELS[brand]).split()[0]}".lower()
+        plan.append((kind, category, query.strip() or "a"))
+    return plan
+
+
+def last_select(stub, chat_id):
+    # callback_data of the first article button in the chat's latest list
+    for _, method, params in reversed(stub.calls):
+        if method == "sendMessage" and int(params.get("chat_id", 0)) == chat_id:
+            markup = params.get("reply_markup")
+            if isinstance(markup, str):
+                markup = json.loads(markup)
+            for row in (markup or {}).get("inline_keyboard", []):
+                for button in row:
+                    if button.get("callback_data", "").startswith("select::"):
+                        return button["callback_data"]
+            return None
+    return None
+
+
+def child(args):
+    from telegram import Update
+    from telegram.ext import ApplicationBuilder
+
+    from catalogue import write_csv
+    from fake_telegram import StubRequest, callback_update, message_update
+    import handlers
+    from bot import build_application
+    from inventory_cache import InventoryCache
+    from lifecycle import CallCounter
+    from metrics import metrics
+    from outbound import OutboundScheduler
+    from search_stats import SearchStatsWriter
+    from sheet import SheetHandler
+
+    workdir = args.child
+    csv_path = os.path.join(workdir, "Article.csv")
+    rows = write_csv(csv_path, args.rows[0])
+    chats = [FIRST_CHAT + c for c in range(args.chats)]
+    handlers.whitelist = set(chats)
+    os.makedirs(os.path.join(workdir, "stats"))
+    handlers.stats_writer = SearchStatsWriter(os.path.join(workdir, "stats"), handlers.CATEGORIES)
+    handlers.inventory_cache = InventoryCache(SheetHandler(csv_path), handlers.categories.keywords(),
+                                              brands=handlers.brands)
+    plan = make_plan(rows, parse_mix(args.mix), args.chats * args.sessions, handlers.CATEGORY_MAPPING)
+
+    async def run():
+        stub = StubRequest(args.latency)
+        limiter = OutboundScheduler() if args.limiter == "outbound" else CallCounter()
+        app = build_application(ApplicationBuilder().token("123:stub").request(stub).updater(None)
+                                .rate_limiter(limiter))
+        await app.initialize()
+        handlers.stats_writer.start()
+        t0 = time.perf_counter()
+        await handlers.inventory_cache.get()
+        load = time.perf_counter() - t0
+
+        timings = defaultdict(list)
+        update_ids = iter(range(1, 10 ** 9))
+
+        async def step(label, update):
+            t = time.perf_counter()
+            await app.process_update(Update.de_json(update, app.bot))
+            timings[label].append(time.perf_counter() - t)
+
+        async def session(chat_id, kind, category, query):
+            await step("start", message_update(next(update_ids), chat_id, "/start"))
+            await step("category_selected", callback_update(next(update_ids), chat_id, category))
+            await step(f"handle_model:{kind}", message_update(next(update_ids), chat_id, query))
+            data = last_select(stub, chat_id)
+            if data:
+                await step("handle_model_selection", callback_update(next(update_ids), chat_id, data))
+
+        async def chat(c, chat_id):
+            for s in range(args.sessions):
+                await session(chat_id, *plan[c * args.sessions + s])
+
+        metrics.reset()
+        t0 = time.perf_counter()
+        await asyncio.gather(*(chat(c, chat_id) for c, chat_id in enumerate(chats)))
+        elapsed = time.perf_counter() - t0
+        updates = sum(len(v) for v in timings.values())
+
+        # The two request-path helpers on their own, without Telegram
+        inventory = []
+        for _ in range(2000):
+            t = time.perf_counter()
+            await handlers.inventory_cache.get()
+            inventory.append(time.perf_counter() - t)
+        logged = []
+        for i in range(2000):
+            t = time.perf_counter()
+            await handlers.log_request("LCD", f"model {i % 50}", i % 2 == 0)
+            logged.append(time.perf_counter() - t)
+        await handlers.stats_writer.stop()
+        await app.shutdown()
+
+        searches = [t for label, v in timings.items() if label.startswith("handle_model:") for t in v]
+        stages = {labels[0][1]: {"n": h.count, "mean_ms": h.sum / h.count * 1000}
+                  for (name, labels), h in metrics.histograms.items() if name == "stage_seconds" and h.count}
+        return {
+            "rows": args.rows[0], "chats": args.chats, "sessions": args.sessions, "api_latency_s": args.latency,
+            "limiter": args.limiter, "updates": updates, "elapsed_s": elapsed,
+            "throughput_ups": updates / elapsed, "inventory_load_s": load,
+            "latency": {label: percentiles(v) for label, v in sorted(timings.items())},
+            "handle_model": percentiles(searches),
+            "inventory_cache.get": percentiles(inventory),
+            "log_request": percentiles(logged),
+            "stages": stages,
+            "api_calls": dict(Counter(method for _, method, _ in stub.calls)),
+            "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
+
+    print(json.dumps(asyncio.run(run())))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per stub Bot API call")
+    parser.add_argument("--mix", default="exact=4,typo=2,miss=2,multi=2")
+    parser.add_argument("--limiter", choices=["counter", "outbound"], default="counter")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--child")
+    args = parser.parse_args()
+    if args.child:
+        child(args)
+        return
+
+    results = []
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as workdir:
+            cmd = [sys.executable, os.path.abspath(__file__), "--child", workdir, "--rows", str(rows),
+                   "--chats", str(args.chats), "--sessions", str(args.sessions),
+                   "--latency", str(args.latency), "--mix", args.mix, "--limiter", args.limiter]
+            # The bot runs from the repo root (brands.txt, stats/)
+            out = subprocess.run(cmd, check=True, capture_output=True, text=True, cwd=ROOT).stdout
+            results.append(json.loads(out.strip().splitlines()[-1]))
+
+    print(f"{args.chats} chats x {args.sessions} sessions, {args.latency * 1000:.0f} ms per API call, "
+          f"mix {args.mix}, {args.limiter} limiter")
+    for r in results:
+        print(f"\n{r['rows']} articles: {r['updates']} updates in {r['elapsed_s']:.2f} s "
+              f"({r['throughput_ups']:.0f} updates/s), load {r['inventory_load_s'] * 1000:.0f} ms, "
+              f"max RSS {r['max_rss_mb']:.0f} MB")
+        print(f"  {'step':<30}{'n':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        named = list(r["latency"].items()) + [("inventory_cache.get", r["inventory_cache.get"]),
+                                              ("log_request", r["log_request"])]
+        for label, p in named:
+            print(f"  {label:<30}{p['n']:>6}{p['p50_ms']:>9.2f}{p['p95_ms']:>9.2f}{p['p99_ms']:>9.2f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "args": vars(args) | {"child": None},
+                       "results": results}, f, indent=2)
+        print(f"\nwrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
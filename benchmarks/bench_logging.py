@@ -0,0 +1,122 @@
+# ================== benchmarks/bench_logging.py ==================
+# Cost of logging on the event loop: the old basicConfig setup (file and
+# console handlers writing inline) against logsetup's queue listener, with
+# a stream of httpx-style request lines carrying the bot token, a few
+# failures and search events. Each setup runs in its own interpreter with
+# stderr sent to /dev/null. Also checks redaction, sampling, rotation with
+# gzip and the JSON event stream.
+#   python benchmarks/bench_logging.py [--records 20000] [--max-bytes 20000]
+import argparse
+import asyncio
+import glob
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TOKEN = "123456789:AAF0123456789abcdefghijklmnopqrstuvw"
+FAIL_EVERY = 1000
+
+
+def child(setup, workdir, records, max_bytes):
+    import logging
+    log_file = os.path.join(workdir, "bot.log")
+    events_file = os.path.join(workdir, "search_events.jsonl")
+    if setup == "basic":
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s',
+                            handlers=[logging.FileHandler(log_file), logging.StreamHandler()])
+    else:
+        from logsetup import setup_logging
+        setup_logging(log_file, events_file, max_bytes=max_bytes, backups=1000, secrets=[TOKEN])
+    from logsetup import SEARCH_EVENTS
+    httpx_log = logging.getLogger("httpx")
+    search_events = logging.getLogger(SEARCH_EVENTS)
+
+    async def emit():
+        times = []
+        for i in range(records):
+            t0 = time.perf_counter()
+            status, reason = (502, "Bad Gateway") if i % FAIL_EVERY == 0 else (200, "OK")
+            httpx_log.info('HTTP Request: %s %s "%s %d %s"', "POST",
+                           f"https://api.telegram.org/bot{TOKEN}/getUpdates", "HTTP/1.1", status, reason)
+            if i % 10 == 0:
+                search_events.info("search", extra={"event": {"category": "LCD", "model": f"a{i % 50}",
+                                                              "available": i % 3 == 0}})
+            times.append(time.perf_counter() - t0)
+            if i % 100 == 0:
+                await asyncio.sleep(0)
+        return times
+
+    # The listener drains the queue at exit, before logging closes the files
+    times = sorted(asyncio.run(emit()))
+    print(json.dumps({"p50": times[len(times) // 2], "p99": times[int(len(times) * 0.99)],
+                      "max": times[-1], "total": sum(times)}))
+
+
+def run_child(setup, workdir, records, max_bytes):
+    out = subprocess.run([sys.executable, __file__, "--child", setup, "--workdir", workdir,
+                          "--records", str(records), "--max-bytes", str(max_bytes)],
+                         check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def read_logs(pattern):
+    text = ""
+    for path in sorted(glob.glob(pattern)):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            text += f.read()
+    return text
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--max-bytes", type=int, default=20000)
+    parser.add_argument("--child")
+    parser.add_argument("--workdir")
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.workdir, args.records, args.max_bytes)
+        return
+
+    print(f"{args.records} HTTP log lines, one search event per 10")
+    print(f"{'setup':<8}{'p50 us':>8}{'p99 us':>8}{'max ms':>8}{'total ms':>10}{'log KB':>8}{'files':>7}")
+    ok = True
+    for setup in ("basic", "queue"):
+        with tempfile.TemporaryDirectory() as workdir:
+            r = run_child(setup, workdir, args.records, args.max_bytes)
+            files = glob.glob(os.path.join(workdir, "bot.log*"))
+            size = sum(os.path.getsize(path) for path in files)
+            print(f"{setup:<8}{r['p50'] * 1e6:>8.1f}{r['p99'] * 1e6:>8.1f}{r['max'] * 1e3:>8.2f}"
+                  f"{r['total'] * 1e3:>10.1f}{size / 1024:>8.0f}{len(files):>7}")
+            if setup != "queue":
+                continue
+            text = read_logs(os.path.join(workdir, "bot.log*"))
+            lines = text.count("HTTP Request")
+            failures = text.count("502 Bad Gateway")
+            event_files = glob.glob(os.path.join(workdir, "search_events.jsonl*"))
+            events = [json.loads(line) for line in read_logs(os.path.join(workdir, "search_events.jsonl*")).splitlines()]
+            checks = {
+                "token redacted": TOKEN not in text and "<token>" in text,
+                "failures kept": failures == -(-args.records // FAIL_EVERY),
+                "successes sampled": lines - failures <= args.records // 100 + 1,
+                "rotated and gzipped": any(path.endswith(".gz") for path in files + event_files),
+                "events complete": len(events) == -(-args.records // 10) and all("ts" in e for e in events),
+                "events kept out of bot.log": '"category"' not in text,
+            }
+            for name, passed in checks.items():
+                print(f"  {name:<28}{'ok' if passed else 'FAILED'}")
+            ok &= all(checks.values())
+    print("OK" if ok else "MISMATCH")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
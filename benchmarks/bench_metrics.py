@@ -0,0 +1,125 @@
+# ================== benchmarks/bench_metrics.py ==================
+# Checks the metrics against a scripted run of the real handlers (the
+# bench_lifecycle conversation, repeated): handler and API call histograms
+# must match what RequestLifecycle and CallCounter counted, stage timings
+# must match the searches made (repeats come from the query cache), and
+# /metrics and the Prometheus endpoint must serve them. Also reports the cost of one timed observation.
+#   python benchmarks/bench_metrics.py [--rows 5000] [--rounds 5]
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from bench_lifecycle import USER_ID, FakeBot, StubSheet, script, text_update
+from catalogue import make_articles
+import handlers
+from httpd import HTTPServer
+from inventory_cache import InventoryCache
+from metrics import Metrics, handle_http, metrics
+from search_stats import SearchStatsWriter
+
+ADMIN_ID = 7
+
+
+def count(name, **labels):
+    h = metrics.histograms.get((name, tuple(sorted(labels.items()))))
+    return h.count if h else 0
+
+
+async def run(rows, rounds):
+    bot = FakeBot(0.001)
+    handlers.lifecycle.stats.clear()
+    handlers.query_cache.stats.clear()
+    metrics.reset()
+    await handlers.inventory_cache.refresh()
+    steps = script(rows)
+    for _ in range(rounds):
+        context = SimpleNamespace(user_data={})
+        for name, make_update in steps:
+            await getattr(handlers, name)(make_update(bot), context)
+
+    # Admin and non-admin /metrics
+    handlers.ADMIN_IDS.add(ADMIN_ID)
+    admin = text_update(bot, "/metrics")
+    admin.effective_user.id = ADMIN_ID
+    bot.sent.clear()
+    await handlers.metrics_command(admin, SimpleNamespace(args=[]))
+    report = "\n".join(bot.sent)
+    bot.sent.clear()
+    await handlers.metrics_command(text_update(bot, "/metrics"), SimpleNamespace(args=[]))
+    refused = bot.sent[:]
+
+    server = await HTTPServer(handle_http).start()
+    async with httpx.AsyncClient() as client:
+        scrape = await client.get(f"http://127.0.0.1:{server.port}/metrics")
+        missing = await client.get(f"http://127.0.0.1:{server.port}/")
+    await server.stop()
+    return bot, steps, report, refused, scrape, missing
+
+
+def overhead(n=200_000):
+    registry = Metrics()
+    t0 = time.perf_counter()
+    for _ in range(n):
+        with registry.time("stage_seconds", stage="filter"):
+            pass
+    timed = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for _ in range(n):
+        pass
+    empty = time.perf_counter() - t0
+    return (timed - empty) / n
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = make_articles(args.rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        handlers.whitelist = {USER_ID}
+        handlers.stats_writer = SearchStatsWriter(tmp, handlers.CATEGORIES)
+        handlers.inventory_cache = InventoryCache(StubSheet(rows), handlers.CATEGORY_MAPPING.values(),
+                                                  brands=handlers.brands)
+        bot, steps, report, refused, scrape, missing = asyncio.run(run(rows, args.rounds))
+
+    searches = sum(name == "handle_model" for name, _ in steps) * args.rounds
+    logged = handlers.stats_writer.today().events
+    checks = {
+        "handler histograms": all(count("handler_seconds", handler=name) == stats["interactions"]
+                                  for name, stats in handlers.lifecycle.stats.items()),
+        "API call histograms": all(count("api_call_seconds", endpoint=endpoint) == n
+                                   for endpoint, n in bot.limiter.calls.items()),
+        "inventory stage per search": count("stage_seconds", stage="inventory") == searches,
+        "filter per uncached search": count("stage_seconds", stage="filter")
+                                     == searches - handlers.query_cache.stats["hits"] > 0,
+        "search outcomes": sum(v for (name, _), v in metrics.counters.items() if name == "searches") == searches,
+        "log_request timed per log": count("stage_seconds", stage="log_request") == logged > 0,
+        "admin /metrics": "handler_seconds handle_model" in report and "inventory_cache" in report,
+        "non-admin refused": len(refused) == 1 and refused[0].startswith("❌"),
+        "prometheus endpoint": scrape.status_code == 200
+                               and f'storebot_handler_seconds_count{{handler="handle_model"}} {searches}' in scrape.text,
+        "unknown path": missing.status_code == 404,
+    }
+    print(f"{args.rounds} rounds of {len(steps)} updates, {searches} searches")
+    for name, passed in checks.items():
+        print(f"  {name:<28}{'ok' if passed else 'FAILED'}")
+    print(f"timed observation {overhead() * 1e9:.0f} ns")
+    print()
+    print(report)
+    ok = all(checks.values())
+    print("OK" if ok else "MISMATCH")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# ================== benchmarks/bench_outbound.py ==================
+# Outbound scheduling against the fake Bot API with flood control switched
+# on. Each chat fires a burst of numbered messages at once:
+#   - plain CallCounter sends them straight away and loses the ones answered
+#     with 429;
+#   - OutboundScheduler paces them, delivers all of them in order, and
+#     rides out the 429s of a fake stricter than its own limits.
+# A tracked handler whose "Processing" message is stuck behind its own
+# replies checks that the message is dropped rather than sent and deleted.
+#   python benchmarks/bench_outbound.py [--chats 20] [--messages 6]
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import Update
+from telegram.error import RetryAfter
+from telegram.ext import ApplicationBuilder, MessageHandler, filters
+
+from fake_telegram import FakeTelegram, message_update
+from lifecycle import CallCounter, RequestLifecycle
+from outbound import OutboundScheduler
+
+PROGRESS = "⏳ Processing..."
+
+
+async def make_app(fake, limiter):
+    app = ApplicationBuilder().token("123:fake").base_url(f"{fake.url}/bot").updater(None).rate_limiter(limiter).build()
+    await app.initialize()
+    return app
+
+
+async def burst(chats, messages, limiter, chat_limit, global_limit, latency):
+    fake = await FakeTelegram(latency=latency, chat_limit=chat_limit, global_limit=global_limit).start()
+    app = await make_app(fake, limiter)
+    lost = 0
+
+    async def send(chat_id, n):
+        nonlocal lost
+        try:
+            await app.bot.send_message(chat_id, str(n))
+        except RetryAfter:
+            lost += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(send(10_000 + c, n) for c in range(chats) for n in range(messages)))
+    elapsed = time.perf_counter() - t0
+    await app.shutdown()
+    await fake.stop()
+
+    delivered = {}
+    for params in fake.calls_to("sendMessage"):
+        delivered.setdefault(int(params["chat_id"]), []).append(int(params["text"]))
+    in_order = all(seq == sorted(seq) for seq in delivered.values())
+    return {"elapsed": elapsed, "lost": lost, "flooded": len(fake.flooded),
+            "delivered": sum(map(len, delivered.values())), "in_order": in_order}
+
+
+async def progress(chats, limiter, latency):
+    # Four replies against a chat burst of three: the fourth waits for a
+    # token, and the progress message queues up behind it
+    fake = await FakeTelegram(latency=latency).start()
+    app = await make_app(fake, limiter)
+    lifecycle = RequestLifecycle(timeout_text="timeout", progress_delay=0.2)
+
+    @lifecycle.track
+    async def reply(update, context):
+        for n in range(4):
+            await update.message.reply_text(str(n))
+
+    app.add_handler(MessageHandler(filters.TEXT, reply))
+    await app.start()
+    await asyncio.gather(*(app.process_update(Update.de_json(message_update(c + 1, 20_000 + c, "lcd"), app.bot))
+                           for c in range(chats)))
+    await app.stop()
+    await app.shutdown()
+    await fake.stop()
+    shown = sum(params["text"] == PROGRESS for params in fake.calls_to("sendMessage"))
+    return {"shown": shown, "deleted": len(fake.calls_to("deleteMessage")), "saved": lifecycle.saved["progress_dropped"]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=6)
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds per fake Bot API call")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)  # the strict run logs every retry
+
+    total = args.chats * args.messages
+    print(f"{args.chats} chats x {args.messages} messages fired at once")
+    print(f"{'limiter':<28}{'seconds':>8}{'429s':>6}{'lost':>6}{'delivered':>10}  order")
+    runs = [
+        ("CallCounter", CallCounter(), 4, 40),
+        ("OutboundScheduler", OutboundScheduler(), 4, 40),
+        ("OutboundScheduler, strict", OutboundScheduler(), 2, 20),
+    ]
+    ok = True
+    for label, limiter, chat_limit, global_limit in runs:
+        r = asyncio.run(burst(args.chats, args.messages, limiter, chat_limit, global_limit, args.latency))
+        print(f"{label:<28}{r['elapsed']:>8.2f}{r['flooded']:>6}{r['lost']:>6}{r['delivered']:>10}  "
+              f"{'ok' if r['in_order'] else 'OUT OF ORDER'}")
+        if isinstance(limiter, OutboundScheduler):
+            print(f"{'':<28}{limiter.stats}")
+            ok &= r["lost"] == 0 and r["delivered"] == total and r["in_order"]
+
+    print()
+    print(f"{'progress message':<28}{'shown':>8}{'deleted':>8}{'saved':>6}")
+    # A global burst big enough for every chat's first replies, so the
+    # progress messages only queue behind their own chat
+    for label, limiter in (("CallCounter", CallCounter()),
+                           ("OutboundScheduler", OutboundScheduler(global_burst=3 * args.chats))):
+        r = asyncio.run(progress(args.chats, limiter, args.latency))
+        print(f"{label:<28}{r['shown']:>8}{r['deleted']:>8}{r['saved']:>6}")
+        # No progress message is left behind
+        ok &= r["shown"] == r["deleted"]
+        if isinstance(limiter, OutboundScheduler):
+            ok &= r["saved"] > 0
+    print("OK" if ok else "MISMATCH")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# ================== benchmarks/bench_query_cache.py ==================
+# handle_model's search with and without the query cache over a skewed
+# query stream (a few models asked for most of the time, Zipf-like), with
+# every cached outcome compared to a fresh search of the same index. Also
+# checks that a new generation or brand matcher empties the cache, that
+# misses expire before hits, and that the size bound and byte count hold.
+#   python benchmarks/bench_query_cache.py [--rows 20000] [--distinct 500] [--searches 20000]
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalogue import make_articles, make_queries
+import handlers
+from brands import BrandMatcher
+from inventory_cache import InventorySnapshot
+from inventory_index import InventoryIndex
+from query_cache import QueryCache, _size
+
+
+def stream(rows, distinct, n, seed=5):
+    keywords = handlers.categories.keywords()
+    pool = [(keywords[i % len(keywords)], q) for i, (_, q) in enumerate(make_queries(rows, distinct))]
+    weights = [1 / (rank + 1) ** 1.1 for rank in range(len(pool))]
+    return random.Random(seed).choices(pool, weights, k=n)
+
+
+def snapshot(generation, rows, matcher):
+    index = InventoryIndex(rows, handlers.categories.keywords(), brands=matcher)
+    return InventorySnapshot(generation, None, None, rows, index)
+
+
+def replay(cache, snap, queries):
+    # The lookup handle_model makes, plus the fresh answer to compare with
+    times = []
+    equal = True
+    for keyword, query in queries:
+        t0 = time.perf_counter()
+        outcome = cache.get(snap, (keyword, query))
+        if outcome is None:
+            outcome = handlers.search_inventory(snap.index, keyword, query)
+            cache.put(snap, (keyword, query), outcome)
+        times.append(time.perf_counter() - t0)
+        equal &= outcome == handlers.search_inventory(snap.index, keyword, query)
+    return times, equal
+
+
+def fresh(snap, queries):
+    times = []
+    for keyword, query in queries:
+        t0 = time.perf_counter()
+        handlers.search_inventory(snap.index, keyword, query)
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def lifetimes():
+    now = [0.0]
+    cache = QueryCache(size=100, ttl=600, negative_ttl=60, clock=lambda: now[0])
+    snap = snapshot(1, make_articles(200), None)
+    cache.put(snap, ("LCD", "found"), ("hit", (1,), "found"))
+    cache.put(snap, ("LCD", "nothing"), ("miss", (), "nothing"))
+    now[0] = 61
+    miss_expired = cache.get(snap, ("LCD", "nothing")) is None and cache.get(snap, ("LCD", "found")) is not None
+    now[0] = 601
+    hit_expired = cache.get(snap, ("LCD", "found")) is None
+    for n in range(150):
+        cache.put(snap, ("LCD", f"q{n}"), ("multi", tuple(range(n % 7)), f"q{n}"))
+    bounded = len(cache) == 100 and cache.stats["evictions"] == 50
+    counted = cache.bytes == sum(_size(key, entry[1]) for key, entry in cache._entries.items())
+    return miss_expired, hit_expired, bounded, counted
+
+
+def mean_us(times):
+    return sum(times) / len(times) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--distinct", type=int, default=500)
+    parser.add_argument("--searches", type=int, default=20000)
+    args = parser.parse_args()
+
+    rows = make_articles(args.rows)
+    matcher = handlers.brands.matcher
+    snap = snapshot(1, rows, matcher)
+    queries = stream(rows, args.distinct, args.searches)
+    cache = QueryCache()
+
+    uncached = fresh(snap, queries)
+    cached, equal = replay(cache, snap, queries)
+    print(f"{args.rows} rows, {args.searches} searches over {args.distinct} distinct queries")
+    print(f"  fresh search   mean {mean_us(uncached):8.1f} us")
+    print(f"  query cache    mean {mean_us(cached):8.1f} us   hit ratio {cache.hit_ratio():.3f}, "
+          f"{len(cache)} entries, {cache.bytes / 1024:.0f} KB")
+
+    # A reload (new generation, one row gone) and a brand retag
+    reloaded = snapshot(2, rows[1:], matcher)
+    entries = len(cache)
+    _, equal_reloaded = replay(cache, reloaded, queries[:2000])
+    retagged = snapshot(2, rows[1:], BrandMatcher(matcher.brands))
+    _, equal_retagged = replay(cache, retagged, queries[:2000])
+    miss_expired, hit_expired, bounded, counted = lifetimes()
+
+    checks = {
+        "cached equals fresh": equal,
+        "reload invalidates": entries > 0 and equal_reloaded and cache.stats["invalidations"] >= 1,
+        "retag invalidates": equal_retagged and cache.stats["invalidations"] == 2,
+        "misses expire first": miss_expired,
+        "hits expire after ttl": hit_expired,
+        "size bound": bounded,
+        "byte count": counted,
+    }
+    for name, passed in checks.items():
+        print(f"  {name:<24}{'ok' if passed else 'FAILED'}")
+    ok = all(checks.values())
+    print("OK" if ok else "MISMATCH")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+# ================== benchmarks/bench_search_stats.py ==================
+# Per-search cost of the stats pipeline versus the old in-handler workbook rebuild,
+# a check that the day's workbook written before the search store keeps its rows, and
+# one that a failed insert or workbook rebuild is retried rather than lost, and one
+# that after a restart the day's counters pick up its stored searches without
+# record() touching SQLite.
+#   python benchmarks/bench_search_stats.py [--searches 10000]
+import argparse
+import asyncio
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openpyxl import Workbook, load_workbook
+from search_stats import SearchStatsWriter, DailyAggregate, build_workbook
+
+CATEGORIES = ["LCD", "Battery", "Connector", "Glass", "COVER", "SERSOU"]
+
+
+def legacy_log_request(stats_dir, category, model, available, now):
+    # The previous log_request: load, append one row, rescan everything, save
+    excel_file = os.path.join(stats_dir, now.strftime("%Y-%m-%d") + ".xlsx")
+    if not os.path.exists(excel_file):
+        wb = Workbook()
+        wb.active.title = "Search Log"
+        wb.active.append(["Time", "Category", "Model", "Status"])
+        wb.save(excel_file)
+    wb = load_workbook(excel_file)
+    ws_log = wb["Search Log"]
+    ws_log.append([now.strftime("%H:%M:%S"), category, model, "Available" if available else "Not available"])
+    rows = list(ws_log.iter_rows(min_row=2, values_only=True))
+    agg = DailyAggregate(now.strftime("%Y-%m-%d"))
+    for row in rows:
+        agg.add(row)
+    build_workbook(rows, agg, CATEGORIES).save(excel_file)
+
+
+def events(n):
+    start = datetime(2025, 9, 10, 8, 0, 0)
+    for i in range(n):
+        yield CATEGORIES[i % len(CATEGORIES)], f"model {i % 500}", i % 3 != 0, start + timedelta(seconds=i * 3)
+
+
+async def bench_writer(stats_dir, n):
+    writer = SearchStatsWriter(stats_dir, CATEGORIES, queue_size=n + 1)
+    checkpoints = {}
+    t0 = time.perf_counter()
+    for i, (category, model, available, now) in enumerate(events(n), 1):
+        writer.record(category, model, available, now=now)
+        if i in (n // 10, n // 2, n):
+            checkpoints[i] = (time.perf_counter() - t0) / i
+    t1 = time.perf_counter()
+    await writer.flush(render=True)
+    flush_time = time.perf_counter() - t1
+    return checkpoints, flush_time
+
+
+def bench_legacy(stats_dir, n):
+    per_search = {}
+    for i, (category, model, available, now) in enumerate(events(n), 1):
+        t0 = time.perf_counter()
+        legacy_log_request(stats_dir, category, model, available, now)
+        if i % (n // 4) == 0:
+            per_search[i] = time.perf_counter() - t0
+    return per_search
+
+
+def workbook_counts(path):
+    # (rows in the search log, searches in the category summary built from the day's counters)
+    wb = load_workbook(path, read_only=True)
+    logged = sum(1 for row in wb["Search Log"].iter_rows(min_row=2, values_only=True) if row[0])
+    counted = sum(row[1] for row in wb["Category Summary"].iter_rows(min_row=2, values_only=True))
+    wb.close()
+    return logged, counted
+
+
+async def keeps_history(stats_dir, n, legacy):
+    # The legacy pipeline wrote the day's first searches, the writer takes over
+    searches = list(events(n + legacy))
+    for category, model, available, now in searches[:legacy]:
+        legacy_log_request(stats_dir, category, model, available, now)
+    writer = SearchStatsWriter(stats_dir, CATEGORIES, queue_size=n + 1)
+    for category, model, available, now in searches[legacy:]:
+        writer.record(category, model, available, now=now)
+    await writer.flush(render=True)
+    date_str = searches[0][3].strftime("%Y-%m-%d")
+    return workbook_counts(writer.workbook_path(date_str)) == (n + legacy, n + legacy)
+
+
+def failing_once(fn, error):
+    calls = []
+
+    def wrapper(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise error
+        return fn(*args)
+    return wrapper
+
+
+async def survives_failures(stats_dir, n):
+    writer = SearchStatsWriter(stats_dir, CATEGORIES, queue_size=n + 1)
+    searches = list(events(n))
+    date_str = searches[0][3].strftime("%Y-%m-%d")
+    writer.store.add = failing_once(writer.store.add, sqlite3.OperationalError("database is locked"))
+    writer.render_day = failing_once(writer.render_day, OSError("No space left on device"))
+    logging.getLogger("search_stats").disabled = True  # the expected render failure
+    for category, model, available, now in searches[:n // 2]:
+        writer.record(category, model, available, now=now)
+    try:
+        await writer.flush(render=True)
+        return False
+    except sqlite3.OperationalError:
+        pass
+    for category, model, available, now in searches[n // 2:]:
+        writer.record(category, model, available, now=now)
+    await writer.flush(render=True)   # the pending batch; its render fails
+    rendered_late = not os.path.exists(writer.workbook_path(date_str))
+    await writer.flush(render=True)   # the rest of the queue, and the render again
+    stored = writer.store.summary(date_str, date_str)["events"]
+    return rendered_late and stored == n and workbook_counts(writer.workbook_path(date_str)) == (n, n) \
+        and not writer._dirty_days
+
+
+async def restart_counts(stats_dir, n, m):
+    searches = list(events(n + m))
+    date_str = searches[0][3].strftime("%Y-%m-%d")
+    first = SearchStatsWriter(stats_dir, CATEGORIES, queue_size=n + m)
+    for category, model, available, now in searches[:n]:
+        first.record(category, model, available, now=now)
+    await first.flush()
+    second = SearchStatsWriter(stats_dir, CATEGORIES, queue_size=n + m)
+    summary = second.store.summary
+    second.store.summary = None  # record() must not query the store
+    for category, model, available, now in searches[n:]:
+        second.record(category, model, available, now=now)
+    before = second.day(date_str).events
+    second.store.summary = summary
+    await second.flush()
+    return before == m and second.day(date_str).events == n + m and date_str not in second.unloaded
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--searches", type=int, default=10000)
+    parser.add_argument("--legacy-searches", type=int, default=400)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        checkpoints, flush_time = asyncio.run(bench_writer(tmp, args.searches))
+        print(f"queued writer, {args.searches} searches:")
+        for i, cost in checkpoints.items():
+            print(f"  mean cost per search after {i:>6}: {cost * 1e6:8.2f} us")
+        print(f"  background flush + render of the day: {flush_time:.2f} s (off the request path)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        per_search = bench_legacy(tmp, args.legacy_searches)
+        print(f"legacy log_request, {args.legacy_searches} searches:")
+        for i, cost in per_search.items():
+            print(f"  cost of search #{i:>6}: {cost * 1e3:8.2f} ms")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        kept = asyncio.run(keeps_history(tmp, 200, 50))
+    print(f"workbook from before the store: {'rows kept' if kept else 'MISMATCH'}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        retried = asyncio.run(survives_failures(tmp, 200))
+    print(f"failed insert and rebuild: {'retried' if retried else 'MISMATCH'}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        restarted = asyncio.run(restart_counts(tmp, 300, 100))
+    print(f"counters after a restart: {'stored searches merged' if restarted else 'MISMATCH'}")
+    sys.exit(0 if kept and retried and restarted else 1)
+
+
+if __name__ == "__main__":
+    main()
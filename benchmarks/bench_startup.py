@@ -0,0 +1,122 @@
+# ================== benchmarks/bench_startup.py ==================
+# Time to first answer after a restart: a fresh process builds an
+# InventoryCache, answers one search, and answers today's search summary.
+# Cold (no snapshot), warm (valid snapshot), stale (CSV changed) and corrupt
+# snapshot runs are compared; each run is a separate interpreter.
+#   python benchmarks/bench_startup.py [--rows 20000] [--searches 20000]
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+KEYWORDS = ["LCD", "BATTERIE", "CC", "GLASS", "COVER", "SERSOU"]
+
+
+def child(workdir, query):
+    t0 = time.perf_counter()
+    from inventory_cache import InventoryCache
+    from rollups import SummaryRollups
+    from search_stats import SearchStatsWriter
+    from sheet import SheetHandler
+    imported = time.perf_counter()
+
+    async def first_answer():
+        cache = InventoryCache(SheetHandler(os.path.join(workdir, "Article.csv")), KEYWORDS)
+        snapshot = await cache.get()
+        matches = snapshot.index.find("LCD", query)
+        return cache, matches
+
+    # asyncio.run also waits for the background snapshot save
+    cache, matches = asyncio.run(first_answer())
+    answered = time.perf_counter()
+    writer = SearchStatsWriter(os.path.join(workdir, "stats"), ["LCD"])
+    today = asyncio.run(SummaryRollups(writer).day(writer.today().date_str))
+    events = today.events if today else 0
+    counted = time.perf_counter()
+    print(json.dumps({
+        "imports": imported - t0,
+        "first_answer": answered - imported,
+        "today": counted - answered,
+        "matches": len(matches),
+        "events": events,
+        "warm": cache.stats["warm_starts"],
+    }))
+
+
+def run_child(workdir, query):
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, __file__, "--child", workdir, "--query", query],
+                         check=True, capture_output=True, text=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    result["wall"] = time.perf_counter() - t0
+    return result
+
+
+def write_today(stats_dir, searches):
+    from datetime import datetime
+    from search_stats import SearchStatsWriter
+
+    async def record():
+        writer = SearchStatsWriter(stats_dir, ["LCD"])
+        now = datetime.now()
+        for i in range(searches):
+            writer.record("LCD", f"Model {i % 500}", i % 3 == 0, now=now)
+            if i % 1000 == 999:
+                await writer.flush()
+        await writer.flush()
+
+    asyncio.run(record())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--searches", type=int, default=20000)
+    parser.add_argument("--child")
+    parser.add_argument("--query", default="samsung a")
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.query)
+        return
+
+    from catalogue import write_csv
+    with tempfile.TemporaryDirectory() as workdir:
+        csv_path = os.path.join(workdir, "Article.csv")
+        snapshot_path = os.path.join(workdir, "Article.snapshot.pickle")
+        os.makedirs(os.path.join(workdir, "stats"))
+        write_csv(csv_path, args.rows)
+        write_today(os.path.join(workdir, "stats"), args.searches)
+
+        runs = [("cold", run_child(workdir, args.query))]
+        # The cold run left a snapshot behind
+        runs.append(("warm", run_child(workdir, args.query)))
+        with open(csv_path, "a", encoding="utf-8") as f:
+            f.write("X1,Lcd Samsung Added,PIECES,1500,2\n")
+        runs.append(("stale", run_child(workdir, args.query)))
+        with open(snapshot_path, "r+b") as f:
+            f.seek(100)
+            f.write(b"\x00" * 64)
+        runs.append(("corrupt", run_child(workdir, args.query)))
+        runs.append(("warm again", run_child(workdir, args.query)))
+
+    print(f"{args.rows} articles, {args.searches} searches today")
+    print(f"{'run':<12}{'wall ms':>9}{'imports':>9}{'answer':>9}{'today':>8}{'matches':>9}{'warm':>6}")
+    for name, r in runs:
+        print(f"{name:<12}{r['wall'] * 1e3:>9.0f}{r['imports'] * 1e3:>9.0f}{r['first_answer'] * 1e3:>9.1f}"
+              f"{r['today'] * 1e3:>8.1f}{r['matches']:>9}{r['warm']:>6}")
+    expected = [0, 1, 0, 0, 1]
+    same = len({r["matches"] for name, r in runs if name in ("cold", "warm")}) == 1
+    ok = [r["warm"] for _, r in runs] == expected and same and all(r["events"] == args.searches for _, r in runs)
+    print("OK" if ok else "MISMATCH")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
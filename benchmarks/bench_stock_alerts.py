@@ -0,0 +1,218 @@
+# ================== benchmarks/bench_stock_alerts.py ==================
+# Back-in-stock subscriptions against synthetic stock changes: 10k article
+# and query subscriptions are taken through StockAlerts.subscribe(), then
+# each round puts out-of-stock rows back in stock, empties others and adds
+# new articles, builds the next index the way a full reload does and runs
+# the on_restock hook. Checks:
+#   - the restocked rows are exactly the rows whose QT went from 0 (or
+#     nothing) to above 0
+#   - the subscriptions that fire are the ones a scan of every subscription
+#     against every restocked row finds, while far fewer are evaluated
+#   - a SharedInventory worker sees the same restocked rows as the loader
+#   - notifications go out no faster than the send rate, blocked chats lose
+#     their subscriptions, and the database reloads to the open ones
+#   python benchmarks/bench_stock_alerts.py [--rows 50000] [--subscriptions 10000] [--rounds 5]
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram.error import Forbidden
+
+from catalogue import BRAND_MODELS, make_articles
+from inventory_cache import InventorySnapshot
+from inventory_index import InventoryIndex
+from sheet import Article
+from shared_inventory import SharedInventory, SnapshotPublisher
+from stock_alerts import ARTICLE, QUERY, StockAlerts
+
+KEYWORDS = ["LCD", "BATTERIE", "CC", "GLASS", "COVER", "SERSOU"]
+
+
+class FakeBot:
+    def __init__(self, blocked):
+        self.blocked = blocked
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        if chat_id in self.blocked:
+            raise Forbidden("bot was blocked by the user")
+        self.sent.append((time.monotonic(), chat_id, text))
+
+
+def make_subscriptions(rows, n, chats, seed=3):
+    rng = random.Random(seed)
+    missing = [row.designation for row in rows if row.qt <= 0]
+    subs = set()
+    while len(subs) < n:
+        chat_id = rng.randrange(1, chats + 1)
+        kind = rng.choice([ARTICLE, QUERY, QUERY])
+        if kind == ARTICLE:
+            subs.add((chat_id, ARTICLE, "", rng.choice(missing)))
+            continue
+        keyword = rng.choice(KEYWORDS)
+        brand = rng.choice(list(BRAND_MODELS))
+        query = rng.choice([
+            f"{brand} {rng.choice(BRAND_MODELS[brand])} v{rng.randrange(100)}",
+            f"nokia {rng.randrange(1, 40)}",
+            f"{brand} {rng.choice(BRAND_MODELS[brand])} oled v{rng.randrange(100)}",
+            rng.choice(["a5", "x9"]),
+        ])
+        subs.add((chat_id, QUERY, keyword, query))
+    return sorted(subs)
+
+
+def change_stock(rng, rows, restocks, new_rows, round_no):
+    rows = list(rows)
+    empty = [i for i, row in enumerate(rows) if row.qt <= 0]
+    stocked = [i for i, row in enumerate(rows) if row.qt > 0]
+    for i in rng.sample(empty, restocks):
+        rows[i] = Article(rows[i].designation, rows[i].pu, 5.0)
+    for i in rng.sample(stocked, restocks):
+        rows[i] = Article(rows[i].designation, rows[i].pu, 0.0)
+    for k in range(new_rows):
+        rows.append(Article(f"Lcd Nokia {rng.randrange(1, 40)} Org R{round_no}.{k}", 2000.0, 3.0))
+    return rows
+
+
+def expected_restocked(previous_rows, rows):
+    def keyed(rows):
+        seen = {}
+        for row in rows:
+            n = seen.get(row.designation, 0)
+            seen[row.designation] = n + 1
+            yield (row.designation, n), row.qt
+
+    before = dict(keyed(previous_rows))
+    return {key for key, qt in keyed(rows) if qt > 0 and before.get(key, 0) <= 0}
+
+
+async def check_shared(directory, rows, rng):
+    # The loader publishes two generations; a worker attached to the first
+    # gets the second one's restocked rows without diffing anything
+    publisher = SnapshotPublisher(directory)
+    first = InventoryIndex(rows, KEYWORDS)
+    publisher.publish(InventorySnapshot(1, None, "a", rows, first))
+    seen = []
+    worker = SharedInventory(directory, check_interval=0, on_restock=seen.append)
+    await worker.refresh()
+    changed = change_stock(rng, rows, 50, 5, 0)
+    second = InventoryIndex(changed, KEYWORDS, previous=first)
+    restocked = second.restocked_since(first)
+    publisher.publish(InventorySnapshot(2, None, "b", changed, second, restocked=restocked))
+    await worker.refresh()
+    # A retag republishes the same generation: nothing is restocked again
+    publisher.publish(InventorySnapshot(2, None, "b", changed, second, restocked=restocked))
+    await worker.refresh()
+    return len(seen) == 1 and list(seen[0].restocked) == restocked
+
+
+async def run(args, workdir):
+    rng = random.Random(5)
+    rows = make_articles(args.rows)
+    index = InventoryIndex(rows, KEYWORDS)
+    wanted = make_subscriptions(rows, args.subscriptions, args.chats)
+    blocked = set(range(1, args.chats + 1, 97))
+    bot = FakeBot(blocked)
+    path = os.path.join(workdir, "subscriptions.db")
+    alerts = StockAlerts(path, rate=args.rate, burst=args.rate // 10 or 1)
+    await alerts.start(bot)
+
+    t0 = time.perf_counter()
+    statuses = await asyncio.gather(*(alerts.subscribe(*sub) for sub in wanted))
+    subscribe_time = time.perf_counter() - t0
+    again = await alerts.subscribe(*wanted[0])
+    print(f"{args.rows} articles, {len(alerts)} subscriptions from {args.chats} chats "
+          f"({sum(s == 'added' for s in statuses)} added in {subscribe_time:.2f} s, "
+          f"{len(statuses) / subscribe_time:.0f}/s)")
+
+    checks = {"subscribed once": statuses.count("added") == len(wanted) and again == "exists"}
+    detection = matching = True
+    evaluated = brute = 0
+    match_time = 0.0
+    notified_chats = set()
+    for round_no in range(1, args.rounds + 1):
+        changed = change_stock(rng, rows, args.restocks, args.new_rows, round_no)
+        fresh = InventoryIndex(changed, KEYWORDS, previous=index)
+        restocked = fresh.restocked_since(index)
+        expected = expected_restocked(rows, changed)
+        keys = {key for key, i in fresh.keys.items() if i in set(restocked)}
+        detection &= keys == expected
+
+        open_subs = list(alerts.index.by_ident.values())
+        names = fresh.names
+        want = {sub.ident for sub in open_subs if any(sub.matches(names[i]) for i in restocked)}
+        before = set(alerts.index.by_ident)
+        queued = alerts.queue.qsize()
+        evaluated_before = alerts.stats["evaluated"]
+        t0 = time.perf_counter()
+        alerts.restocked(InventorySnapshot(round_no + 1, None, None, changed, fresh, restocked=restocked))
+        elapsed = time.perf_counter() - t0
+        fired = before - set(alerts.index.by_ident)
+        matching &= fired == want
+        notified_chats.update(chat_id for chat_id, _, _, _ in fired)
+        round_evaluated = alerts.stats["evaluated"] - evaluated_before
+        evaluated += round_evaluated
+        brute += len(open_subs) * len(restocked)
+        match_time += elapsed
+        print(f"round {round_no}: {len(restocked):>4} rows back in stock, {len(fired):>4} subscriptions fired "
+              f"({alerts.queue.qsize() - queued} notifications), {round_evaluated:>6} of "
+              f"{len(open_subs) * len(restocked)} pairs evaluated in {elapsed * 1000:6.2f} ms "
+              f"{'OK' if keys == expected and fired == want else 'MISMATCH'}")
+        rows, index = changed, fresh
+
+    queued = alerts.queue.qsize()
+    t0 = time.perf_counter()
+    await alerts.stop(timeout=queued / args.rate + 30)
+    send_time = time.perf_counter() - t0
+    sent = len(bot.sent)
+    span = bot.sent[-1][0] - bot.sent[0][0] if sent > 1 else 0.0
+    burst = alerts.bucket.burst
+    print(f"sender: {sent} notifications in {send_time:.2f} s at {args.rate}/s, "
+          f"{alerts.stats['blocked']} blocked chats, stats {dict(alerts.stats)}")
+
+    reloaded = {sub.ident for sub in StockAlerts(path).load()}
+    checks.update({
+        "restocked rows": detection,
+        "fired = brute force": matching,
+        "evaluated < brute force": evaluated * 10 < brute,
+        "send rate respected": span >= (sent - burst) / args.rate * 0.95,
+        "every chat notified": sent + alerts.stats["blocked"] == queued and not alerts.stats["unsent"],
+        "blocked chats dropped": not any(sub.chat_id in blocked & notified_chats
+                                         for sub in alerts.index.by_ident.values()),
+        "database reloads": reloaded == set(alerts.index.by_ident),
+        "shared restocked rows": await check_shared(os.path.join(workdir, "shared"), rows, rng),
+    })
+    print(f"matching: {evaluated} subscriptions evaluated in {match_time * 1000:.1f} ms, "
+          f"a full scan would evaluate {brute}")
+    return checks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--subscriptions", type=int, default=10000)
+    parser.add_argument("--chats", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--restocks", type=int, default=200, help="rows back in stock per round")
+    parser.add_argument("--new-rows", type=int, default=20, help="new articles per round")
+    parser.add_argument("--rate", type=int, default=200, help="notifications per second")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        checks = asyncio.run(run(args, workdir))
+    print()
+    for name, passed in checks.items():
+        print(f"  {name:<26}{'ok' if passed else 'FAILED'}")
+    ok = all(checks.values())
+    print("OK" if ok else "MISMATCH")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
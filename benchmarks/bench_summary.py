@@ -0,0 +1,188 @@
+# ================== benchmarks/bench_summary.py ==================
+# /summary and reports over months of history kept in the SQLite search
+# store. Legacy logs, daily workbooks and journals are imported with
+# search_store.import_history, then compared against the old per-file
+# readers: the month and day texts on legacy logs, range totals, and a
+# cross-day question (most requested unavailable models over 90 days)
+# answered by one query versus reading every day's log, workbook or journal.
+#   python benchmarks/bench_summary.py [--months 12] [--searches 400]
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalogue import make_articles
+from reports import ReportBuilder, build_report
+from rollups import SummaryRollups
+from search_stats import DailyAggregate, SearchStatsWriter, build_workbook, format_summary
+from search_store import READERS, history_sources, import_history
+import handlers
+
+CATEGORIES = ["LCD", "Battery", "Connector", "Glass", "COVER", "SERSOU"]
+WORKBOOK_DAYS = 3  # days of the second month kept only as a workbook
+
+
+def legacy_month_text(log_dir, month_str):
+    # The previous summary_month body, with the listing sorted for comparison
+    summaries = []
+    for filename in sorted(os.listdir(log_dir)):
+        if filename.startswith(month_str) and filename.endswith(".log"):
+            log_file = os.path.join(log_dir, filename)
+            summaries.append(f"{filename[:-4]}:\n{handlers.read_detailed_log_summary(log_file)}\n")
+    return "🗖 Résumé du mois :\n\n" + "\n".join(summaries) if summaries else "📍 Aucun enregistrement pour ce mois."
+
+
+def month_text(days):
+    summaries = [f"{date_str}:\n{format_summary(agg)}\n" for date_str, agg in days.items()]
+    return "🗖 Résumé du mois :\n\n" + "\n".join(summaries) if summaries else "📍 Aucun enregistrement pour ce mois."
+
+
+def day_rows(rng, models, searches):
+    rows = []
+    for _ in range(searches):
+        time_str = f"{rng.randint(8, 19):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}"
+        status = rng.choice(["Available", "Not available"])
+        rows.append([time_str, rng.choice(CATEGORIES), rng.choice(models), status])
+    return sorted(rows)
+
+
+def write_history(log_dir, stats_dir, first, days, searches):
+    # Legacy logs for the first month, a few workbooks, journals after that
+    rng = random.Random(5)
+    models = [row.designation for row in make_articles(300)]
+    second_month = None
+    for n in range(days):
+        date_str = (first + timedelta(days=n)).isoformat()
+        rows = day_rows(rng, models, searches)
+        if date_str[:7] == first.isoformat()[:7]:
+            with open(os.path.join(log_dir, f"{date_str}.log"), "w") as f:
+                for time_str, _, model, status in rows:
+                    f.write(f"{time_str} - {model} - {status}\n")
+            continue
+        second_month = second_month or date_str
+        if n - (date.fromisoformat(second_month) - first).days < WORKBOOK_DAYS:
+            agg = DailyAggregate(date_str)
+            for row in rows:
+                agg.add(row)
+            build_workbook(rows, agg, CATEGORIES).save(os.path.join(stats_dir, f"{date_str}.xlsx"))
+            continue
+        with open(os.path.join(stats_dir, f"{date_str}.jsonl"), "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - t0) * 1000
+
+
+async def atimed(coro):
+    t0 = time.perf_counter()
+    result = await coro
+    return result, (time.perf_counter() - t0) * 1000
+
+
+def files_top_unavailable(stats_dir, log_dir, first, last, n=10):
+    # Without the store: open every day's file, whichever kind it is
+    counts = Counter()
+    for date_str, path in history_sources(stats_dir, log_dir).items():
+        if first.isoformat() <= date_str <= last.isoformat():
+            rows = READERS[os.path.splitext(path)[1]](path)
+            counts.update(row[2] for row in rows if row[3] != "Available")
+    return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:n]
+
+
+async def run(log_dir, stats_dir, first, last, searches):
+    writer = SearchStatsWriter(stats_dir, CATEGORIES)
+    rollups = SummaryRollups(writer)
+    first_month = first.isoformat()[:7]
+    expected = ((last - first).days + 1) * searches
+
+    (days, imported), import_ms = timed(lambda: import_history(writer.store, stats_dir, log_dir))
+    again, _ = timed(lambda: import_history(writer.store, stats_dir, log_dir))
+    ok = imported == expected and again == (0, 0)
+    print(f"import: {imported} searches from {days} days in {import_ms:.0f} ms, "
+          f"second run {again[1]} rows, {'OK' if ok else 'MISMATCH'}")
+
+    legacy, legacy_ms = timed(lambda: legacy_month_text(log_dir, first_month))
+    cold, cold_ms = await atimed(rollups.month(first_month))
+    warm, warm_ms = await atimed(rollups.month(first_month))
+    same = legacy == month_text(cold) == month_text(warm)
+    ok &= same
+    print(f"month {first_month}: legacy logs {legacy_ms:.1f} ms, store cold {cold_ms:.1f} ms, "
+          f"warm {warm_ms:.2f} ms, {'OK' if same else 'MISMATCH'}")
+
+    day_str = first.isoformat()
+    old_day = handlers.read_detailed_log_summary(os.path.join(log_dir, f"{day_str}.log"))
+    same = old_day == format_summary(await rollups.day(day_str))
+    ok &= same
+    print(f"day {day_str}: {'OK' if same else 'MISMATCH'}")
+
+    total, cold_ms = await atimed(rollups.range(first, last))
+    again, warm_ms = await atimed(rollups.range(first, last))
+    ok &= total.events == expected and again.to_dict() == total.to_dict()
+    print(f"range {first}..{last}: {total.events} searches, cold {cold_ms:.1f} ms, warm {warm_ms:.1f} ms")
+
+    since = last - timedelta(days=89)
+    old_top, old_ms = timed(lambda: files_top_unavailable(stats_dir, log_dir, since, last))
+    new_top, new_ms = timed(lambda: writer.store.top_models(since.isoformat(), last.isoformat(),
+                                                            status="Not available"))
+    same = old_top == [tuple(row) for row in new_top]
+    ok &= same
+    print(f"top unavailable over 90 days: files {old_ms:.1f} ms, store {new_ms:.1f} ms, "
+          f"{'OK' if same else 'MISMATCH'}")
+
+    # A queued search counts once, before and after it is flushed
+    writer.record("LCD", "probe", True, now=datetime.combine(last, datetime.min.time()))
+    queued = (await rollups.day(last.isoformat())).events
+    await writer.flush()
+    flushed = (await rollups.day(last.isoformat())).events
+    writer.days.clear()
+    loads = rollups.stats["month_loads"]
+    stored = (await rollups.day(last.isoformat())).events
+    same = queued == flushed == stored == searches + 1 and rollups.stats["month_loads"] == loads + 1
+    ok &= same
+    print(f"queued search: {queued}/{flushed}/{stored} searches, month reloaded once, "
+          f"{'OK' if same else 'MISMATCH'}")
+
+    builder = ReportBuilder(stats_dir, CATEGORIES)
+    due = builder.plan(today=last + timedelta(days=1))
+    kind, start, end, path, inputs = due[-1]
+    built, report_ms = timed(lambda: build_report(stats_dir, CATEGORIES, start, end, path))
+    same = built == sum(n for n, _ in inputs.values())
+    ok &= same
+    print(f"{len(due)} reports due, {kind} {start}..{end}: {built} searches in {report_ms:.0f} ms, "
+          f"{'OK' if same else 'MISMATCH'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--searches", type=int, default=400)
+    args = parser.parse_args()
+
+    first = date(2025, 1, 1)
+    last = first + timedelta(days=args.months * 30 - 1)
+    with tempfile.TemporaryDirectory() as tmp:
+        log_dir = os.path.join(tmp, "logs")
+        stats_dir = os.path.join(tmp, "stats")
+        os.makedirs(log_dir)
+        os.makedirs(stats_dir)
+        write_history(log_dir, stats_dir, first, (last - first).days + 1, args.searches)
+        ok = asyncio.run(run(log_dir, stats_dir, first, last, args.searches))
+    print("OK" if ok else "MISMATCH")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
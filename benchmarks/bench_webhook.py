@@ -0,0 +1,93 @@
+# ================== benchmarks/bench_webhook.py ==================
+# Webhook throughput and per-chat ordering against the fake Bot API. Each
+# chat posts numbered messages in order; the handler does some work and
+# echoes the number back. Replies must come back in order per chat, and
+# throughput is compared with one update at a time (polling's behaviour).
+#   python benchmarks/bench_webhook.py [--chats 50] [--messages 10] [--work 0.05]
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from telegram.ext import ApplicationBuilder, MessageHandler, filters
+
+from fake_telegram import FakeTelegram, message_update
+from webhook import run_webhook
+
+SECRET = "bench-secret"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def run(chats, messages, work, latency, max_concurrent):
+    fake = await FakeTelegram(latency=latency).start()
+    app = ApplicationBuilder().token("123:fake").base_url(f"{fake.url}/bot").updater(None).build()
+
+    async def echo(update, context):
+        await asyncio.sleep(work)
+        await update.message.reply_text(update.message.text)
+
+    app.add_handler(MessageHandler(filters.TEXT, echo))
+    port = free_port()
+    stop = asyncio.Event()
+    url = f"http://127.0.0.1:{port}/telegram"
+    server = asyncio.create_task(run_webhook(app, url, port=port, secret_token=SECRET,
+                                             max_concurrent=max_concurrent, stop_event=stop))
+    while not fake.calls_to("setWebhook"):
+        await asyncio.sleep(0.01)
+
+    update_ids = iter(range(1, chats * messages + 1))
+    headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+
+    async def post_chat(client, chat_id):
+        # Telegram delivers one chat's updates in order
+        for n in range(messages):
+            response = await client.post(url, json=message_update(next(update_ids), chat_id, str(n)), headers=headers)
+            response.raise_for_status()
+
+    t0 = time.perf_counter()
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=100)) as client:
+        await asyncio.gather(*(post_chat(client, 10_000 + c) for c in range(chats)))
+    while len(fake.calls_to("sendMessage")) < chats * messages:
+        await asyncio.sleep(0.005)
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await server
+    await fake.stop()
+
+    replies = {}
+    for params in fake.calls_to("sendMessage"):
+        replies.setdefault(int(params["chat_id"]), []).append(int(params["text"]))
+    in_order = all(seq == list(range(messages)) for seq in replies.values()) and len(replies) == chats
+    return elapsed, in_order
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=10)
+    parser.add_argument("--work", type=float, default=0.05, help="seconds of handler work per update")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per fake Bot API call")
+    args = parser.parse_args()
+
+    total = args.chats * args.messages
+    ok = True
+    for label, max_concurrent in (("one at a time", 1), ("per-chat concurrent", 32)):
+        elapsed, in_order = asyncio.run(run(args.chats, args.messages, args.work, args.latency, max_concurrent))
+        ok &= in_order
+        print(f"{label:<20} {total} updates in {elapsed:6.2f} s  {total / elapsed:7.1f} updates/s  "
+              f"{'in order' if in_order else 'OUT OF ORDER'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
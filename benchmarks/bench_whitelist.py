@@ -0,0 +1,48 @@
+# ================== benchmarks/bench_whitelist.py ==================
+# Authorization check cost: re-reading whitelist.py per /start versus the
+# in-memory Whitelist, plus a reload after add_user-style atomic writes.
+#   python benchmarks/bench_whitelist.py [--sizes 10 1000 10000]
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from access import Whitelist, load_whitelist, save_whitelist
+
+
+def per_call(fn, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--checks", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "whitelist.py")
+        for size in args.sizes:
+            ids = list(range(10**9, 10**9 + size))
+            save_whitelist(ids, path)
+            probe = ids[-1]
+            legacy = per_call(lambda: probe in load_whitelist(path), args.checks)
+            whitelist = Whitelist(path)
+            cached = per_call(lambda: probe in whitelist, args.checks * 100)
+
+            save_whitelist(ids + [42], path)
+            whitelist.watcher.check()
+            assert 42 in whitelist
+
+            print(f"{size:>6} users  reload+list scan {legacy * 1e6:9.1f} us/check  "
+                  f"in-memory frozenset {cached * 1e9:6.1f} ns/check")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+# ================== benchmarks/bench_workers.py ==================
+# N bot processes on one machine, each driving the real handler wiring
+# (bot.build_application() with a stub Bot API, as in bench_load) with its
+# own chats at the same time:
+#   private  every process loads the CSV into its own InventoryCache and
+#            writes its own search store (N copies of bot.py today)
+#   shared   this process is the loader: it publishes the inventory with
+#            SnapshotPublisher and owns the one SearchStatsWriter behind a
+#            StatsRelay; workers map the snapshot with SharedInventory and
+#            forward their searches with StatsForwarder
+# Reports per-worker memory (RSS, PSS and private pages from
+# /proc/self/smaps_rollup) and aggregate throughput, checks that both modes
+# give the same search outcomes and that every relayed search is stored once,
+# and that a worker keeps its searches while the loader's relay restarts.
+#   python benchmarks/bench_workers.py [--rows 50000] [--workers 4] [--chats 50] [--sessions 4]
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_load import FIRST_CHAT, last_select, make_plan, parse_mix
+
+
+def memory():
+    # MB of resident, proportional (shared pages split between their users) and private memory
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line and not line.startswith("0"))
+    except OSError:
+        return {"rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+    def mb(*names):
+        return sum(int(fields[name].split()[0]) for name in names) / 1024
+
+    return {"rss_mb": mb("Rss"), "pss_mb": mb("Pss"), "private_mb": mb("Private_Clean", "Private_Dirty")}
+
+
+def outcome_digest(index, plan, mapping):
+    import handlers
+    digest = hashlib.sha256()
+    for _, category, query in plan:
+        result, ids, corrected = handlers.search_inventory(index, mapping[category].lower(), query)
+        names = [index.rows[i].designation for i in ids]
+        digest.update(json.dumps([result, names, corrected]).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def child(args):
+    import warnings
+    from telegram import Update
+    from telegram.ext import ApplicationBuilder
+    from telegram.warnings import PTBUserWarning
+    warnings.filterwarnings("ignore", category=PTBUserWarning)  # build_application's per_message note
+
+    from catalogue import make_rows
+    from fake_telegram import StubRequest, callback_update, message_update
+    import handlers
+    from bot import build_application
+    from inventory_cache import InventoryCache
+    from lifecycle import CallCounter
+    from search_stats import SearchStatsWriter
+    from shared_inventory import SharedInventory
+    from sheet import SheetHandler
+    from stats_relay import StatsForwarder
+
+    workdir = args.child
+    if args.mode == "shared":
+        handlers.inventory_cache = SharedInventory(os.path.join(workdir, "shared"))
+        handlers.stats_writer = StatsForwarder(os.path.join(workdir, "stats"), os.path.join(workdir, "stats.sock"))
+    else:
+        stats_dir = os.path.join(workdir, f"stats-{args.worker}")
+        os.makedirs(stats_dir, exist_ok=True)
+        handlers.stats_writer = SearchStatsWriter(stats_dir, handlers.CATEGORIES)
+        handlers.inventory_cache = InventoryCache(SheetHandler(os.path.join(workdir, "Article.csv")),
+                                                  handlers.categories.keywords(), brands=handlers.brands)
+    first = FIRST_CHAT + args.worker * args.chats
+    chats = [first + c for c in range(args.chats)]
+    handlers.whitelist = set(chats)
+    rows = make_rows(args.rows)
+    plan = make_plan(rows, parse_mix(args.mix), args.chats * args.sessions, handlers.CATEGORY_MAPPING,
+                     seed=args.worker)
+
+    async def run():
+        stub = StubRequest(args.latency)
+        app = build_application(ApplicationBuilder().token(f"{args.worker + 1}:stub").request(stub)
+                                .updater(None).rate_limiter(CallCounter()))
+        await app.initialize()
+        handlers.stats_writer.start()
+        t0 = time.perf_counter()
+        snapshot = await handlers.inventory_cache.get()
+        load = time.perf_counter() - t0
+        loaded = memory()
+        digest = outcome_digest(snapshot.index, plan, handlers.CATEGORY_MAPPING)
+
+        # Everyone starts together
+        print("ready", flush=True)
+        await asyncio.get_running_loop().run_in_executor(None, sys.stdin.readline)
+        update_ids = iter(range(1, 10 ** 9))
+
+        async def session(chat_id, kind, category, query):
+            for update in (message_update(next(update_ids), chat_id, "/start"),
+                           callback_update(next(update_ids), chat_id, category),
+                           message_update(next(update_ids), chat_id, query)):
+                await app.process_update(Update.de_json(update, app.bot))
+            data = last_select(stub, chat_id)
+            if data:
+                await app.process_update(Update.de_json(callback_update(next(update_ids), chat_id, data), app.bot))
+
+        async def chat(c, chat_id):
+            for s in range(args.sessions):
+                await session(chat_id, *plan[c * args.sessions + s])
+
+        updates_before = len(stub.calls)
+        t0 = time.perf_counter()
+        await asyncio.gather(*(chat(c, chat_id) for c, chat_id in enumerate(chats)))
+        elapsed = time.perf_counter() - t0
+        after = memory()
+        await handlers.stats_writer.stop()
+        await app.shutdown()
+        writer = handlers.stats_writer
+        return {
+            "worker": args.worker, "elapsed_s": elapsed, "load_s": load, "digest": digest,
+            "updates": next(update_ids) - 1, "api_calls": len(stub.calls) - updates_before,
+            "searches": writer.sent if args.mode == "shared" else writer.written,
+            "dropped": writer.dropped, "loaded": loaded, "after": after,
+        }
+
+    print(json.dumps(asyncio.run(run())), flush=True)
+
+
+async def run_mode(mode, args, workdir):
+    import handlers
+    from inventory_cache import InventoryCache
+    from search_stats import SearchStatsWriter
+    from shared_inventory import SnapshotPublisher
+    from sheet import SheetHandler
+    from stats_relay import StatsRelay
+
+    loader = writer = relay = None
+    if mode == "shared":
+        publisher = SnapshotPublisher(os.path.join(workdir, "shared"))
+        loader = InventoryCache(SheetHandler(os.path.join(workdir, "Article.csv")), handlers.categories.keywords(),
+                                brands=handlers.brands, publish=publisher.publish)
+        t0 = time.perf_counter()
+        await loader.refresh()
+        await loader._save_task
+        publish_s = time.perf_counter() - t0
+        os.makedirs(os.path.join(workdir, "stats"), exist_ok=True)
+        writer = SearchStatsWriter(os.path.join(workdir, "stats"), handlers.CATEGORIES)
+        writer.start()
+        relay = await StatsRelay(writer, os.path.join(workdir, "stats.sock")).start()
+
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", workdir, "--mode", mode, "--rows", str(args.rows),
+           "--chats", str(args.chats), "--sessions", str(args.sessions), "--latency", str(args.latency),
+           "--mix", args.mix]
+    # The bot runs from the repo root (brands.txt, stats/)
+    procs = [await asyncio.create_subprocess_exec(*cmd, "--worker", str(n), cwd=ROOT, stdin=asyncio.subprocess.PIPE,
+                                                  stdout=asyncio.subprocess.PIPE)
+             for n in range(args.workers)]
+    for proc in procs:
+        line = await proc.stdout.readline()
+        if line.strip() != b"ready":
+            raise RuntimeError(f"worker failed to start: {line!r}")
+    t0 = time.perf_counter()
+    for proc in procs:
+        proc.stdin.write(b"go\n")
+        await proc.stdin.drain()
+    results = []
+    for proc in procs:
+        out = await proc.stdout.read()
+        if await proc.wait():
+            raise RuntimeError(f"worker exited with {proc.returncode}")
+        results.append(json.loads(out.decode().strip().splitlines()[-1]))
+    wall = time.perf_counter() - t0
+
+    summary = {"mode": mode, "workers": results, "wall_s": wall,
+               "updates": sum(r["updates"] for r in results), "searches": sum(r["searches"] for r in results)}
+    if mode == "shared":
+        await relay.stop()
+        await writer.stop()
+        db = sqlite3.connect(writer.store.path)
+        summary["stored"] = db.execute("SELECT COUNT(*) FROM searches").fetchone()[0]
+        db.close()
+        summary["relayed"] = relay.received
+        summary["publish_s"] = publish_s
+        summary["loader"] = memory()
+        summary["snapshot_mb"] = sum(os.path.getsize(entry.path) for entry in
+                                     os.scandir(os.path.join(workdir, "shared"))
+                                     if entry.name.endswith(".snap")) / 2 ** 20
+    return summary
+
+
+class Sink:
+    # Stands in for the loader's SearchStatsWriter
+    def __init__(self):
+        self.recorded = 0
+
+    def record(self, category, model, available, now=None):
+        self.recorded += 1
+
+
+async def relay_restart(workdir, n=100):
+    """(received, dropped) of 3n searches, n of them made while the relay was
+    down and n more past a backlog of 1.5n."""
+    from stats_relay import StatsForwarder, StatsRelay
+    logging.getLogger("stats_relay").disabled = True  # the outage is expected
+    path = os.path.join(workdir, "restart.sock")
+    sink = Sink()
+    relay = await StatsRelay(sink, path).start()
+    forwarder = StatsForwarder(workdir, path, backlog_size=n * 3 // 2, retry_interval=0.05)
+    forwarder.start()
+
+    async def searches():
+        for i in range(n):
+            forwarder.record("LCD", f"model {i}", True)
+        await asyncio.sleep(0.3)
+
+    await searches()
+    await relay.stop(timeout=0.1)
+    await asyncio.sleep(0.1)
+    await searches()
+    await searches()
+    relay = await StatsRelay(sink, path).start()
+    await forwarder.stop()
+    await relay.stop()
+    return sink.recorded, forwarder.dropped
+
+
+def report(summary):
+    workers = summary["workers"]
+    n = len(workers)
+
+    def mean(key, field):
+        values = [w[key].get(field, 0) for w in workers]
+        return sum(values) / n
+
+    print(f"\n{summary['mode']}: {n} workers, {summary['updates']} updates in {summary['wall_s']:.2f} s, "
+          f"aggregate {summary['updates'] / summary['wall_s']:.0f} updates/s")
+    print(f"  inventory ready in   {sum(w['load_s'] for w in workers) / n * 1000:8.0f} ms per worker")
+    for key in ("loaded", "after"):
+        print(f"  memory {key:<7}      rss {mean(key, 'rss_mb'):6.1f} MB   pss {mean(key, 'pss_mb'):6.1f} MB   "
+              f"private {mean(key, 'private_mb'):6.1f} MB per worker")
+    if summary["mode"] == "shared":
+        print(f"  loader               rss {summary['loader'].get('rss_mb', 0):6.1f} MB, snapshot file "
+              f"{summary['snapshot_mb']:.1f} MB, load and publish {summary['publish_s'] * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per stub Bot API call")
+    parser.add_argument("--mix", default="exact=4,typo=2,miss=2,multi=2")
+    parser.add_argument("--child")
+    parser.add_argument("--mode", choices=["private", "shared"])
+    parser.add_argument("--worker", type=int, default=0)
+    args = parser.parse_args()
+    if args.child:
+        child(args)
+        return
+
+    from catalogue import write_csv
+    summaries = {}
+    for mode in ("private", "shared"):
+        with tempfile.TemporaryDirectory() as workdir:
+            write_csv(os.path.join(workdir, "Article.csv"), args.rows)
+            summaries[mode] = asyncio.run(run_mode(mode, args, workdir))
+    with tempfile.TemporaryDirectory() as workdir:
+        received, dropped = asyncio.run(relay_restart(workdir))
+    print(f"{args.rows} articles, {args.chats} chats x {args.sessions} sessions per worker, mix {args.mix}")
+    for summary in summaries.values():
+        report(summary)
+
+    private, shared = summaries["private"], summaries["shared"]
+    checks = {
+        "same search outcomes": [w["digest"] for w in private["workers"]] == [w["digest"] for w in shared["workers"]],
+        "every search relayed": shared["relayed"] == shared["searches"] == private["searches"],
+        "stored once": shared["stored"] == shared["relayed"],
+        "nothing dropped": not any(w["dropped"] for s in summaries.values() for w in s["workers"]),
+        "relay restart resent": received == 250 and dropped == 50,
+    }
+    print()
+    for name, passed in checks.items():
+        print(f"  {name:<24}{'ok' if passed else 'FAILED'}")
+    ok = all(checks.values())
+    print("OK" if ok else "MISMATCH")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# ================== benchmarks/catalogue.py ==================
+# Synthetic Article.csv catalogues and query mixes shared by the benchmarks.
+import csv
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sheet import Article
+
+CATEGORY_WORDS = ["Lcd", "Batterie", "CC", "Glass", "Glass Cam", "Cover", "Sersou"]
+BRAND_MODELS = {
+    "Iphone": ["6", "7", "8 Plus", "X", "Xs Max", "11", "11 Pro", "12", "12 Pro Max", "13", "14 Pro"],
+    "Samsung": ["A10", "A12", "A21s", "A32", "A52", "A53", "S10", "S20 Fe", "Note 10", "M31"],
+    "Redmi": ["9", "9A", "9C", "10", "Note 8", "Note 9", "Note 10 Pro", "Note 11", "12C"],
+    "Oppo": ["A15", "A16", "A17K", "A54", "A74", "Reno 5", "F9"],
+    "Huawei": ["Y6 2019", "Y7 Prime", "P20 Lite", "P30", "Mate 20"],
+    "Realme": ["C11", "C21", "C35", "8", "9 Pro"],
+    "Infinix": ["Hot 10", "Hot 11", "Smart 5", "Note 12"],
+    "Tecno": ["Spark 7", "Spark 8", "Camon 17", "Pop 5"],
+}
+GLUED_EVERY = 25  # at most one designation in this many writes "IPHONE11", "REDMI9A"
+QUALITIES = ["Org", "Oled", "Incell", "Copy", "Service Pack", "Noir", "Blanc", ""]
+
+
+def make_rows(n, seed=1):
+    rng = random.Random(seed)
+    rows = []
+    seen = set()
+    brands = list(BRAND_MODELS)
+    while len(rows) < n:
+        brand = rng.choice(brands)
+        category, model = rng.choice(CATEGORY_WORDS), rng.choice(BRAND_MODELS[brand])
+        first, _, rest = model.partition(" ")
+        if len(rows) % GLUED_EVERY == GLUED_EVERY - 1 and len(first.rstrip("0123456789")) <= 2:
+            # Some designations glue the brand to a model number: "Lcd IPHONE11 Pro", "Cc REDMI9A"
+            brand, model = f"{brand}{first}".upper(), rest
+        name = " ".join(filter(None, [
+            category, brand, model, rng.choice(QUALITIES), f"V{len(rows) // 500}" if n > 2000 else "",
+        ]))
+        if name in seen:
+            name = f"{name} {len(rows)}"
+        seen.add(name)
+        qt = rng.choice([0, 0, 1, 2, 5, 10, 3.0])
+        pu = rng.choice([800, 1500, 2500, 3200, 4500, 12000])
+        rows.append({"Designation1": name, "PU": str(pu), "QT": str(qt)})
+    return rows
+
+
+def write_csv(path, n, seed=1):
+    rows = make_rows(n, seed)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Code", "Designation1", "Famille", "PU", "QT"])
+        for i, row in enumerate(rows):
+            writer.writerow([f"A{i:06d}", row["Designation1"], "PIECES", row["PU"], row["QT"]])
+    return rows
+
+
+def make_articles(n, seed=1):
+    return [Article(row["Designation1"], float(row["PU"]), float(row["QT"]) if float(row["QT"]) > 0 else 0.0)
+            for row in make_rows(n, seed)]
+
+
+def make_queries(rows, n, seed=2):
+    """(kind, query) pairs: exact hits, typos, misses, multi-match and short queries."""
+    rng = random.Random(seed)
+    names = [row.designation.lower() for row in rows]
+    queries = []
+    for _ in range(n):
+        kind = rng.choice(["exact", "exact", "typo", "miss", "multi", "short"])
+        name = rng.choice(names)
+        if kind == "exact":
+            words = name.split()
+            q = " ".join(words[1:4]) if len(words) > 2 else name
+        elif kind == "typo":
+            pos = rng.randrange(len(name))
+            q = name[:pos] + name[pos + 1:]
+        elif kind == "miss":
+            q = f"{rng.choice(['nokia', 'pixel', 'xperia'])} {rng.randint(1, 99)}"
+        elif kind == "multi":
+            brand = rng.choice(list(BRAND_MODELS)).lower()
+            q = f"{brand} {rng.choice(BRAND_MODELS[brand.title()]).lower().split()[0]}"
+        else:
+            q = rng.choice(["a5", "x", "9", "11"])
+        queries.append((kind, q))
+    return queries
@@ -0,0 +1,161 @@
+# ================== benchmarks/fake_telegram.py ==================
+# Offline stand-ins for the Telegram Bot API, for benchmarks. Point a bot at
+# FakeTelegram with ApplicationBuilder().base_url(f"{fake.url}/bot"), or skip
+# HTTP entirely with ApplicationBuilder().request(StubRequest()); either way
+# every call is recorded and answered after `latency` seconds with a
+# plausible result.
+# With chat_limit / global_limit set it also enforces flood control the way
+# Telegram does, answering 429 with a retry_after once a chat (or the bot)
+# has had that many messages within the last second.
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from urllib.parse import parse_qsl
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram.request import BaseRequest
+
+from httpd import HTTPServer
+
+BOT_USER = {"id": 1000, "is_bot": True, "first_name": "Fake", "username": "fake_store_bot",
+            "can_join_groups": False, "can_read_all_group_messages": False, "supports_inline_queries": True}
+MESSAGE_METHODS = {"sendMessage", "editMessageText", "editMessageReplyMarkup"}
+
+
+def user(user_id):
+    return {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"}
+
+
+def chat(chat_id):
+    return {"id": chat_id, "type": "private", "first_name": f"User {chat_id}"}
+
+
+_message_ids = itertools.count(1)
+
+
+def message_update(update_id, chat_id, text):
+    message = {"message_id": next(_message_ids), "date": int(time.time()), "chat": chat(chat_id),
+               "from": user(chat_id), "text": text}
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+def callback_update(update_id, chat_id, data, message_id=1):
+    message = {"message_id": message_id, "date": int(time.time()), "chat": chat(chat_id),
+               "from": BOT_USER, "text": "…"}
+    return {"update_id": update_id, "callback_query": {
+        "id": str(update_id), "from": user(chat_id), "chat_instance": str(chat_id),
+        "message": message, "data": data}}
+
+
+def inline_update(update_id, user_id, query, offset=""):
+    return {"update_id": update_id, "inline_query": {
+        "id": str(update_id), "from": user(user_id), "query": query, "offset": offset}}
+
+
+def api_result(method, params):
+    if method == "getMe":
+        return BOT_USER
+    if method == "getUpdates":
+        return []
+    if method in MESSAGE_METHODS:
+        chat_id = int(params.get("chat_id", 0))
+        return {"message_id": next(_message_ids), "date": int(time.time()), "chat": chat(chat_id),
+                "from": BOT_USER, "text": params.get("text", "")}
+    return True
+
+
+class StubRequest(BaseRequest):
+    """In-process BaseRequest: no sockets, so timings are the bot's own."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = []
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def calls_to(self, method):
+        return [params for _, name, params in self.calls if name == method]
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        name = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data is not None else {}
+        self.calls.append((time.monotonic(), name, params))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return 200, json.dumps({"ok": True, "result": api_result(name, params)}).encode()
+
+
+class FakeTelegram:
+    """Records Bot API calls as (time, method, params) and answers them."""
+
+    def __init__(self, latency=0.0, host="127.0.0.1", port=0, chat_limit=None, global_limit=None):
+        self.latency = latency
+        self.chat_limit = chat_limit
+        self.global_limit = global_limit
+        self.calls = []
+        self.flooded = []  # (time, method, params) answered with 429
+        self.sent = {}     # chat_id -> times of accepted messages
+        self.sent_all = deque()
+        self.server = HTTPServer(self.handle, host, port)
+
+    @property
+    def url(self):
+        return f"http://{self.server.host}:{self.server.port}"
+
+    async def start(self):
+        await self.server.start()
+        return self
+
+    async def stop(self):
+        await self.server.stop()
+
+    def calls_to(self, method):
+        return [params for _, name, params in self.calls if name == method]
+
+    async def handle(self, request):
+        method = request.path.rsplit("/", 1)[-1]
+        if request.headers.get("content-type", "").startswith("application/json"):
+            params = json.loads(request.body or b"{}")
+        else:
+            params = dict(parse_qsl(request.body.decode("utf-8")))
+        now = time.monotonic()
+        if method in MESSAGE_METHODS:
+            retry_after = self.flood_check(int(params.get("chat_id", 0)), now)
+            if retry_after:
+                self.flooded.append((now, method, params))
+                return 429, "application/json", json.dumps({
+                    "ok": False, "error_code": 429, "description": f"Too Many Requests: retry after {retry_after}",
+                    "parameters": {"retry_after": retry_after}}).encode()
+        self.calls.append((now, method, params))
+        if method == "getUpdates":
+            # Long polling with nothing to deliver
+            await asyncio.sleep(min(float(params.get("timeout", 0) or 0), 1.0))
+        elif self.latency:
+            await asyncio.sleep(self.latency)
+        return 200, "application/json", json.dumps({"ok": True, "result": api_result(method, params)}).encode()
+
+    def flood_check(self, chat_id, now):
+        # Seconds to wait, or 0 if the message is accepted
+        window = self.sent.setdefault(chat_id, deque())
+        for times in (window, self.sent_all):
+            while times and now - times[0] >= 1:
+                times.popleft()
+        if self.chat_limit and len(window) >= self.chat_limit:
+            return 1
+        if self.global_limit and len(self.sent_all) >= self.global_limit:
+            return 1
+        window.append(now)
+        self.sent_all.append(now)
+        return 0
@@ -1,4 +1,5 @@
 # ================== bot.py ==================
+import asyncio
 import logging
 from telegram.ext import (
     ApplicationBuilder,
@@ -6,41 +7,111 @@ from telegram.ext import (
     MessageHandler,
     CallbackQueryHandler,
     ConversationHandler,
+    InlineQueryHandler,
     filters
 )
-from config import BOT_TOKEN
+from config import (
+    BOT_TOKEN,
+    BOT_MODE,
+    WEBHOOK_URL,
+    WEBHOOK_LISTEN,
+    WEBHOOK_PORT,
+    WEBHOOK_SECRET,
+    WEBHOOK_MAX_CONCURRENT,
+    LOG_FILE,
+    SEARCH_EVENTS_FILE,
+    LOG_LEVEL,
+    LOG_LEVELS,
+    LOG_MAX_BYTES,
+    LOG_BACKUPS,
+    LOG_ROTATE_WHEN,
+    LOG_HTTP_SAMPLE,
+    METRICS_LISTEN,
+    METRICS_PORT,
+    BOT_ROLE,
+    BOT_WORKER
+)
+from httpd import HTTPServer
+from metrics import metrics, handle_http
+from logsetup import setup_logging, parse_levels
+from outbound import OutboundScheduler
+from webhook import run_webhook
+from workers import worker_path
 from handlers import (
     start,
     category_selected,
     handle_model,
     summary,
+    metrics_command,
     handle_summary_callback,
     CHOOSE_CATEGORY,
     ASK_MODEL,
     handle_model_selection,
-    restart_search
+    handle_match_page,
+    handle_notify,
+    handle_inline_query,
+    restart_search,
+    stats_writer,
+    inventory_cache,
+    whitelist,
+    brands,
+    lifecycle,
+    report_builder,
+    stock_alerts,
+    inline_debouncer
 )
 
-# Logger setup
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s %(levelname)s:%(message)s',
-    handlers=[
-        logging.FileHandler("bot.log"),
-        logging.StreamHandler()
-    ]
-)
+outbound = OutboundScheduler()
+metrics.register("api_calls", lambda: dict(outbound.calls), label="endpoint")
+metrics.register("outbound", lambda: outbound.stats, label="stat")
+metrics.register("outbound_lanes", lambda: len(outbound.lanes))
+metrics.register("calls_saved", lambda: dict(lifecycle.saved), label="kind")
+metrics_server = HTTPServer(handle_http, METRICS_LISTEN, METRICS_PORT + BOT_WORKER) if METRICS_PORT else None
 
-if __name__ == '__main__':
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+async def on_startup(app):
+    stats_writer.start()
+    whitelist.start()
+    if BOT_ROLE != "worker":
+        # In a worker, the loader process watches brands.txt and builds the reports
+        brands.start()
+        report_builder.start()
+    if metrics_server:
+        await metrics_server.start()
+    await stock_alerts.start(app.bot)
+    # Load the catalogue before the first customer asks for it
+    inventory_cache.refresh_in_background()
+
+async def on_shutdown(app):
+    # Write any queued searches and the final workbook before exiting
+    await stats_writer.stop()
+    await whitelist.stop()
+    await brands.stop()
+    await report_builder.stop()
+    await stock_alerts.stop()
+    await inline_debouncer.stop()
+    if metrics_server:
+        await metrics_server.stop()
+    logging.info("API calls per interaction: %s", lifecycle.calls_per_interaction())
+    logging.info("API calls saved: %s, outbound: %s", dict(lifecycle.saved), outbound.stats)
+
+def build_application(builder=None):
+    """The bot with all its handlers. bot.py runs it; benchmarks pass their
+    own builder (stub request, no updater) and feed it updates."""
+    if builder is None:
+        builder = ApplicationBuilder().token(BOT_TOKEN).rate_limiter(outbound)
+    app = builder.post_init(on_startup).post_shutdown(on_shutdown).build()
 
     conv_handler = ConversationHandler(
         entry_points=[CommandHandler("start", start)],
         states={
-            CHOOSE_CATEGORY: [CallbackQueryHandler(category_selected)],
+            CHOOSE_CATEGORY: [
+                CallbackQueryHandler(handle_notify, pattern="^notify::"),
+                CallbackQueryHandler(category_selected)
+            ],
             ASK_MODEL: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, handle_model),
-                CallbackQueryHandler(handle_model_selection, pattern="^select::")
+                CallbackQueryHandler(handle_model_selection, pattern="^select::"),
+                CallbackQueryHandler(handle_match_page, pattern="^page::")
             ],
         },
         fallbacks=[],
@@ -50,8 +121,35 @@ if __name__ == '__main__':
 
     app.add_handler(conv_handler)
     app.add_handler(CallbackQueryHandler(restart_search, pattern="^restart$"))
+    app.add_handler(CallbackQueryHandler(handle_notify, pattern="^notify::"))
+    app.add_handler(InlineQueryHandler(handle_inline_query))
     app.add_handler(CommandHandler("summary", summary))
+    app.add_handler(CommandHandler("metrics", metrics_command))
     app.add_handler(CallbackQueryHandler(handle_summary_callback, pattern="^summary_"))
+    return app
+
+def main():
+    # Logger setup: file and console output are written by a background thread
+    setup_logging(
+        log_file=worker_path(LOG_FILE),
+        events_file=worker_path(SEARCH_EVENTS_FILE),
+        level=LOG_LEVEL,
+        levels=parse_levels(LOG_LEVELS),
+        http_sample=LOG_HTTP_SAMPLE,
+        max_bytes=LOG_MAX_BYTES,
+        when=LOG_ROTATE_WHEN,
+        backups=LOG_BACKUPS,
+        secrets=[BOT_TOKEN, WEBHOOK_SECRET]
+    )
 
+    app = build_application()
     logging.info("Bot started...")
-    app.run_polling()
+    if BOT_MODE == "webhook":
+        # Updates of different chats are handled concurrently, each chat in order
+        asyncio.run(run_webhook(app, WEBHOOK_URL.replace("{worker}", str(BOT_WORKER)), WEBHOOK_LISTEN,
+                                WEBHOOK_PORT + BOT_WORKER, WEBHOOK_SECRET, WEBHOOK_MAX_CONCURRENT))
+    else:
+        app.run_polling()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# ================== brands.py ==================
+import re
+from collections import defaultdict
+from difflib import get_close_matches
+from file_utils import FileWatcher
+
+BRANDS_FILE = "brands.txt"
+CUTOFF = 0.8
+MAX_CORRECTIONS = 4096  # memoized query words, cleared when full
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_GLUED_RE = re.compile(r"\d[a-z0-9]*|[a-z]{1,2}\d*")  # model glued to a brand: "11", "9a", "x", "xs", "k10"
+
+
+def tokens(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+def load_brands(path=BRANDS_FILE):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+class BrandMatcher:
+    """Brand lookups built once per brands.txt load, keyed by lowercase brand.
+
+    Designations are tagged through a token index (first brand token ->
+    brand token sequences), so "lg" matches the word LG and not the letters
+    inside another word. A brand glued to its model ("IPHONE11", "REDMI9A",
+    "IPHONEX") is matched too: the model must start with a digit, or for
+    brands of four letters or more be one or two letters ("xs"), so "blue"
+    is not Blu. Brands come back in brands.txt order, so the first
+    one is the tag to show (iPhone before Apple). Query correction gives the
+    same answer as get_close_matches over the lowercase brands, but only
+    compares brands of a compatible length and remembers the words it has
+    corrected.
+    """
+
+    def __init__(self, brands, cutoff=CUTOFF):
+        self.brands = list(dict.fromkeys(brand.lower() for brand in brands))
+        self.key = tuple(self.brands)
+        self.cutoff = cutoff
+        self.exact = {brand: i for i, brand in enumerate(self.brands)}
+        self.by_token = defaultdict(list)
+        self.by_length = defaultdict(list)
+        self.glued = {}  # single-token brand -> brand, for designations like "iphone11"
+        for brand in self.brands:
+            pattern = tuple(tokens(brand))
+            if pattern:
+                self.by_token[pattern[0]].append((pattern, brand))
+            if len(pattern) == 1:
+                self.glued.setdefault(pattern[0], brand)
+            self.by_length[len(brand)].append(brand)
+        self.glued_lengths = sorted({len(token) for token in self.glued})
+        self._corrections = {}
+
+    def __getstate__(self):
+        # Pickled with the inventory snapshot; the memo is rebuilt on use
+        return {**self.__dict__, "_corrections": {}}
+
+    def brands_in(self, designation):
+        """Every brand named in `designation`, in brands.txt order."""
+        words = tokens(designation)
+        found = set()
+        for j, word in enumerate(words):
+            for pattern, brand in self.by_token.get(word, ()):
+                if len(pattern) == 1 or tuple(words[j:j + len(pattern)]) == pattern:
+                    found.add(brand)
+            for n in self.glued_lengths:
+                if n >= len(word):
+                    break
+                brand = self.glued.get(word[:n])
+                if brand is not None and _GLUED_RE.fullmatch(word[n:]) and (n >= 4 or word[n].isdigit()):
+                    found.add(brand)
+        return tuple(sorted(found, key=self.exact.__getitem__))
+
+    def correct(self, word):
+        """The lowercase brand closest to `word`, or None."""
+        word = word.lower()
+        if word in self.exact:
+            return word
+        if word in self._corrections:
+            return self._corrections[word]
+        # get_close_matches drops any brand whose real_quick_ratio (length
+        # bound) is under the cutoff, so only these lengths can match
+        la = len(word)
+        candidates = [name for lb, names in self.by_length.items()
+                      if la + lb and 2.0 * min(la, lb) / (la + lb) >= self.cutoff for name in names]
+        matches = get_close_matches(word, candidates, n=1, cutoff=self.cutoff)
+        result = matches[0] if matches else None
+        if len(self._corrections) >= MAX_CORRECTIONS:
+            self._corrections.clear()
+        self._corrections[word] = result
+        return result
+
+
+class Brands:
+    """The current BrandMatcher, rebuilt when brands.txt changes."""
+
+    def __init__(self, path=BRANDS_FILE, interval=2):
+        self.watcher = FileWatcher(path, lambda p: BrandMatcher(load_brands(p)), interval)
+
+    @property
+    def matcher(self):
+        return self.watcher.value
+
+    def start(self):
+        self.watcher.start()
+
+    async def stop(self):
+        await self.watcher.stop()
@@ -6,3 +6,38 @@ load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 CREDS_FILE = os.getenv("CREDS_FILE")
 SPREADSHEET_NAME = os.getenv("SPREADSHEET_NAME")
+
+# Update delivery: "polling" (default) or "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_MAX_CONCURRENT = int(os.getenv("WEBHOOK_MAX_CONCURRENT", "32"))
+
+# Logging: LOG_LEVELS overrides single loggers ("httpx=WARNING,telegram=DEBUG");
+# files rotate at LOG_MAX_BYTES, or on LOG_ROTATE_WHEN (e.g. "midnight") if set
+LOG_FILE = os.getenv("LOG_FILE", "bot.log")
+SEARCH_EVENTS_FILE = os.getenv("SEARCH_EVENTS_FILE", "search_events.jsonl")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", "7"))
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN") or None
+LOG_HTTP_SAMPLE = int(os.getenv("LOG_HTTP_SAMPLE", "100"))
+
+# Telegram user ids allowed to run /metrics, comma-separated
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if x}
+# Prometheus text endpoint on METRICS_LISTEN:METRICS_PORT/metrics, off when unset
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Several bot processes (python workers.py): a loader process owns the CSV,
+# brands.txt and the search store, and starts one worker per BOT_TOKENS entry.
+# Worker N listens on WEBHOOK_PORT + N and METRICS_PORT + N; "{worker}" in
+# WEBHOOK_URL is replaced by N. BOT_ROLE and BOT_WORKER are set by workers.py.
+BOT_TOKENS = [x for x in os.getenv("BOT_TOKENS", "").replace(" ", "").split(",") if x] or [BOT_TOKEN]
+BOT_ROLE = os.getenv("BOT_ROLE", "")
+BOT_WORKER = int(os.getenv("BOT_WORKER", "0"))
+SHARED_DIR = os.getenv("SHARED_DIR", "shared")
+STATS_SOCKET = os.getenv("STATS_SOCKET", "stats.sock")
@@ -1,29 +1,210 @@
+import csv
+import hashlib
+import io
+import json
+import os
 import subprocess
+import tempfile
 import time
-import shutil
+from datetime import datetime
+from file_utils import write_atomic
+from sheet import INVENTORY_COLUMNS, NA_VALUES
 
 MDB_FILE = "Detail.mdb"
 CSV_FILE = "Article.csv"
 TABLE_NAME = "Article"
 EXPORT_INTERVAL_SECONDS = 180  # 3 minutes
+MDB_EXPORT = os.getenv("MDB_EXPORT", "mdb-export")
+DELTA_HISTORY = 20  # delta files kept for bots that are a few generations behind
 
-def export_articles():
+# Articles of the last published generation, so the next delta doesn't
+# have to re-read the old CSV
+_published = {"generation": None, "articles": None}
+
+
+def manifest_path(csv_file=CSV_FILE):
+    return os.path.splitext(csv_file)[0] + ".manifest.json"
+
+
+def delta_path(generation, csv_file=CSV_FILE):
+    return os.path.splitext(csv_file)[0] + f".delta-{generation:06d}.json"
+
+
+def read_manifest(csv_file=CSV_FILE):
     try:
-        print("Exporting Articles table...")
-        result = subprocess.run(
-            ["mdb-export", MDB_FILE, TABLE_NAME],
-            check=True,
-            capture_output=True,
-            text=True
-        )
-        with open(CSV_FILE, "w", encoding="utf-8") as f:
-            f.write(result.stdout)
-        print("Articles table exported successfully.")
-    except subprocess.CalledProcessError as e:
-        print("Error exporting table:", e.stderr)
+        with open(manifest_path(csv_file), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def file_stat(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _tee(lines, out, digest):
+    for line in lines:
+        out.write(line)
+        digest.update(line.encode("utf-8"))
+        yield line
+
+
+def collect_articles(records):
+    """{(designation, occurrence): [PU, QT]} from csv.reader records, header first.
+
+    Returns None when the header lacks the inventory columns. Designations are
+    stripped like the bot does; the occurrence number tells duplicates apart.
+    """
+    header = next(records, None)
+    if header is None or any(column not in header for column in INVENTORY_COLUMNS):
+        for _ in records:
+            pass
+        return None
+    name_col, pu_col, qt_col = (header.index(column) for column in INVENTORY_COLUMNS)
+    width = max(name_col, pu_col, qt_col)
+    articles = {}
+    seen = {}
+    for record in records:
+        if len(record) <= width or record[name_col] in NA_VALUES:
+            continue
+        designation = record[name_col].strip()
+        occurrence = seen[designation] = seen.get(designation, -1) + 1
+        articles[(designation, occurrence)] = [record[pu_col], record[qt_col]]
+    return articles
+
+
+def read_articles(csv_file):
+    try:
+        with open(csv_file, "r", encoding="utf-8", newline="") as f:
+            return collect_articles(csv.reader(f))
+    except OSError:
+        return None
+
+
+def diff_articles(old, new):
+    """Rows added, removed and with a changed PU/QT between two generations."""
+    added = [[*key, *values] for key, values in new.items() if key not in old]
+    removed = [list(key) for key in old if key not in new]
+    changed = [[*key, *values] for key, values in new.items()
+               if key in old and old[key] != values]
+    return {"added": added, "removed": removed, "changed": changed}
+
+
+def _publish_delta(base_generation, generation, old, new):
+    if old is None or new is None:
+        return None
+    delta = diff_articles(old, new)
+    delta["base_generation"] = base_generation
+    delta["generation"] = generation
+    write_atomic(delta_path(generation, CSV_FILE), json.dumps(delta, ensure_ascii=False))
+    stale = delta_path(generation - DELTA_HISTORY, CSV_FILE)
+    if os.path.exists(stale):
+        os.unlink(stale)
+    return delta
+
+
+def export_articles(force=False):
+    """Export the Article table if Detail.mdb changed; returns True when a new CSV was published."""
+    manifest = read_manifest(CSV_FILE)
+    csv_exists = os.path.exists(CSV_FILE)
+    try:
+        mdb_stat = file_stat(MDB_FILE)
+    except OSError as e:
+        print("Cannot read database file:", e)
+        return False
+
+    if not force and csv_exists and manifest.get("mdb_stat") == mdb_stat:
+        print("Database unchanged, skipping export.")
+        return False
+    mdb_sha256 = file_sha256(MDB_FILE)
+    if not force and csv_exists and manifest.get("mdb_sha256") == mdb_sha256:
+        print("Database touched but not modified, skipping export.")
+        manifest["mdb_stat"] = mdb_stat
+        write_atomic(manifest_path(CSV_FILE), json.dumps(manifest, indent=2))
+        return False
+
+    print("Exporting Articles table...")
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(CSV_FILE))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".csv")
+    try:
+        # Stream straight to the temp file instead of buffering all of stdout
+        with tempfile.TemporaryFile() as stderr, \
+                os.fdopen(fd, "w", encoding="utf-8", newline="") as out:
+            proc = subprocess.Popen([MDB_EXPORT, MDB_FILE, TABLE_NAME], stdout=subprocess.PIPE, stderr=stderr)
+            try:
+                lines = io.TextIOWrapper(proc.stdout, encoding="utf-8", newline="")
+                rows = 0
+
+                def counted(records):
+                    nonlocal rows
+                    for record in records:
+                        rows += 1
+                        yield record
+
+                articles = collect_articles(counted(csv.reader(_tee(lines, out, digest))))
+                returncode = proc.wait()
+            except BaseException:
+                # A bad row, a full disk or Ctrl+C mid-stream: don't leave the export running
+                proc.kill()
+                proc.wait()
+                raise
+            finally:
+                proc.stdout.close()
+            if returncode != 0:
+                stderr.seek(0)
+                print("Error exporting table:", stderr.read().decode("utf-8", "replace"))
+                os.unlink(tmp_path)
+                return False
+
+        checksum = digest.hexdigest()
+        if csv_exists and checksum == manifest.get("sha256"):
+            os.unlink(tmp_path)
+            print("Export identical to the published CSV, keeping it.")
+            published = False
+        else:
+            base_generation = manifest.get("generation")
+            if _published["generation"] == base_generation and base_generation is not None:
+                previous = _published["articles"]
+            else:
+                previous = read_articles(CSV_FILE) if base_generation is not None else None
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, CSV_FILE)
+            generation = (base_generation or 0) + 1
+            delta = _publish_delta(base_generation, generation, previous, articles)
+            _published["generation"] = generation
+            _published["articles"] = articles
+            manifest = {
+                "generation": generation,
+                "rows": max(rows - 1, 0),
+                "sha256": checksum,
+                "csv_size": os.path.getsize(CSV_FILE),
+                "exported_at": datetime.now().isoformat(timespec="seconds"),
+            }
+            if delta is not None:
+                manifest["delta"] = {key: len(delta[key]) for key in ("added", "removed", "changed")}
+            print(f"Articles table exported successfully (generation {manifest['generation']}, {manifest['rows']} rows).")
+            published = True
+        manifest["mdb_stat"] = mdb_stat
+        manifest["mdb_sha256"] = mdb_sha256
+        write_atomic(manifest_path(CSV_FILE), json.dumps(manifest, indent=2))
+        return published
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
 
 if __name__ == "__main__":
     while True:
         export_articles()
         time.sleep(EXPORT_INTERVAL_SECONDS)
-
@@ -0,0 +1,79 @@
+# ================== file_utils.py ==================
+import asyncio
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+
+def write_atomic(path, data):
+    # Readers see either the old file or the new one, never a partial write
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def file_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class FileWatcher:
+    """Keeps `loader(path)` in memory and reloads it when the file changes.
+
+    The file is polled with stat() from a background task, so readers of
+    `value` never touch the disk. A loader error keeps the previous value.
+    """
+
+    def __init__(self, path, loader, interval=2):
+        self.path = path
+        self.loader = loader
+        self.interval = interval
+        self.reloads = 0
+        self._signature = file_signature(path)
+        self.value = loader(path)
+        self._task = None
+
+    def check(self):
+        signature = file_signature(self.path)
+        if signature == self._signature:
+            return False
+        try:
+            value = self.loader(self.path)
+        except Exception as e:
+            logger.warning("Keeping previous %s, reload failed: %s", self.path, e)
+            return False
+        self._signature = signature
+        self.value = value
+        self.reloads += 1
+        logger.info("Reloaded %s", self.path)
+        return True
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.check()
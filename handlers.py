@@ -1,194 +1,133 @@
 # ================== handlers.py ==================
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram import KeyboardButton, ReplyKeyboardMarkup
-from telegram.constants import ChatAction
+from telegram import InlineQueryResultArticle, InputTextMessageContent
 from telegram.ext import ContextTypes, ConversationHandler
 from sheet import sheet_handler
-from difflib import get_close_matches
 import re
-import time
 import os
 from datetime import datetime
-from collections import Counter
-import asyncio
-import ast
-from openpyxl import Workbook, load_workbook
-from openpyxl.utils import get_column_letter
-from openpyxl.chart import PieChart, BarChart, Reference
-from collections import Counter
-from openpyxl.chart import LineChart
-
-WHITELIST_FILE = "whitelist.py"
-
-def load_whitelist():
-    try:
-        with open(WHITELIST_FILE, "r") as f:
-            data = f.read().strip()
-            if data.startswith("WHITELIST"):
-                wl = ast.literal_eval(data.split("=", 1)[1].strip())
-                return wl
-    except FileNotFoundError:
-        return []
-    return []
-
-# Load known brands from external file
-with open("brands.txt", "r", encoding="utf-8") as f:
-    KNOWN_BRANDS = [line.strip() for line in f if line.strip()]
+import logging
+from access import Whitelist, WHITELIST_FILE
+from brands import Brands, BRANDS_FILE
+from inventory_cache import InventoryCache
+from inventory_index import format_article_id, parse_article_id
+from inline_search import MAX_RESULTS, PAGE_SIZE, Debouncer, InlineSearch, normalize
+from query_cache import QueryCache
+from search_stats import SearchStatsWriter, format_summary
+from shared_inventory import SharedInventory
+from stats_relay import StatsForwarder
+from stock_alerts import ARTICLE, QUERY, SUBSCRIPTIONS_FILE, StockAlerts
+from rollups import SummaryRollups, parse_range, read_legacy_log
+from reports import ReportBuilder
+from lifecycle import RequestLifecycle
+from logsetup import SEARCH_EVENTS
+from metrics import metrics
+from config import ADMIN_IDS, BOT_ROLE, SHARED_DIR, STATS_SOCKET
+from keyboards import CATEGORIES, CATEGORY_LABELS, CATEGORY_MAPPING
+from keyboards import CategoryRegistry, MatchKeyboards, result_markup, with_notify_button
+from workers import worker_path
+
+whitelist = Whitelist(WHITELIST_FILE)
+
+# JSON lines for analytics, kept out of bot.log (see logsetup)
+search_events = logging.getLogger(SEARCH_EVENTS)
+
+# Known brands, reloaded when brands.txt changes
+brands = Brands(BRANDS_FILE)
 
 STORE_LOCATION_URL = "https://maps.app.goo.gl/RiURGuNtMyzSCmyDA"
 
 CHOOSE_CATEGORY, ASK_MODEL = range(2)
 
-inventory_cache = {
-    "timestamp": 0,
-    "data": None
-}
-
-CACHE_DURATION = 300
-
-LOG_DIR = "logs"
-os.makedirs(LOG_DIR, exist_ok=True)
 STATS_DIR = "stats"
 os.makedirs(STATS_DIR, exist_ok=True)
-CATEGORIES = ["LCD", "Battery", "Connector", "Glass", "COVER", "SERSOU"]
 
-CATEGORY_MAPPING = {
-    "LCD": "LCD",
-    "Battery": "BATTERIE",
-    "Connector": "CC",
-    "Glass": "GLASS",
-    "COVER": "COVER",
-    "SERSOU": "SERSOU"
-}
+# Static markups are built once and shared by every reply
+categories = CategoryRegistry(CATEGORIES, CATEGORY_MAPPING, CATEGORY_LABELS)
+RESULT_MARKUP = result_markup(STORE_LOCATION_URL)
+SUMMARY_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🗕 Résumé d'aujourd'hui", callback_data="summary_today")],
+    [InlineKeyboardButton("🗖 Résumé du mois", callback_data="summary_month")]
+])
+match_keyboards = MatchKeyboards(
+    lambda match: InlineKeyboardButton(match[1].designation, callback_data=f"select::{match[0]}")
+)
+
+# A worker process (see workers.py) sends its searches to the loader's writer
+# and serves the inventory snapshots the loader publishes
+if BOT_ROLE == "worker":
+    stats_writer = StatsForwarder(STATS_DIR, STATS_SOCKET)
+else:
+    stats_writer = SearchStatsWriter(STATS_DIR, CATEGORIES)
 
 async def log_request(category, model, available):
-    now = datetime.now()
-    date_str = now.strftime("%Y-%m-%d")
-    excel_file = os.path.join(STATS_DIR, f"{date_str}.xlsx")
-
-    # Create file if not exists
-    if not os.path.exists(excel_file):
-        wb = Workbook()
-        ws1 = wb.active
-        ws1.title = "Search Log"
-        ws1.append(["Time", "Category", "Model", "Status"])
-
-        wb.create_sheet("Category Summary")
-        wb.create_sheet("Not Available")
-        wb.create_sheet("Charts")
-        wb.create_sheet("Daily Trends")
-
-        wb.save(excel_file)
-
-    # Load workbook
-    wb = load_workbook(excel_file)
-
-    ws_log = wb["Search Log"]
-    ws_summary = wb["Category Summary"]
-    ws_na = wb["Not Available"]
-    ws_charts = wb["Charts"]
-    ws_trends = wb["Daily Trends"]
-
-    # Append to search log
-    status = "Available" if available else "Not available"
-    ws_log.append([now.strftime("%H:%M:%S"), category, model, status])
-
-    # Rebuild Not Available
-    ws_na.delete_rows(1, ws_na.max_row)
-    ws_na.append(["Time", "Category", "Model", "Status"])
-    for row in ws_log.iter_rows(min_row=2, values_only=True):
-        if row[3] == "Not available":
-            ws_na.append(row)
-
-    # Rebuild Category Summary
-    ws_summary.delete_rows(1, ws_summary.max_row)
-    ws_summary.append(["Category", "Searches"])
-    counts = {cat: 0 for cat in CATEGORIES}
-    for row in ws_log.iter_rows(min_row=2, values_only=True):
-        if row[1] in counts:
-            counts[row[1]] += 1
-    for cat in CATEGORIES:
-        ws_summary.append([cat, counts[cat]])
-
-    # Rebuild Daily Trends
-    ws_trends.delete_rows(1, ws_trends.max_row)
-    ws_trends.append(["Hour", "Searches"])
-    hours = [row[0][:2] for row in ws_log.iter_rows(min_row=2, values_only=True)]
-    hour_counts = Counter(hours)
-    for h in range(24):
-        hour_str = f"{h:02d}"
-        ws_trends.append([hour_str, hour_counts.get(hour_str, 0)])
-
-    # Rebuild Charts
-    ws_charts._charts.clear()
-
-    # Pie chart
-    pie = PieChart()
-    data = Reference(ws_summary, min_col=2, min_row=1, max_row=1+len(CATEGORIES))
-    labels = Reference(ws_summary, min_col=1, min_row=2, max_row=1+len(CATEGORIES))
-    pie.add_data(data, titles_from_data=True)
-    pie.set_categories(labels)
-    pie.title = "Searches by Category"
-    ws_charts.add_chart(pie, "B2")
-
-    # Bar chart
-    available_count = sum(1 for row in ws_log.iter_rows(min_row=2, values_only=True) if row[3] == "Available")
-    not_available_count = sum(1 for row in ws_log.iter_rows(min_row=2, values_only=True) if row[3] == "Not available")
-
-    ws_charts["E1"] = "Status"
-    ws_charts["F1"] = "Count"
-    ws_charts["E2"] = "Available"
-    ws_charts["F2"] = available_count
-    ws_charts["E3"] = "Not available"
-    ws_charts["F3"] = not_available_count
-
-    bar = BarChart()
-    data = Reference(ws_charts, min_col=6, min_row=1, max_row=3)
-    labels = Reference(ws_charts, min_col=5, min_row=2, max_row=3)
-    bar.add_data(data, titles_from_data=True)
-    bar.set_categories(labels)
-    bar.title = "Availability Status"
-    bar.y_axis.title = "Count"
-    bar.x_axis.title = "Status"
-    ws_charts.add_chart(bar, "E5")
-
-    # Line chart (Daily Trends)
-    line = LineChart()
-    data = Reference(ws_trends, min_col=2, min_row=1, max_row=25)
-    labels = Reference(ws_trends, min_col=1, min_row=2, max_row=25)
-    line.add_data(data, titles_from_data=True)
-    line.set_categories(labels)
-    line.title = "Searches by Hour"
-    line.x_axis.title = "Hour"
-    line.y_axis.title = "Searches"
-    ws_charts.add_chart(line, "B20")
-
-    wb.save(excel_file)
-
-async def get_cached_inventory():
-    now = time.time()
-    if inventory_cache["data"] is None or now - inventory_cache["timestamp"] > CACHE_DURATION:
-        data = await sheet_handler.get_inventory()
-        for row in data:
-            try:
-                qt_raw = str(row.get("QT", "")).strip()
-                row["QT"] = float(qt_raw) if qt_raw and float(qt_raw) > 0 else 0
-                pu_raw = str(row.get("PU", "")).strip()
-                row["PU"] = float(pu_raw) if pu_raw else 0
-            except:
-                row["QT"] = 0
-                row["PU"] = 0
-        inventory_cache["data"] = data
-        inventory_cache["timestamp"] = now
-    return inventory_cache["data"]
-
-import asyncio
-
-
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Queued only; the workbook is rebuilt by the stats writer in the background
+    with metrics.time("stage_seconds", stage="log_request"):
+        stats_writer.record(category, model, available)
+        search_events.info("search", extra={"event": {"category": category, "model": model, "available": available}})
+
+rollups = SummaryRollups(stats_writer)
+report_builder = ReportBuilder(STATS_DIR, CATEGORIES)
+
+# Each bot (and each worker, with its own token) keeps its own subscribers
+stock_alerts = StockAlerts(worker_path(SUBSCRIPTIONS_FILE))
+
+if BOT_ROLE == "worker":
+    inventory_cache = SharedInventory(SHARED_DIR, on_restock=stock_alerts.restocked)
+else:
+    inventory_cache = InventoryCache(sheet_handler, categories.keywords(), brands=brands,
+                                     on_restock=stock_alerts.restocked)
+query_cache = QueryCache()
+# Inline queries ("@bot lcd a52") arrive on every keystroke
+inline_search = InlineSearch()
+inline_debouncer = Debouncer()
+INLINE_KEYWORDS = tuple(keyword.lower() for keyword in categories.keywords())
+INLINE_CACHE_TIME = 30  # seconds Telegram may reuse an inline answer for the same user and text
+
+# Read only when /metrics or the Prometheus endpoint asks
+metrics.register("inventory_cache", lambda: dict(inventory_cache.stats), label="stat")
+metrics.register("inventory_cache_hit_ratio", lambda: inventory_cache.stats["hits"] / max(
+    inventory_cache.stats["hits"] + inventory_cache.stats["misses"], 1))
+metrics.register("query_cache", lambda: dict(query_cache.stats), label="stat")
+metrics.register("query_cache_hit_ratio", query_cache.hit_ratio)
+metrics.register("query_cache_entries", lambda: len(query_cache))
+metrics.register("query_cache_bytes", lambda: query_cache.bytes)
+metrics.register("summary_rollups", lambda: dict(rollups.stats), label="stat")
+metrics.register("stats_queue_depth", lambda: stats_writer.queue.qsize() if stats_writer.queue else 0)
+metrics.register("stats_dropped", lambda: stats_writer.dropped)
+if BOT_ROLE == "worker":
+    metrics.register("stats_relay_backlog", lambda: len(stats_writer.backlog))
+metrics.register("inline_search", lambda: dict(inline_search.stats), label="stat")
+metrics.register("inline_debounce", lambda: dict(inline_debouncer.stats), label="stat")
+metrics.register("stock_alerts", lambda: dict(stock_alerts.stats), label="stat")
+metrics.register("stock_alert_subscriptions", lambda: len(stock_alerts))
+metrics.register("stock_alert_queue_depth", lambda: stock_alerts.queue.qsize() if stock_alerts.queue else 0)
+
+def article_token(snapshot, i):
+    # "<id epoch>.<base36 article id>", well under the 64-byte callback limit
+    return f"{snapshot.index.id_epoch}.{format_article_id(snapshot.index.article_ids[i])}"
+
+def resolve_token(snapshot, token):
+    """Row of an article_token in `snapshot`, or None when the article is gone
+    or the token was made before the article ids were renumbered."""
+    epoch, _, article_id = token.partition(".")
+    if epoch != snapshot.index.id_epoch or not (article_id.isascii() and article_id.isalnum()):
+        return None
+    return snapshot.index.by_id.get(parse_article_id(article_id))
+
+
+# "⏳ Processing..." only shows up when a handler is still running after
+# 300 ms, and the error fallback after 5 s
+lifecycle = RequestLifecycle(
+    timeout_text="❌ An error has occurred while processing your request. Please try again.",
+    timeout_markup=categories.menu
+)
+
+
+@lifecycle.track
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE, notice=None, markup=None):
     
     user_id = update.effective_user.id
-    whitelist = load_whitelist()
 
     if user_id not in whitelist:
         if update.message:
@@ -199,41 +138,22 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     
     context.user_data.clear()
-    buttons = [
-        [InlineKeyboardButton("📱 LCD", callback_data="LCD")],
-        [InlineKeyboardButton("🔋 Batterie", callback_data="Battery")],
-        [InlineKeyboardButton("🔌 Connecteur", callback_data="Connector")],
-        [InlineKeyboardButton("🧿 Glass", callback_data="Glass")],
-        [InlineKeyboardButton("📦 Cover", callback_data="COVER")],
-        [InlineKeyboardButton("🛠 Sersou", callback_data="SERSOU")]
-    ]
-    markup = InlineKeyboardMarkup(buttons)
-
-    # Send "processing..." first
+
+    # A notice from the caller goes out with the menu rather than on its own
+    text = "Bienvenue ! Choisissez une catégorie :"
+    if notice:
+        text = f"{notice}\n\n{text}"
+        lifecycle.saved["merged_replies"] += 1
+    markup = markup or categories.menu
     if update.message:
-        processing_msg = await update.message.reply_text("⏳ Processing...")
+        await update.message.reply_text(text, reply_markup=markup)
     elif update.callback_query:
-        processing_msg = await update.callback_query.message.reply_text("⏳ Processing...")
-    else:
-        return CHOOSE_CATEGORY
-
-    async def send_menu():
-        if update.message:
-            await processing_msg.edit_text("Bienvenue ! Choisissez une catégorie :", reply_markup=markup)
-        elif update.callback_query:
-            await processing_msg.edit_text("Bienvenue ! Choisissez une catégorie :", reply_markup=markup)
-
-    try:
-        await asyncio.wait_for(send_menu(), timeout=5)
-    except asyncio.TimeoutError:
-        await processing_msg.edit_text(
-            "❌ Une erreur est survenue lors du traitement de votre requête. Veuillez réessayer.",
-            reply_markup=markup
-        )
+        await update.callback_query.message.reply_text(text, reply_markup=markup)
 
     return CHOOSE_CATEGORY
 
 
+@lifecycle.track
 async def category_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     try:
@@ -245,50 +165,46 @@ async def category_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if category == "restart":
         return await restart_search(update, context)
 
-    context.user_data["category"] = category
-
-    # Show instant "processing…" message
-    processing_msg = await query.message.reply_text("⏳ Processing...")
-
-    # Timeout fallback (5s)
-    async def timeout_fallback():
-        await asyncio.sleep(5)
-        if not context.user_data.get("response_sent"):
-            buttons = [
-                [InlineKeyboardButton("📱 LCD", callback_data="LCD")],
-                [InlineKeyboardButton("🔋 Batterie", callback_data="Battery")],
-                [InlineKeyboardButton("🔌 Connecteur", callback_data="Connector")],
-                [InlineKeyboardButton("🧿 Glass", callback_data="Glass")],
-                [InlineKeyboardButton("📦 Cover", callback_data="COVER")],
-                [InlineKeyboardButton("🛠 Sersou", callback_data="SERSOU")]
-            ]
-            markup = InlineKeyboardMarkup(buttons)
-            await query.message.reply_text(
-                "❌ An error has occurred while processing your request. Please try again.",
-                reply_markup=markup
-            )
-
-    timeout_task = asyncio.create_task(timeout_fallback())
-
-    try:
-        await asyncio.sleep(0.5)
+    # A button from an older message (a match page, a summary) is no category
+    if category not in categories.by_key:
+        await query.message.reply_text("Veuillez choisir une catégorie :", reply_markup=categories.menu)
+        return CHOOSE_CATEGORY
 
-        timeout_task.cancel()
-        await processing_msg.delete()
-        context.user_data["response_sent"] = True
+    context.user_data["category"] = category
 
-        await query.message.reply_text(
-            f"Vous avez choisi la catégorie : {category}\n\nVeuillez maintenant entrer le modèle de téléphone 📱:"
-        )
-        return ASK_MODEL
+    await query.message.reply_text(
+        f"Vous avez choisi la catégorie : {category}\n\nVeuillez maintenant entrer le modèle de téléphone 📱:"
+    )
+    return ASK_MODEL
 
-    except Exception as e:
-        timeout_task.cancel()
-        await processing_msg.edit_text(
-            f"❌ Une erreur est survenue ({e}). Veuillez réessayer."
-        )
-        return CHOOSE_CATEGORY
+def search_inventory(index, keyword, user_input):
+    """(result, row ids, corrected query) for a model typed in a category."""
+    # Match brand correction, with the brands the index is tagged with
+    matcher = index.brand_matcher or brands.matcher
+    possible_brand = user_input.split()[0]
+    with metrics.time("stage_seconds", stage="brand_match"):
+        corrected_brand = matcher.correct(possible_brand)
+    if corrected_brand:
+        user_input = user_input.replace(possible_brand, corrected_brand)
 
+    # Rows the brand tags miss (a brand inside another word) are still found
+    # by the plain search when the narrowed one comes back empty
+    with metrics.time("stage_seconds", stage="filter"):
+        row_ids = index.find_ids(keyword, user_input, brand=corrected_brand)
+        if not row_ids and corrected_brand:
+            row_ids = index.find_ids(keyword, user_input)
+    if row_ids:
+        return ("hit" if len(row_ids) == 1 else "multi"), tuple(row_ids), user_input
+
+    with metrics.time("stage_seconds", stage="fuzzy"):
+        close = index.closest_id(keyword, user_input, cutoff=0.9, brand=corrected_brand)
+        if close is None and corrected_brand:
+            close = index.closest_id(keyword, user_input, cutoff=0.9)
+    if close is not None:
+        return "fuzzy", (close,), user_input
+    return "miss", (), user_input
+
+@lifecycle.track
 async def handle_model(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_input = update.message.text.strip().lower()
     category = context.user_data.get("category")
@@ -296,231 +212,227 @@ async def handle_model(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Veuillez d'abord choisir une catégorie avec /start.")
         return ConversationHandler.END
 
-    # Show instant feedback
-    processing_msg = await update.message.reply_text("⏳ Processing...")
-
-    # Start timeout task
-    async def timeout_fallback():
-        await asyncio.sleep(5)
-        if not context.user_data.get("response_sent"):
-            buttons = [
-                [InlineKeyboardButton("📱 LCD", callback_data="LCD")],
-                [InlineKeyboardButton("🔋 Batterie", callback_data="Battery")],
-                [InlineKeyboardButton("🔌 Connecteur", callback_data="Connector")],
-                [InlineKeyboardButton("🧿 Glass", callback_data="Glass")],
-                [InlineKeyboardButton("📦 Cover", callback_data="COVER")],
-                [InlineKeyboardButton("🛠 Sersou", callback_data="SERSOU")]
-            ]
-            markup = InlineKeyboardMarkup(buttons)
-            await update.message.reply_text(
-                "❌ An error has occurred while processing your request. Please try again.",
-                reply_markup=markup
-            )
-
-    timeout_task = asyncio.create_task(timeout_fallback())
-
-    await update.message.chat.send_action(action=ChatAction.TYPING)
-
     if not re.match(r"^[a-z0-9\s\-+_.]+$", user_input):
-        timeout_task.cancel()
-        await processing_msg.delete()
         await update.message.reply_text("❌ Entrée invalide. Veuillez saisir un modèle de téléphone valide.")
         return ASK_MODEL
 
-    # Match brand correction
-    input_words = user_input.split()
-    possible_brand = input_words[0]
-    matched_brand = get_close_matches(possible_brand, [b.lower() for b in KNOWN_BRANDS], n=1, cutoff=0.8)
-    if matched_brand:
-        corrected_brand = matched_brand[0]
-        user_input = user_input.replace(possible_brand, corrected_brand)
-
-    designation_keyword = CATEGORY_MAPPING.get(category, category)
-    data = await get_cached_inventory()
-    filtered_data = [row for row in data if designation_keyword.lower() in row["Designation1"].lower()]
-
-    potential_matches = [row for row in filtered_data if user_input in row["Designation1"].lower()]
-
-    if not potential_matches:
-        all_model_names = [row["Designation1"].lower() for row in filtered_data]
-        close = get_close_matches(user_input, all_model_names, n=1, cutoff=0.9)
-        timeout_task.cancel()
-        await processing_msg.delete()
-        if close:
-            for row in filtered_data:
-                if close[0] == row["Designation1"].lower():
-                    context.user_data["response_sent"] = True
-                    return await respond_with_inventory_info(update, context, row, category, user_input)
-
+    designation_keyword = categories.keyword(category)
+    with metrics.time("stage_seconds", stage="inventory"):
+        snapshot = await inventory_cache.get()
+    index = snapshot.index
+    cache_key = (designation_keyword, user_input)
+    outcome = query_cache.get(snapshot, cache_key)
+    if outcome is None:
+        outcome = search_inventory(index, designation_keyword, user_input)
+        query_cache.put(snapshot, cache_key, outcome)
+    result, row_ids, user_input = outcome
+    metrics.inc("searches", result=result)
+
+    if result == "miss":
         await log_request(category, user_input, False)
-        await update.message.reply_text(
+        # Callback data is capped at 64 bytes; longer queries get no button
+        data = f"notify::q::{category}::{user_input}"
+        markup = with_notify_button(categories.menu, data) if len(data.encode("utf-8")) <= 64 else None
+        return await start(update, context, notice=(
             f"❌ {user_input} n'est pas disponible dans notre inventaire. Essayez un autre modèle ou recommencez."
-        )
-        return await start(update, context)
+        ), markup=markup)
 
-    timeout_task.cancel()
-    await processing_msg.delete()
-    context.user_data["response_sent"] = True
-
-    if len(potential_matches) == 1:
-        return await respond_with_inventory_info(update, context, potential_matches[0], category, user_input)
+    if result != "multi":
+        i = row_ids[0]
+        return await respond_with_inventory_info(update, context, index.rows[i], category, user_input,
+                                                 index.brand(i), article_token(snapshot, i))
 
     # Multiple matches found
+    potential_matches = [(article_token(snapshot, i), index.rows[i]) for i in row_ids]
     context.user_data['pending_matches'] = potential_matches
     context.user_data['search_query'] = user_input
-    buttons = [[InlineKeyboardButton(row['Designation1'], callback_data=f"select::{row['Designation1']}")] for row in potential_matches]
-    markup = InlineKeyboardMarkup(buttons)
-    await update.message.reply_text("🔍 Plusieurs correspondances trouvées. Veuillez préciser :", reply_markup=markup)
+    context.user_data['match_key'] = (snapshot.generation, designation_keyword, user_input)
+    pages = match_keyboards.pages(context.user_data['match_key'], potential_matches)
+    await update.message.reply_text("🔍 Plusieurs correspondances trouvées. Veuillez préciser :", reply_markup=pages[0])
     return ASK_MODEL
 
-async def handle_model_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@lifecycle.track
+async def handle_match_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
-    # Show "processing…" immediately
-    processing_msg = await query.message.reply_text("⏳ Processing...")
-
-    async def timeout_fallback():
-        await asyncio.sleep(5)
-        if not context.user_data.get("response_sent"):
-            buttons = [
-                [InlineKeyboardButton("📱 LCD", callback_data="LCD")],
-                [InlineKeyboardButton("🔋 Batterie", callback_data="Battery")],
-                [InlineKeyboardButton("🔌 Connecteur", callback_data="Connector")],
-                [InlineKeyboardButton("🧿 Glass", callback_data="Glass")],
-                [InlineKeyboardButton("📦 Cover", callback_data="COVER")],
-                [InlineKeyboardButton("🛠 Sersou", callback_data="SERSOU")]
-            ]
-            markup = InlineKeyboardMarkup(buttons)
-            await query.message.reply_text(
-                "❌ An error has occurred while processing your request. Please try again.",
-                reply_markup=markup
-            )
-
-    timeout_task = asyncio.create_task(timeout_fallback())
+    page = query.data.split("::")[1]
+    matches = context.user_data.get('pending_matches')
+    if page == "current" or not matches:
+        return ASK_MODEL
+
+    pages = match_keyboards.pages(context.user_data['match_key'], matches)
+    page = int(page)
+    if 0 <= page < len(pages):
+        await query.edit_message_reply_markup(reply_markup=pages[page])
+    return ASK_MODEL
+
+@lifecycle.track
+async def handle_model_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
 
     try:
-        selected_model = query.data.split("::")[1]
+        token = query.data.split("::")[1]
         category = context.user_data.get("category")
 
         if not category:
-            timeout_task.cancel()
-            await processing_msg.edit_text("❌ La catégorie est introuvable. Veuillez redémarrer avec /start.")
+            await query.message.reply_text("❌ La catégorie est introuvable. Veuillez redémarrer avec /start.")
             return ConversationHandler.END
 
-        data = await get_cached_inventory()
-        for row in data:
-            if row['Designation1'] == selected_model:
-                timeout_task.cancel()
-                await processing_msg.delete()
-                context.user_data["response_sent"] = True
-                return await respond_with_inventory_info(query, context, row, category, selected_model)
+        # Article ids survive inventory refreshes, so a button from an older
+        # generation resolves to the current row for the same article
+        snapshot = await inventory_cache.get()
+        i = resolve_token(snapshot, token)
+        if i is not None:
+            row = snapshot.index.rows[i]
+            return await respond_with_inventory_info(query, context, row, category, row.designation,
+                                                     snapshot.index.brand(i), article_token(snapshot, i))
 
-        timeout_task.cancel()
-        await processing_msg.edit_text(f"❌ Impossible de trouver {selected_model} dans la catégorie {category}.")
-        return await start(query, context)
+        return await start(update, context, notice=f"❌ Cet article n'est plus disponible dans la catégorie {category}.")
 
     except Exception as e:
-        timeout_task.cancel()
-        await processing_msg.edit_text(f"❌ Une erreur est survenue ({e}). Veuillez réessayer.")
+        await query.message.reply_text(f"❌ Une erreur est survenue ({e}). Veuillez réessayer.")
         return CHOOSE_CATEGORY
 
 
-async def respond_with_inventory_info(query_or_update, context, row, category, match_part):
+async def respond_with_inventory_info(query_or_update, context, row, category, match_part, brand="", token=None):
     message = query_or_update.message if hasattr(query_or_update, 'message') else query_or_update.effective_message
 
-    # Send "processing" message
-    processing_message = await message.reply_text("⏳ Recherche en cours, veuillez patienter...")
+    available = row.qt
+    price = row.pu
 
-    try:
-        # Apply timeout
-        async with asyncio.timeout(5):
-            phone_model = row["Designation1"]
-            available = row.get("QT", 0)
-            price = row.get("PU", "-")
-
-            matched_model_name = match_part.title()
-            brand_match = next((b for b in KNOWN_BRANDS if b.lower() in phone_model.lower()), "")
-            formatted_model = f"{brand_match.upper()} {matched_model_name}".strip()
-
-            buttons = [
-                [InlineKeyboardButton("📍 Voir l'emplacement du magasin", url=STORE_LOCATION_URL)],
-                [InlineKeyboardButton("🔁 Démarrer une nouvelle recherche", callback_data="restart")]
-            ]
-            reply_markup = InlineKeyboardMarkup(buttons)
-
-            # Delete "processing" once done
-            await processing_message.delete()
-
-            if isinstance(available, (int, float)) and available > 0:
-                await log_request(category, formatted_model, True)
-                await message.reply_text(
-                    f"✅ {category.upper()} pour {formatted_model} est disponible.\n💵 Prix : {price} DA",
-                    reply_markup=reply_markup
-                )
-            else:
-                await log_request(category, formatted_model, False)
-                await message.reply_text(
-                    f"❌ Désolé, {category.lower()} pour {formatted_model} n'est pas disponible.",
-                    reply_markup=reply_markup
-                )
-    except asyncio.TimeoutError:
-        # Delete "processing" and send timeout error
-        await processing_message.delete()
-        await message.reply_text("⚠️ La recherche a pris trop de temps. Veuillez réessayer avec /start.")
+    matched_model_name = match_part.title()
+    formatted_model = f"{brand.upper()} {matched_model_name}".strip()
+
+    if isinstance(available, (int, float)) and available > 0:
+        await log_request(category, formatted_model, True)
+        await message.reply_text(
+            f"✅ {category.upper()} pour {formatted_model} est disponible.\n💵 Prix : {price} DA",
+            reply_markup=RESULT_MARKUP
+        )
+    else:
+        await log_request(category, formatted_model, False)
+        await message.reply_text(
+            f"❌ Désolé, {category.lower()} pour {formatted_model} n'est pas disponible.",
+            reply_markup=with_notify_button(RESULT_MARKUP, f"notify::a::{token}") if token else RESULT_MARKUP
+        )
 
     return CHOOSE_CATEGORY
 
 
-async def restart_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@lifecycle.track
+async def handle_notify(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """notify::a::<article token> or notify::q::<category>::<query>; the
+    conversation stays where it is."""
     query = update.callback_query
-    await query.answer()
-
-    # Show processing message
-    processing_msg = await query.message.reply_text("⏳ Processing...")
-
-    async def timeout_fallback():
-        await asyncio.sleep(5)
-        if not context.user_data.get("response_sent"):
-            buttons = [
-                [InlineKeyboardButton("📱 LCD", callback_data="LCD")],
-                [InlineKeyboardButton("🔋 Batterie", callback_data="Battery")],
-                [InlineKeyboardButton("🔌 Connecteur", callback_data="Connector")],
-                [InlineKeyboardButton("🧿 Glass", callback_data="Glass")],
-                [InlineKeyboardButton("📦 Cover", callback_data="COVER")],
-                [InlineKeyboardButton("🛠 Sersou", callback_data="SERSOU")]
-            ]
-            markup = InlineKeyboardMarkup(buttons)
-            await query.message.reply_text(
-                "❌ An error has occurred while processing your request. Please try again.",
-                reply_markup=markup
-            )
-
-    timeout_task = asyncio.create_task(timeout_fallback())
-
+    if update.effective_user.id not in whitelist:
+        await query.answer("❌ Désolé vous étes pas autorisé a utilisé ce bot.")
+        return None
+
+    _, kind, rest = query.data.split("::", 2)
+    if kind == "a":
+        snapshot = await inventory_cache.get()
+        i = resolve_token(snapshot, rest)
+        if i is None:
+            await query.answer("❌ Cet article n'existe plus dans l'inventaire.")
+            return None
+        row = snapshot.index.rows[i]
+        if row.qt > 0:
+            await query.answer("✅ Cet article est de nouveau disponible !")
+            return None
+        status = await stock_alerts.subscribe(query.message.chat_id, ARTICLE, "", row.designation)
+    else:
+        category, user_input = rest.split("::", 1)
+        status = await stock_alerts.subscribe(query.message.chat_id, QUERY, categories.keyword(category), user_input)
+
+    await query.answer({
+        "added": "🔔 C'est noté, vous serez prévenu dès que l'article sera disponible.",
+        "exists": "🔔 Vous serez déjà prévenu pour cet article.",
+        "full": "❌ Vous suivez déjà trop d'articles.",
+    }[status])
+    return None
+
+
+async def handle_inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Instant search without the conversation: "@bot lcd a52" lists the
+    matching articles with price and availability."""
+    inline_query = update.inline_query
+    metrics.inc("inline_queries")
+    if inline_query.from_user.id not in whitelist:
+        await inline_query.answer([], cache_time=0, is_personal=True)
+        return
+    if inline_query.offset:
+        # The next page of an answer already given, straight from the cache
+        await answer_inline_query(inline_query)
+        return
+    # Only the last keystroke of a burst is searched and answered
+    inline_debouncer.submit(inline_query.from_user.id, lambda: answer_inline_query(inline_query))
+
+
+async def answer_inline_query(inline_query):
+    snapshot = await inventory_cache.get()
+    index = snapshot.index
+    text = inline_query.query
+    words = text.split(None, 1)
+    category = categories.find(words[0]) if words else None
+    if category is not None:
+        keywords = (category.keyword.lower(),)
+        text = words[1] if len(words) > 1 else ""
+    else:
+        keywords = INLINE_KEYWORDS
+    query = normalize(text, index.brand_matcher or brands.matcher)
+    if not query:
+        await inline_query.answer([], cache_time=INLINE_CACHE_TIME, is_personal=True)
+        return
+
+    with metrics.time("stage_seconds", stage="inline_search"):
+        row_ids = inline_search.search(snapshot, keywords, query)
     try:
-        context.user_data.clear()
-        inventory_cache["data"] = None
+        start = int(inline_query.offset or 0)
+    except ValueError:
+        start = 0
+    total = min(len(row_ids), MAX_RESULTS)
+    end = min(start + PAGE_SIZE, total)
+    results = [inline_result(snapshot, i) for i in row_ids[start:end]]
+    await inline_query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=True,
+                              next_offset=str(end) if end < total else "")
+
+
+def inline_result(snapshot, i):
+    row = snapshot.index.rows[i]
+    if row.qt > 0:
+        description = f"✅ Disponible — 💵 {row.pu} DA"
+        text = f"✅ {row.designation} est disponible.\n💵 Prix : {row.pu} DA"
+    else:
+        description = "❌ Indisponible"
+        text = f"❌ Désolé, {row.designation} n'est pas disponible."
+    return InlineQueryResultArticle(id=article_token(snapshot, i), title=row.designation,
+                                    description=description, input_message_content=InputTextMessageContent(text))
 
-        timeout_task.cancel()
-        await processing_msg.delete()
-        context.user_data["response_sent"] = True
 
-        await query.message.reply_text("🔁 Nouvelle recherche démarrée.")
-        return await start(update, context)
+@lifecycle.track
+async def restart_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
 
-    except Exception as e:
-        timeout_task.cancel()
-        await processing_msg.edit_text(f"❌ Une erreur est survenue ({e}). Veuillez réessayer.")
-        return CHOOSE_CATEGORY
+    context.user_data.clear()
+    return await start(update, context, notice="🔁 Nouvelle recherche démarrée.")
 
 async def summary(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    buttons = [
-        [InlineKeyboardButton("🗕 Résumé d'aujourd'hui", callback_data="summary_today")],
-        [InlineKeyboardButton("🗖 Résumé du mois", callback_data="summary_month")]
-    ]
-    markup = InlineKeyboardMarkup(buttons)
-    await update.message.reply_text("Choisissez un type de résumé :", reply_markup=markup)
+    if context.args:
+        period = parse_range(context.args)
+        if period is None:
+            await update.message.reply_text("Utilisation : /summary AAAA-MM-JJ AAAA-MM-JJ ou /summary AAAA-MM")
+            return
+        start, end = period
+        total = await rollups.range(start, end)
+        if total.events:
+            await update.message.reply_text(f"📆 Résumé du {start} au {end} :\n\n{format_summary(total)}")
+        else:
+            await update.message.reply_text("📍 Aucun enregistrement pour cette période.")
+        return
+    await update.message.reply_text("Choisissez un type de résumé :", reply_markup=SUMMARY_MARKUP)
 
 async def handle_summary_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -531,55 +443,31 @@ async def handle_summary_callback(update: Update, context: ContextTypes.DEFAULT_
 
     if data_type == "summary_today":
         date_str = now.strftime("%Y-%m-%d")
-        log_file = os.path.join(LOG_DIR, f"{date_str}.log")
-        summary = read_detailed_log_summary(log_file)
+        agg = await rollups.day(date_str)
+        summary = format_summary(agg) if agg else "Aucune donnée trouvée pour cette date."
         await query.edit_message_text(f"🗕 Résumé du {date_str} :\n\n{summary}")
 
     elif data_type == "summary_month":
         month_str = now.strftime("%Y-%m")
-        summaries = []
-        for filename in os.listdir(LOG_DIR):
-            if filename.startswith(month_str) and filename.endswith(".log"):
-                log_file = os.path.join(LOG_DIR, filename)
-                summaries.append(f"{filename[:-4]}:\n{read_detailed_log_summary(log_file)}\n")
+        days = await rollups.month(month_str)
+        summaries = [f"{date_str}:\n{format_summary(agg)}\n" for date_str, agg in days.items()]
         if summaries:
             await query.edit_message_text("🗖 Résumé du mois :\n\n" + "\n".join(summaries))
         else:
             await query.edit_message_text("📍 Aucun enregistrement pour ce mois.")
 
-def read_detailed_log_summary(file_path):
-    total = 0
-    available = 0
-    not_available = 0
-    model_stats = Counter()
-    not_available_models = []
+async def metrics_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS:
+        await update.message.reply_text("❌ Commande réservée aux administrateurs.")
+        return
+    text = metrics.report()
+    # Telegram caps messages at 4096 characters
+    for i in range(0, len(text), 4000):
+        await update.message.reply_text(text[i:i + 4000])
 
-    try:
-        with open(file_path, 'r') as f:
-            for line in f:
-                total += 1
-                parts = line.strip().split(" - ")
-                if len(parts) < 3:
-                    continue
-                model = parts[1]
-                status = parts[2]
-                model_stats[model] += 1
-                if "Available" in status:
-                    available += 1
-                else:
-                    not_available += 1
-                    not_available_models.append(model)
-
-        top_models = model_stats.most_common(5)
-        top_text = "\n".join([f"🔹 {model} ({count} demandes)" for model, count in top_models])
-        unavailable_text = "\n".join([f"❌ {model}" for model in sorted(set(not_available_models))])
-
-        return (
-            f"🔎 Total: {total}\n"
-            f"✅ Disponibles: {available}\n"
-            f"❌ Non disponibles: {not_available}\n\n"
-            f"📊 Top 5 modèles demandés :\n{top_text or 'Aucune donnée'}\n\n"
-            f"🚫 Modèles non disponibles :\n{unavailable_text or 'Aucun'}"
-        )
-    except FileNotFoundError:
+def read_detailed_log_summary(file_path):
+    # Legacy "time - model - status" text logs
+    agg = read_legacy_log(file_path)
+    if agg is None:
         return "Aucune donnée trouvée pour cette date."
+    return format_summary(agg)
@@ -0,0 +1,100 @@
+# ================== httpd.py ==================
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY = 1 << 20  # Telegram updates are a few KB
+REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+           405: "Method Not Allowed", 413: "Payload Too Large", 429: "Too Many Requests",
+           500: "Internal Server Error"}
+
+
+class Request:
+    def __init__(self, method, path, headers, body):
+        self.method = method
+        self.path = path
+        self.headers = headers  # lower-cased names
+        self.body = body
+
+
+class HTTPServer:
+    """Minimal HTTP/1.1 server on asyncio streams for the bot's local endpoints.
+
+    `handler(request)` returns (status, content_type, body bytes). Keep-alive
+    is supported and request bodies need a Content-Length, which is all that
+    Telegram's webhook client and Prometheus scrapers send.
+    """
+
+    def __init__(self, handler, host="127.0.0.1", port=0):
+        self.handler = handler
+        self.host = host
+        self.port = port
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                if isinstance(request, int):
+                    await self._respond(writer, request, "text/plain", REASONS[request].encode(), close=True)
+                    break
+                try:
+                    status, content_type, body = await self.handler(request)
+                except Exception:
+                    logger.exception("HTTP handler failed for %s %s", request.method, request.path)
+                    status, content_type, body = 500, "text/plain", b"Internal Server Error"
+                close = request.headers.get("connection", "").lower() == "close"
+                await self._respond(writer, status, content_type, body, close)
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        # A parsed Request, an error status, or None on a closed connection
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, path, _ = line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            return 400
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            return 400
+        if length > MAX_BODY:
+            return 413
+        body = await reader.readexactly(length) if length else b""
+        return Request(method, path, headers, body)
+
+    async def _respond(self, writer, status, content_type, body, close=False):
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
@@ -0,0 +1,124 @@
+# ================== inline_search.py ==================
+import asyncio
+import logging
+from collections import Counter
+from query_cache import QueryCache
+
+logger = logging.getLogger(__name__)
+
+DEBOUNCE = 0.3       # seconds a user must stop typing before their inline query is searched
+PAGE_SIZE = 20       # results per inline answer (Telegram takes up to 50)
+MAX_RESULTS = 200    # rows reachable through next_offset pages
+CACHE_SIZE = 2048
+
+
+def normalize(text, matcher=None):
+    """Lowercase, single-spaced query; a brand typed in full (followed by a
+    space) is corrected like in a chat search, one still being typed is not."""
+    words = text.lower().split()
+    if matcher is not None and len(words) > 1:
+        corrected = matcher.correct(words[0])
+        if corrected:
+            words[0] = corrected
+    return " ".join(words)
+
+
+class InlineSearch:
+    """Ranked substring search for inline queries, cached per query prefix.
+
+    Inline queries come in on every keystroke ("a", "a5", "a52"). The rows
+    of a query are the ones whose name contains it, in stock first, then
+    shortest name first. A row containing "a52" contains "a5", so when a
+    prefix of the query is cached its rows are filtered rather than asking
+    the index again, and the result is cached for the next keystroke. When
+    no name contains the query, the closest one in the category is offered
+    as in a chat search. The cache is a QueryCache, emptied with every
+    inventory generation.
+    """
+
+    def __init__(self, size=CACHE_SIZE):
+        self.cache = QueryCache(size=size)
+        self.stats = Counter()
+
+    def search(self, snapshot, keywords, query):
+        """Ranked row ids for `query` (normalized) in the categories `keywords`."""
+        key = (keywords, query)
+        outcome = self.cache.get(snapshot, key)
+        if outcome is not None:
+            self.stats["cached"] += 1
+            return outcome[1]
+        index = snapshot.index
+        parent = self._prefix(snapshot, keywords, query)
+        if parent is None:
+            self.stats["searched"] += 1
+            ids = self._find(index, keywords, query)
+        else:
+            self.stats["from_prefix"] += 1
+            names = index.names
+            ids = tuple(i for i in parent[1] if query in names[i]) if parent[0] == "multi" else ()
+        result = "multi"
+        if not ids:
+            close = index.closest_id(keywords[0], query) if len(keywords) == 1 and query else None
+            result, ids = ("fuzzy", (close,)) if close is not None else ("miss", ())
+        self.cache.put(snapshot, key, (result, ids, query))
+        return ids
+
+    def _prefix(self, snapshot, keywords, query):
+        # Longest cached prefix, typically the previous keystroke
+        for n in range(len(query) - 1, 0, -1):
+            outcome = self.cache.peek(snapshot, (keywords, query[:n]))
+            if outcome is not None:
+                return outcome
+        return None
+
+    def _find(self, index, keywords, query):
+        ids = set()
+        for keyword in keywords:
+            ids.update(index.find_ids(keyword, query))
+        rows, names = index.rows, index.names
+        return tuple(sorted(ids, key=lambda i: (rows[i].qt <= 0, len(names[i]), i)))
+
+
+class Debouncer:
+    """Runs the latest call per key once `delay` seconds pass without a newer one.
+
+    submit() returns at once, so a handler never holds up the updates behind
+    it; a newer call for the same key cancels the pending one, and bursts of
+    keystrokes cost one search and one answer.
+    """
+
+    def __init__(self, delay=DEBOUNCE):
+        self.delay = delay
+        self.pending = {}
+        self.stats = Counter()
+
+    def submit(self, key, call):
+        task = self.pending.get(key)
+        if task is not None and not task.done():
+            task.cancel()
+            self.stats["superseded"] += 1
+        self.stats["submitted"] += 1
+        task = self.pending[key] = asyncio.create_task(self._run(key, call))
+        return task
+
+    async def _run(self, key, call):
+        try:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            await call()
+            self.stats["ran"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.stats["errors"] += 1
+            logger.exception("Debounced call for %s failed", key)
+        finally:
+            if self.pending.get(key) is asyncio.current_task():
+                del self.pending[key]
+
+    async def stop(self):
+        tasks = list(self.pending.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.pending.clear()
@@ -0,0 +1,375 @@
+# ================== inventory_cache.py ==================
+import asyncio
+import gc
+import json
+import logging
+import os
+import pickle
+import tempfile
+import time
+from collections import Counter
+from csvUPDATE import delta_path, file_sha256, manifest_path, read_manifest
+from inventory_index import InventoryIndex
+from sheet import parse_article
+
+logger = logging.getLogger(__name__)
+
+CHECK_INTERVAL = 2  # seconds between stat() calls on the CSV
+SNAPSHOT_VERSION = 5  # bump when InventoryIndex or Article change shape
+
+
+class InventorySnapshot:
+    """One load of the CSV with its search index."""
+
+    def __init__(self, generation, file_stat, checksum, rows, index, export_generation=None, restocked=None):
+        self.generation = generation
+        self.export_generation = export_generation
+        self.file_stat = file_stat
+        self.checksum = checksum
+        self.rows = rows
+        self.index = index
+        # Row ids that came back in stock since the previous generation; None when unknown
+        self.restocked = restocked
+        self.loaded_at = time.time()
+
+
+def notify_restocked(callback, snapshot):
+    # Listener errors must not fail the refresh that produced the snapshot
+    if callback is None or not snapshot.restocked:
+        return
+    try:
+        callback(snapshot)
+    except Exception:
+        logger.exception("Restock listener failed for generation %d", snapshot.generation)
+
+
+def plan_deltas(index, deltas):
+    """[(op, key, article)] for export deltas, checked against `index`
+    without touching it: a removed or changed key must be present, an added
+    one must not, and every PU/QT must parse. Raises KeyError or ValueError
+    when the deltas don't apply, so a full reload leaves the index as it was."""
+    present = {}  # key -> present after the deltas so far, for the keys they touch
+    plan = []
+    for delta in deltas:
+        for designation, occurrence in delta["removed"]:
+            key = (designation, occurrence)
+            if not present.get(key, key in index.keys):
+                raise KeyError(key)
+            present[key] = False
+            plan.append(("removed", key, None))
+        for designation, occurrence, pu, qt in delta["changed"]:
+            key = (designation, occurrence)
+            if not present.get(key, key in index.keys):
+                raise KeyError(key)
+            plan.append(("changed", key, parse_article(designation, pu, qt)))
+        for designation, occurrence, pu, qt in delta["added"]:
+            key = (designation, occurrence)
+            if present.get(key, key in index.keys):
+                raise ValueError(f"{key} is already in the inventory")
+            present[key] = True
+            plan.append(("added", key, parse_article(designation, pu, qt)))
+    return plan
+
+
+class InventoryCache:
+    """Serves the current snapshot and reloads only when the CSV changes.
+
+    The export manifest written by csvUPDATE (or the CSV itself when there
+    is no manifest) is stat()ed at most every `check_interval` seconds. When
+    it changes, a single background refresh compares the published checksum
+    and, if the content really differs, builds the next snapshot while
+    callers keep getting the previous one. Concurrent cold misses share that
+    refresh. When the exporter published row deltas for every generation
+    since the current one, they are applied to the live index instead of
+    reloading the whole CSV.
+
+    Every new snapshot is also pickled next to the CSV (Article.snapshot.pickle)
+    so a restarted bot can serve from it right away; it is only used when it
+    matches the published checksum, or the CSV's mtime and size when there is
+    no manifest.
+
+    With `brands` (anything with a `matcher`, like brands.Brands), the index
+    is brand-tagged, and retagged in place when the matcher changes.
+
+    `publish`, when given, is called with every new snapshot (and the first
+    one restored at startup) in the same worker thread as the pickle, so
+    deltas never change the index while it runs. `on_restock` is called on
+    the event loop with each new snapshot that has rows back in stock.
+    """
+
+    def __init__(self, sheet_handler, keywords, check_interval=CHECK_INTERVAL, brands=None, publish=None,
+                 on_restock=None):
+        self.sheet_handler = sheet_handler
+        self.keywords = list(keywords)
+        self.brands = brands
+        self.publish = publish
+        self.on_restock = on_restock
+        self.check_interval = check_interval
+        self.snapshot = None
+        self.generation = 0
+        self.stats = Counter()
+        self._refresh_task = None
+        self._save_task = None
+        self._last_check = 0
+        self._published = None
+
+    @property
+    def csv_path(self):
+        return self.sheet_handler.csv_path
+
+    @property
+    def snapshot_path(self):
+        return os.path.splitext(self.csv_path)[0] + ".snapshot.pickle"
+
+    async def get(self):
+        snapshot = self.snapshot
+        if snapshot is None:
+            self.stats["misses"] += 1
+            return await self.refresh()
+        self.stats["hits"] += 1
+        now = time.monotonic()
+        if now - self._last_check >= self.check_interval:
+            self._last_check = now
+            if self._file_stat() != snapshot.file_stat or snapshot.index.brand_key != self._brand_key():
+                self.refresh_in_background()
+        return snapshot
+
+    def _matcher(self):
+        return self.brands.matcher if self.brands is not None else None
+
+    def _brand_key(self):
+        matcher = self._matcher()
+        return matcher.key if matcher is not None else None
+
+    def refresh_in_background(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh())
+        return self._refresh_task
+
+    async def refresh(self):
+        task = self._refresh_task
+        if task is not None and not task.done():
+            self.stats["coalesced"] += 1
+        # Shielded so a cancelled caller doesn't abort the shared refresh
+        return await asyncio.shield(self.refresh_in_background())
+
+    async def _refresh(self):
+        loop = asyncio.get_running_loop()
+        if self._save_task is not None and not self._save_task.done():
+            # Deltas mutate the index in place; don't race the pickler
+            await asyncio.wait([self._save_task])
+        previous = self.snapshot
+        try:
+            if previous is None:
+                previous = await loop.run_in_executor(None, self._load_saved)
+                if previous is not None:
+                    self.snapshot = previous
+                    logger.info("Inventory restored from snapshot (%d articles, export generation %s)",
+                                len(previous.index), previous.export_generation)
+            pending = await loop.run_in_executor(None, self._pending_deltas, previous)
+            snapshot = None
+            if pending is not None:
+                # Applied on the loop so no handler sees a half-updated index
+                try:
+                    snapshot = self._apply_deltas(previous, *pending)
+                except (KeyError, ValueError, TypeError, AttributeError) as e:
+                    logger.warning("Export delta does not apply (%r), reloading the CSV", e)
+            if snapshot is None:
+                snapshot = await loop.run_in_executor(None, self._build, previous)
+            retagged = await self._retag(snapshot)
+        except Exception:
+            self.stats["errors"] += 1
+            logger.exception("Inventory refresh failed")
+            if previous is None:
+                raise
+            return previous
+        self._last_check = time.monotonic()
+        if snapshot is not previous or retagged:
+            self.snapshot = snapshot
+            logger.info("Inventory generation %d loaded (%d articles), cache stats %s",
+                        snapshot.generation, len(snapshot.index), dict(self.stats))
+            if snapshot is not previous:
+                notify_restocked(self.on_restock, snapshot)
+            self._save_task = loop.run_in_executor(None, self._save, snapshot)
+        elif self.publish is not None and self._published != self._publish_key(snapshot):
+            self._save_task = loop.run_in_executor(None, self._publish, snapshot)
+        return self.snapshot
+
+    async def _retag(self, snapshot):
+        # Tags are computed in a worker thread and swapped in on the loop
+        matcher = self._matcher()
+        if snapshot.index.brand_key == self._brand_key():
+            return False
+        index = snapshot.index
+        row_brands = await asyncio.get_running_loop().run_in_executor(None, index.brand_tags, matcher)
+        index.tag_brands(matcher, row_brands)
+        self.stats["retags"] += 1
+        return True
+
+    def _file_stat(self):
+        # The manifest is replaced after the CSV, so it changes last
+        for path in (manifest_path(self.csv_path), self.csv_path):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            return (path, st.st_mtime_ns, st.st_size)
+        return None
+
+    def _checksum(self):
+        try:
+            return file_sha256(self.csv_path)
+        except OSError:
+            return None
+
+    def _build(self, previous):
+        # Runs in a worker thread; the event loop keeps serving `previous`
+        file_stat = self._file_stat()
+        manifest = read_manifest(self.csv_path)
+        checksum = manifest.get("sha256") or self._checksum()
+        if previous is not None and checksum == previous.checksum:
+            # Touched but not rewritten with new data
+            self.stats["unchanged"] += 1
+            previous.file_stat = file_stat
+            return previous
+        rows = self.sheet_handler.load_inventory()
+        if not rows and previous is not None and previous.rows:
+            logger.warning("Inventory load returned no rows, keeping generation %d", previous.generation)
+            self.stats["errors"] += 1
+            previous.file_stat = file_stat
+            return previous
+        self.stats["refreshes"] += 1
+        self.generation += 1
+        index = InventoryIndex(rows, self.keywords, previous.index if previous is not None else None,
+                               brands=self._matcher())
+        restocked = index.restocked_since(previous.index) if previous is not None else None
+        return InventorySnapshot(self.generation, file_stat, checksum, rows, index,
+                                 export_generation=manifest.get("generation"), restocked=restocked)
+
+    def _load_saved(self):
+        # Runs in a worker thread before the first snapshot exists
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                # Millions of small objects; collecting halfway through is wasted work
+                gc.disable()
+                try:
+                    saved = pickle.load(f)
+                finally:
+                    gc.enable()
+            if saved["version"] != SNAPSHOT_VERSION:
+                logger.info("Inventory snapshot has version %s, rebuilding", saved["version"])
+                return None
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("Ignoring unreadable inventory snapshot: %r", e)
+            return None
+        index = saved["index"]
+        snapshot = InventorySnapshot(self.generation + 1, self._file_stat(), saved["checksum"], index.rows, index,
+                                     export_generation=saved["export_generation"])
+        manifest = read_manifest(self.csv_path)
+        if manifest:
+            # Also usable when the exporter's deltas lead from it to the manifest
+            fresh = (saved["checksum"] == manifest.get("sha256") or
+                     self._pending_deltas(snapshot) is not None)
+        else:
+            try:
+                st = os.stat(self.csv_path)
+            except OSError:
+                return None
+            fresh = saved["csv_stat"] == [st.st_mtime_ns, st.st_size]
+        if not fresh:
+            logger.info("Inventory snapshot is stale, rebuilding")
+            return None
+        self.stats["warm_starts"] += 1
+        self.generation += 1
+        return snapshot
+
+    def _save(self, snapshot):
+        try:
+            st = os.stat(self.csv_path)
+            saved = {
+                "version": SNAPSHOT_VERSION,
+                "checksum": snapshot.checksum,
+                "export_generation": snapshot.export_generation,
+                "csv_stat": [st.st_mtime_ns, st.st_size],
+                "index": snapshot.index,
+            }
+            directory = os.path.dirname(os.path.abspath(self.snapshot_path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".pickle")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    pickle.dump(saved, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, self.snapshot_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except Exception as e:
+            logger.warning("Could not save the inventory snapshot: %r", e)
+        self._publish(snapshot)
+
+    @staticmethod
+    def _publish_key(snapshot):
+        return snapshot.generation, snapshot.index.brand_key
+
+    def _publish(self, snapshot):
+        key = self._publish_key(snapshot)
+        if self.publish is None or key == self._published:
+            return
+        try:
+            self.publish(snapshot)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning("Could not publish the inventory snapshot: %r", e)
+            return
+        self._published = key
+        self.stats["published"] += 1
+
+    def _pending_deltas(self, previous):
+        # Delta files from the snapshot's export generation up to the
+        # manifest's, or None when a full reload is needed
+        if previous is None or previous.export_generation is None:
+            return None
+        file_stat = self._file_stat()
+        manifest = read_manifest(self.csv_path)
+        target = manifest.get("generation")
+        if target is None or target <= previous.export_generation:
+            return None
+        deltas = []
+        for generation in range(previous.export_generation + 1, target + 1):
+            try:
+                with open(delta_path(generation, self.csv_path), "r", encoding="utf-8") as f:
+                    delta = json.load(f)
+            except (OSError, ValueError):
+                return None
+            if delta.get("base_generation") != generation - 1:
+                return None
+            deltas.append(delta)
+        return manifest, file_stat, deltas
+
+    def _apply_deltas(self, previous, manifest, file_stat, deltas):
+        # Added rows go after the existing ones: the order a full reload
+        # gives as long as the export appends new articles at the end
+        index = previous.index
+        plan = plan_deltas(index, deltas)
+        restocked = []
+        for op, key, article in plan:
+            if op == "removed":
+                index.remove(key)
+            elif op == "changed":
+                i = index.keys[key]
+                if article.qt > 0 and index.rows[i].qt <= 0:
+                    restocked.append(i)
+                index.update(key, article)
+            else:
+                index.add(key, article)
+                if article.qt > 0:
+                    restocked.append(index.keys[key])
+        changed = len(plan)
+        # A later delta may have removed the row or emptied it again
+        restocked = [i for i in dict.fromkeys(restocked) if index.rows[i] is not None and index.rows[i].qt > 0]
+        self.stats["deltas"] += len(deltas)
+        self.generation += 1
+        logger.info("Applied %d export deltas (%d rows) to the inventory", len(deltas), changed)
+        return InventorySnapshot(self.generation, file_stat, manifest.get("sha256"), index.rows, index,
+                                 export_generation=manifest.get("generation"), restocked=restocked)
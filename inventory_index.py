@@ -0,0 +1,302 @@
+# ================== inventory_index.py ==================
+import secrets
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+
+def format_article_id(article_id):
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    text = ""
+    while True:
+        article_id, digit = divmod(article_id, 36)
+        text = digits[digit] + text
+        if not article_id:
+            return text
+
+
+def parse_article_id(text):
+    return int(text, 36)
+
+
+def trigrams(text):
+    return [text[i:i + 3] for i in range(len(text) - 2)]
+
+
+def _min_matched(total, cutoff):
+    # Smallest M for which difflib's 2.0 * M / total reaches the cutoff
+    matched = max(int(cutoff * total / 2) - 1, 0)
+    while 2.0 * matched / total < cutoff:
+        matched += 1
+    return matched
+
+
+class _Partition:
+    # Rows of one category keyword with their own trigram and brand postings.
+    # Each posting is a dict used as an ordered set: an added row has the
+    # highest id, so insertion order stays inventory order, and a removal is
+    # O(1) instead of a scan of the posting.
+    def __init__(self, ids, names, row_brands):
+        self.ids = {}
+        self.postings = defaultdict(dict)
+        self.by_length = defaultdict(dict)
+        self.brand_postings = defaultdict(dict)
+        for i in ids:
+            self.add(i, names[i], row_brands[i])
+
+    def add(self, i, name, brands=()):
+        self.ids[i] = None
+        for gram in set(trigrams(name)):
+            self.postings[gram][i] = None
+        self.by_length[len(name)][i] = None
+        for brand in brands:
+            self.brand_postings[brand][i] = None
+
+    def remove(self, i, name, brands=()):
+        del self.ids[i]
+        for gram in set(trigrams(name)):
+            del self.postings[gram][i]
+        del self.by_length[len(name)][i]
+        for brand in brands:
+            del self.brand_postings[brand][i]
+
+    def tag_brands(self, row_brands):
+        self.brand_postings = defaultdict(dict)
+        for i in self.ids:
+            for brand in row_brands[i]:
+                self.brand_postings[brand][i] = None
+
+
+class InventoryIndex:
+    """Search structures built once per inventory load.
+
+    Rows are partitioned by the category keywords, and each partition keeps
+    a trigram inverted index (trigram -> row ids in inventory order) that
+    shortlists candidates for both the substring search and the close-match
+    fallback. Results are the same as scanning the whole category with `in`
+    and difflib.
+
+    Rows are addressed by (designation, occurrence) keys so export deltas can
+    be applied in place; removed rows leave a None slot behind. Each key also
+    gets a compact article id for callback data. Ids are carried over from
+    the `previous` index on a full reload and never reused, so an id taken
+    from an older generation still names the same article or nothing. An
+    index built without one (a cold start, an unreadable pickle) numbers
+    from 0 again under a new random `id_epoch`; callback data carries the
+    epoch so an id from before can't name another article.
+
+    With a BrandMatcher, every row is tagged with the brands its designation
+    names and partitions keep brand postings, so a query whose brand is
+    known only looks at that brand's rows.
+    """
+
+    def __init__(self, rows, keywords, previous=None, brands=None):
+        self.rows = list(rows)
+        self.names = [row.designation.lower() for row in self.rows]
+        self.keys = {}
+        seen = Counter()
+        for i, row in enumerate(self.rows):
+            self.keys[(row.designation, seen[row.designation])] = i
+            seen[row.designation] += 1
+        self.live = len(self.rows)
+        self.article_ids = [None] * len(self.rows)
+        self.by_id = {}
+        self.next_id = previous.next_id if previous is not None else 0
+        self.id_epoch = previous.id_epoch if previous is not None else format_article_id(secrets.randbits(32))
+        known = {key: previous.article_ids[i] for key, i in previous.keys.items()} if previous is not None else {}
+        for key, i in self.keys.items():
+            self._assign_id(i, known.get(key))
+        self.brand_matcher = brands
+        self.brand_key = brands.key if brands is not None else None
+        self.row_brands = self.brand_tags(brands)
+        self.partitions = {keyword.lower(): self._new_partition(keyword.lower()) for keyword in keywords}
+
+    def __len__(self):
+        return self.live
+
+    def articles(self):
+        return [row for row in self.rows if row is not None]
+
+    def brand(self, i):
+        """The first brands.txt brand named by row i (lowercase), or ""."""
+        tags = self.row_brands[i]
+        return tags[0] if tags else ""
+
+    def brand_tags(self, matcher):
+        # Pure read of the names, safe to run in a worker thread
+        if matcher is None:
+            return [()] * len(self.names)
+        return [matcher.brands_in(name) if name else () for name in self.names]
+
+    def tag_brands(self, matcher, row_brands=None):
+        """Retag every row after brands.txt changed."""
+        if row_brands is None:
+            row_brands = self.brand_tags(matcher)
+        self.brand_matcher = matcher
+        self.brand_key = matcher.key if matcher is not None else None
+        self.row_brands = row_brands
+        for part in self.partitions.values():
+            part.tag_brands(row_brands)
+
+    def restocked_since(self, previous):
+        """Rows in stock here whose (designation, occurrence) was missing or
+        out of stock in `previous`."""
+        rows = []
+        for key, i in self.keys.items():
+            if self.rows[i].qt > 0:
+                j = previous.keys.get(key)
+                if j is None or previous.rows[j].qt <= 0:
+                    rows.append(i)
+        return rows
+
+    def _assign_id(self, i, article_id=None):
+        if article_id is None:
+            article_id = self.next_id
+            self.next_id += 1
+        self.article_ids[i] = article_id
+        self.by_id[article_id] = i
+
+    # ---------- delta updates ----------
+
+    def update(self, key, article):
+        """Replace the PU/QT of an existing row; its designation is unchanged."""
+        i = self.keys[key]
+        self.rows[i] = article
+
+    def add(self, key, article):
+        i = len(self.rows)
+        name = article.designation.lower()
+        brands = self.brand_matcher.brands_in(name) if self.brand_matcher is not None else ()
+        self.rows.append(article)
+        self.names.append(name)
+        self.row_brands.append(brands)
+        self.keys[key] = i
+        self.article_ids.append(None)
+        self._assign_id(i)
+        self.live += 1
+        for keyword, part in self.partitions.items():
+            if keyword in name:
+                part.add(i, name, brands)
+
+    def remove(self, key):
+        i = self.keys.pop(key)
+        name = self.names[i]
+        for keyword, part in self.partitions.items():
+            if keyword in name:
+                part.remove(i, name, self.row_brands[i])
+        self.rows[i] = None
+        self.names[i] = ""
+        self.row_brands[i] = ()
+        del self.by_id[self.article_ids[i]]
+        self.live -= 1
+
+    def partition(self, keyword):
+        # Any other keyword gets a throwaway partition: only the category
+        # keywords are kept, updated by deltas and pickled
+        keyword = keyword.lower()
+        part = self.partitions.get(keyword)
+        return part if part is not None else self._new_partition(keyword)
+
+    def _new_partition(self, keyword):
+        ids = [i for i, name in enumerate(self.names) if keyword in name]
+        return _Partition(ids, self.names, self.row_brands)
+
+    def find(self, keyword, query, brand=None):
+        """Rows of the category whose designation contains `query`.
+
+        With `brand`, only rows tagged with that brand are considered.
+        """
+        return [self.rows[i] for i in self.find_ids(keyword, query, brand)]
+
+    def _brand_posting(self, part, brand):
+        # None when the rows can't be narrowed by this brand
+        if brand is None or self.brand_matcher is None or brand not in self.brand_matcher.exact:
+            return None
+        return part.brand_postings.get(brand, {})
+
+    def find_ids(self, keyword, query, brand=None):
+        part = self.partition(keyword)
+        grams = set(trigrams(query))
+        by_brand = self._brand_posting(part, brand)
+        if not grams:
+            candidates = part.ids if by_brand is None else by_brand
+        else:
+            postings = [] if by_brand is None else [by_brand]
+            for gram in grams:
+                posting = part.postings.get(gram)
+                if not posting:
+                    return []
+                postings.append(posting)
+            candidates = min(postings, key=len)
+        names = self.names
+        return [i for i in candidates if query in names[i]]
+
+    def closest(self, keyword, query, cutoff=0.9, brand=None):
+        """Same row as get_close_matches(query, names, n=1, cutoff) would pick."""
+        i = self.closest_id(keyword, query, cutoff, brand)
+        return None if i is None else self.rows[i]
+
+    def closest_id(self, keyword, query, cutoff=0.9, brand=None):
+        best = None
+        matcher = SequenceMatcher()
+        matcher.set_seq2(query)
+        names = self.names
+        part = self.partition(keyword)
+        candidates = self._fuzzy_candidates(part, query, cutoff)
+        if self._brand_posting(part, brand) is not None:
+            row_brands = self.row_brands
+            candidates = [i for i in candidates if brand in row_brands[i]]
+        for i in candidates:
+            name = names[i]
+            matcher.set_seq1(name)
+            if (matcher.real_quick_ratio() >= cutoff and
+                    matcher.quick_ratio() >= cutoff):
+                score = matcher.ratio()
+                if score >= cutoff:
+                    key = (score, name, -i)
+                    if best is None or key > best:
+                        best = key
+        return -best[2] if best else None
+
+    def _fuzzy_candidates(self, part, query, cutoff):
+        # ratio >= cutoff needs M >= cutoff*S/2 matched characters (S = total
+        # length). Each query trigram lying inside a matching block is shared
+        # with the candidate, and there are at most D+1 blocks for D unmatched
+        # characters, so at least 5*M - 2*S - 2 query trigram positions must
+        # hit the candidate. Lengths where that bound is not positive are
+        # scanned in full.
+        la = len(query)
+        if not la:
+            return part.ids
+        required = {}
+        scan = set()
+        for lb, ids in part.by_length.items():
+            total = la + lb
+            if 2.0 * min(la, lb) / total < cutoff:
+                continue
+            bound = 5 * _min_matched(total, cutoff) - 2 * total - 2
+            if bound <= 0:
+                scan.update(ids)
+            else:
+                required[lb] = bound
+        if required:
+            # A candidate missing every trigram of a prefix weighing more than
+            # P - min(bound) can't reach the bound, so only the rarest query
+            # trigrams' postings need to be visited
+            weights = Counter(trigrams(query))
+            need = sum(weights.values()) - min(required.values()) + 1
+            candidates = set()
+            for gram in sorted(weights, key=lambda g: len(part.postings.get(g, ()))):
+                candidates.update(part.postings.get(gram, ()))
+                need -= weights[gram]
+                if need <= 0:
+                    break
+            names = self.names
+            for i in candidates:
+                name = names[i]
+                bound = required.get(len(name))
+                if bound is None:
+                    continue
+                grams = set(trigrams(name))
+                if sum(w for gram, w in weights.items() if gram in grams) >= bound:
+                    scan.add(i)
+        return sorted(scan)
@@ -0,0 +1,121 @@
+# ================== keyboards.py ==================
+from collections import OrderedDict
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+PAGE_SIZE = 8        # match buttons per page
+MATCH_CACHE_SIZE = 256
+
+CATEGORIES = ["LCD", "Battery", "Connector", "Glass", "COVER", "SERSOU"]
+
+CATEGORY_MAPPING = {
+    "LCD": "LCD",
+    "Battery": "BATTERIE",
+    "Connector": "CC",
+    "Glass": "GLASS",
+    "COVER": "COVER",
+    "SERSOU": "SERSOU"
+}
+
+CATEGORY_LABELS = {
+    "LCD": "📱 LCD",
+    "Battery": "🔋 Batterie",
+    "Connector": "🔌 Connecteur",
+    "Glass": "🧿 Glass",
+    "COVER": "📦 Cover",
+    "SERSOU": "🛠 Sersou"
+}
+
+
+class Category:
+    def __init__(self, key, label, keyword):
+        self.key = key          # callback_data and the name shown to the user
+        self.label = label      # button text
+        self.keyword = keyword  # designation keyword in Article.csv
+
+
+class CategoryRegistry:
+    """The category list with its menu markup, built once at import."""
+
+    def __init__(self, categories, mapping, labels):
+        self.categories = [Category(key, labels.get(key, key), mapping.get(key, key)) for key in categories]
+        self.by_key = {category.key: category for category in self.categories}
+        # Typed names, for inline queries like "batterie a52"
+        self.by_name = {name.lower(): category for category in self.categories
+                        for name in (category.keyword, category.key)}
+        self.menu = InlineKeyboardMarkup(
+            [[InlineKeyboardButton(category.label, callback_data=category.key)] for category in self.categories]
+        )
+
+    def __iter__(self):
+        return iter(self.categories)
+
+    def keyword(self, key):
+        category = self.by_key.get(key)
+        return category.keyword if category else key
+
+    def find(self, name):
+        """The category typed as `name` (key or keyword, any case), or None."""
+        return self.by_name.get(name.lower())
+
+    def keywords(self):
+        return [category.keyword for category in self.categories]
+
+
+def result_markup(store_location_url):
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("📍 Voir l'emplacement du magasin", url=store_location_url)],
+        [InlineKeyboardButton("🔁 Démarrer une nouvelle recherche", callback_data="restart")]
+    ])
+
+
+def with_notify_button(markup, data):
+    """`markup` with a back-in-stock subscription button on top."""
+    return InlineKeyboardMarkup(
+        [[InlineKeyboardButton("🔔 Me prévenir quand disponible", callback_data=data)], *markup.inline_keyboard]
+    )
+
+
+class MatchKeyboards:
+    """Paginated multi-match keyboards, memoized per result set.
+
+    Keys are (inventory generation, category keyword, query), so a refresh
+    of the inventory never serves buttons for rows that changed.
+    """
+
+    def __init__(self, button, page_size=PAGE_SIZE, cache_size=MATCH_CACHE_SIZE):
+        self.button = button  # row -> InlineKeyboardButton
+        self.page_size = page_size
+        self.cache_size = cache_size
+        self._pages = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def pages(self, key, rows):
+        pages = self._pages.get(key)
+        if pages is not None:
+            self.hits += 1
+            self._pages.move_to_end(key)
+            return pages
+        self.misses += 1
+        pages = self._build(rows)
+        self._pages[key] = pages
+        if len(self._pages) > self.cache_size:
+            self._pages.popitem(last=False)
+        return pages
+
+    def _build(self, rows):
+        buttons = [[self.button(row)] for row in rows]
+        count = max((len(buttons) + self.page_size - 1) // self.page_size, 1)
+        pages = []
+        for n in range(count):
+            keyboard = buttons[n * self.page_size:(n + 1) * self.page_size]
+            if count > 1:
+                nav = []
+                if n > 0:
+                    nav.append(InlineKeyboardButton("◀️", callback_data=f"page::{n - 1}"))
+                nav.append(InlineKeyboardButton(f"{n + 1}/{count}", callback_data="page::current"))
+                if n < count - 1:
+                    nav.append(InlineKeyboardButton("▶️", callback_data=f"page::{n + 1}"))
+                keyboard = keyboard + [nav]
+            pages.append(InlineKeyboardMarkup(keyboard))
+        return tuple(pages)
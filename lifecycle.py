@@ -0,0 +1,172 @@
+# ================== lifecycle.py ==================
+import asyncio
+import contextvars
+import functools
+import logging
+import time
+from collections import Counter, defaultdict
+from telegram.ext import BaseRateLimiter
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_DELAY = 0.3  # seconds before "⏳ Processing..." is shown
+DEADLINE = 5          # seconds before the error fallback is sent
+
+_current = contextvars.ContextVar("interaction", default=None)
+_progress = contextvars.ContextVar("progress", default=None)
+
+
+class Interaction:
+    """One handled update: its API calls, progress message and deadline."""
+
+    def __init__(self, name, update):
+        self.name = name
+        self.update = update
+        self.started = time.monotonic()
+        self.api_calls = Counter()
+        self.progress_task = None
+        self.progress_message = None
+        self.progress_dispatched = False
+        self.timed_out = False
+
+    @property
+    def message(self):
+        if self.update.callback_query:
+            return self.update.callback_query.message
+        return self.update.effective_message
+
+
+class CallCounter(BaseRateLimiter):
+    """Counts Bot API calls per endpoint for the interaction that made them.
+
+    Plugged in as the bot's rate limiter because every API call except
+    getUpdates passes through it. Subclasses that hold calls back override
+    send() and make the call through _call() once it may go out.
+    """
+
+    def __init__(self):
+        self.calls = Counter()
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        return await self.send(callback, args, kwargs, endpoint, data, rate_limit_args)
+
+    async def send(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        return await self._call(endpoint, callback, args, kwargs)
+
+    async def _call(self, endpoint, callback, args, kwargs):
+        self._dispatch(endpoint)
+        with metrics.time("api_call_seconds", endpoint=endpoint):
+            return await callback(*args, **kwargs)
+
+    def _dispatch(self, endpoint):
+        self.calls[endpoint] += 1
+        interaction = _current.get()
+        if interaction is not None:
+            interaction.api_calls[endpoint] += 1
+        progress = _progress.get()
+        if progress is not None:
+            progress.progress_dispatched = True
+
+
+class RequestLifecycle:
+    """Wraps handlers with a delayed progress indicator and a deadline.
+
+    Both timers live in the event loop's own timer heap (loop.call_later),
+    so there is no watchdog task per request; a task is only created when
+    a timer actually fires. Nested handler calls (e.g. handle_model falling
+    back to start) share the outer interaction. A progress message that
+    is still waiting to go out when the handler returns is dropped instead
+    of being sent and deleted; `saved` counts the API calls avoided that way
+    and by handlers merging replies.
+    """
+
+    def __init__(self, timeout_text, timeout_markup=None,
+                 progress_text="⏳ Processing...", progress_delay=PROGRESS_DELAY,
+                 deadline=DEADLINE):
+        self.timeout_text = timeout_text
+        self.timeout_markup = timeout_markup
+        self.progress_text = progress_text
+        self.progress_delay = progress_delay
+        self.deadline = deadline
+        self.stats = defaultdict(Counter)
+        self.saved = Counter()
+        self.tasks = set()  # error fallbacks still being sent
+
+    def track(self, handler):
+        @functools.wraps(handler)
+        async def wrapper(update, context, *args, **kwargs):
+            if _current.get() is not None:
+                return await handler(update, context, *args, **kwargs)
+            interaction = Interaction(handler.__name__, update)
+            token = _current.set(interaction)
+            loop = asyncio.get_running_loop()
+            progress = loop.call_later(self.progress_delay, self._show_progress, interaction)
+            deadline = loop.call_later(self.deadline, self._on_deadline, interaction)
+            try:
+                return await handler(update, context, *args, **kwargs)
+            finally:
+                progress.cancel()
+                deadline.cancel()
+                await self._finish(interaction)
+                _current.reset(token)
+        return wrapper
+
+    def _show_progress(self, interaction):
+        message = interaction.message
+        if message is not None:
+            interaction.progress_task = asyncio.create_task(self._send_progress(interaction, message))
+
+    async def _send_progress(self, interaction, message):
+        # Tags the call so the rate limiter can report when it actually went out
+        _progress.set(interaction)
+        return await message.reply_text(self.progress_text)
+
+    def _on_deadline(self, interaction):
+        interaction.timed_out = True
+        message = interaction.message
+        if message is not None:
+            markup = self.timeout_markup() if callable(self.timeout_markup) else self.timeout_markup
+            task = asyncio.create_task(self._send_timeout(interaction, message, markup))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _send_timeout(self, interaction, message, markup):
+        try:
+            await message.reply_text(self.timeout_text, reply_markup=markup)
+        except Exception:
+            logger.exception("Could not send the timeout reply of %s", interaction.name)
+
+    async def _finish(self, interaction):
+        task = interaction.progress_task
+        if task is not None and not task.done() and not interaction.progress_dispatched:
+            # Still queued: sending it now would only be followed by a delete
+            task.cancel()
+            self.saved["progress_dropped"] += 2
+        elif task is not None:
+            try:
+                interaction.progress_message = await interaction.progress_task
+                await interaction.progress_message.delete()
+            except Exception as e:
+                logger.debug("Could not clear progress message: %s", e)
+
+        elapsed = time.monotonic() - interaction.started
+        calls = sum(interaction.api_calls.values())
+        stats = self.stats[interaction.name]
+        stats["interactions"] += 1
+        stats["api_calls"] += calls
+        stats["slow"] += interaction.progress_task is not None
+        stats["timeouts"] += interaction.timed_out
+        metrics.observe("handler_seconds", elapsed, handler=interaction.name)
+        logger.debug("%s: %d API calls %s in %.0f ms", interaction.name, calls,
+                     dict(interaction.api_calls), elapsed * 1000)
+
+    def calls_per_interaction(self):
+        return {name: stats["api_calls"] / stats["interactions"]
+                for name, stats in self.stats.items() if stats["interactions"]}
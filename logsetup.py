@@ -0,0 +1,157 @@
+# ================== logsetup.py ==================
+import atexit
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import shutil
+from datetime import datetime
+
+FORMAT = '%(asctime)s %(levelname)s:%(message)s'
+SEARCH_EVENTS = "search_events"  # logger whose records go to the JSON stream only
+MAX_BYTES = 10 * 1024 * 1024
+BACKUPS = 7
+HTTP_SAMPLE = 100  # keep one successful HTTP request line in this many
+
+# "<bot id>:<secret>", as it appears in Bot API URLs
+TOKEN_RE = re.compile(r"(?<![0-9])[0-9]{6,12}:[A-Za-z0-9_-]{30,}")
+
+
+def redact(text, secrets=()):
+    text = TOKEN_RE.sub("<token>", text)
+    for secret in secrets:
+        text = text.replace(secret, "<secret>")
+    return text
+
+
+class RedactFilter(logging.Filter):
+    """Replaces bot tokens (and any other given secrets) in messages and tracebacks."""
+
+    def __init__(self, secrets=()):
+        super().__init__()
+        self.secrets = [s for s in secrets if s]
+
+    def filter(self, record):
+        message = record.getMessage()
+        redacted = redact(message, self.secrets)
+        if redacted != message:
+            record.msg, record.args = redacted, None
+        if record.exc_info and not record.exc_text:
+            # Formatter.format reuses exc_text, so the traceback is only redacted once
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        if record.exc_text:
+            record.exc_text = redact(record.exc_text, self.secrets)
+        return True
+
+
+class SampleFilter(logging.Filter):
+    """Lets one in `every` routine records through. Warnings and anything
+    `keep(record)` accepts always pass."""
+
+    def __init__(self, every, keep=None):
+        super().__init__()
+        self.every = every
+        self.keep = keep
+        self.seen = 0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or (self.keep is not None and self.keep(record)):
+            return True
+        self.seen += 1
+        return (self.seen - 1) % self.every == 0
+
+
+def http_failure(record):
+    # httpx logs 'HTTP Request: %s %s "%s %d %s"' with the status as 4th argument
+    args = record.args
+    return isinstance(args, tuple) and len(args) == 5 and isinstance(args[3], int) and not 200 <= args[3] < 300
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: the record's `event` dict plus its time."""
+
+    def format(self, record):
+        event = {"ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds")}
+        event.update(getattr(record, "event", None) or {"message": record.getMessage()})
+        return json.dumps(event, ensure_ascii=False)
+
+
+def _gzip_rotator(source, dest):
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def rotating_file_handler(path, max_bytes=MAX_BYTES, when=None, backups=BACKUPS):
+    """Size-based rotation, or time-based when `when` is given ("midnight",
+    "H", ...). Rotated files are gzipped; this runs on the listener thread."""
+    if when:
+        handler = logging.handlers.TimedRotatingFileHandler(path, when=when, backupCount=backups,
+                                                            encoding="utf-8", delay=True)
+    else:
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                       encoding="utf-8", delay=True)
+    handler.namer = lambda name: name + ".gz"
+    handler.rotator = _gzip_rotator
+    return handler
+
+
+def parse_levels(spec):
+    """"httpx=WARNING,telegram.ext=DEBUG" -> {"httpx": "WARNING", ...}"""
+    levels = {}
+    for item in (spec or "").split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(log_file="bot.log", events_file="search_events.jsonl", level=logging.INFO,
+                  levels=None, http_sample=HTTP_SAMPLE, max_bytes=MAX_BYTES, when=None,
+                  backups=BACKUPS, secrets=()):
+    """Routes all logging through a queue to a listener thread.
+
+    Callers only pay for the filters and a queue put; formatting, console
+    and file writes, rotation and compression happen on the listener
+    thread. Records of the SEARCH_EVENTS logger go to `events_file` as
+    JSON lines and nowhere else. Returns the started listener, which is
+    also stopped (and drained) at exit.
+    """
+    formatter = logging.Formatter(FORMAT)
+    console = logging.StreamHandler()
+    main_file = rotating_file_handler(log_file, max_bytes, when, backups)
+    for handler in (console, main_file):
+        handler.setFormatter(formatter)
+        handler.addFilter(lambda record: record.name != SEARCH_EVENTS)
+    events = rotating_file_handler(events_file, max_bytes, when, backups)
+    events.setFormatter(JSONFormatter())
+    events.addFilter(lambda record: record.name == SEARCH_EVENTS)
+
+    records = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(records)
+    queue_handler.addFilter(RedactFilter(secrets))
+    listener = logging.handlers.QueueListener(records, console, main_file, events)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    search_events = logging.getLogger(SEARCH_EVENTS)
+    search_events.propagate = False
+    search_events.handlers = [queue_handler]
+    search_events.setLevel(logging.INFO)
+
+    for name, logger_level in (levels or {}).items():
+        logging.getLogger(name).setLevel(logger_level)
+    if http_sample > 1:
+        # Every poll and reply is an INFO line from httpx; keep failures and a sample
+        logging.getLogger("httpx").addFilter(SampleFilter(http_sample, keep=http_failure))
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
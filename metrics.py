@@ -0,0 +1,173 @@
+# ================== metrics.py ==================
+import bisect
+import time
+from collections import Counter
+
+PREFIX = "storebot_"
+# Histogram upper bounds in seconds, 0.5 ms to 10 s
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+INF = float("inf")
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS + (INF,), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return INF
+
+
+class _Timer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+def _labels(labels):
+    if len(labels) < 2:
+        return tuple(labels.items())
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = [f'{k}="{v}"' for k, v in labels + tuple(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metrics:
+    """In-process histograms, counters and pull-time collectors.
+
+    Recording is a dict lookup plus a bisect, cheap enough for every
+    request. Collectors are callables read only when metrics are rendered,
+    for values other objects already keep (cache stats, queue depths):
+    each returns a number, or a dict exported with its keys as `label`.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = Counter()
+        self.collectors = []
+
+    def histogram(self, name, **labels):
+        key = (name, _labels(labels))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        return histogram
+
+    def observe(self, name, seconds, **labels):
+        self.histogram(name, **labels).observe(seconds)
+
+    def time(self, name, **labels):
+        return _Timer(self.histogram(name, **labels))
+
+    def inc(self, name, value=1, **labels):
+        self.counters[(name, _labels(labels))] += value
+
+    def register(self, name, collect, label="key"):
+        self.collectors.append((name, collect, label))
+
+    def reset(self):
+        self.histograms.clear()
+        self.counters.clear()
+
+    def _collected(self):
+        for name, collect, label in self.collectors:
+            value = collect()
+            if isinstance(value, dict):
+                for key, v in sorted(value.items(), key=lambda item: str(item[0])):
+                    yield name, ((label, key),), v
+            else:
+                yield name, (), value
+
+    def prometheus(self):
+        """Prometheus text exposition format."""
+        lines = []
+        typed = set()
+
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        for (name, labels), h in sorted(self.histograms.items()):
+            declare(name, "histogram")
+            cumulative = 0
+            for bound, n in zip(BUCKETS + (INF,), h.counts):
+                cumulative += n
+                le = "+Inf" if bound == INF else repr(bound)
+                lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels, [('le', le)])} {cumulative}")
+            lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {h.sum:.6f}")
+            lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {h.count}")
+        for (name, labels), value in sorted(self.counters.items()):
+            declare(name, "counter")
+            lines.append(f"{PREFIX}{name}{_format_labels(labels)} {value}")
+        for name, labels, value in self._collected():
+            declare(name, "gauge")
+            lines.append(f"{PREFIX}{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def report(self):
+        """Short plain-text summary for the /metrics command."""
+        lines = ["⏱ Latency (count, avg, p50/p95/p99 ms):"]
+        for (name, labels), h in sorted(self.histograms.items()):
+            if not h.count:
+                continue
+            label = ",".join(str(v) for _, v in labels) or "-"
+            quantiles = "/".join(_ms(h.quantile(q)) for q in (0.5, 0.95, 0.99))
+            lines.append(f"{name} {label}: {h.count}, {h.sum / h.count * 1000:.1f}, {quantiles}")
+        if self.counters:
+            lines.append("")
+            lines.append("🔢 Counters:")
+            for (name, labels), value in sorted(self.counters.items()):
+                label = ",".join(str(v) for _, v in labels)
+                lines.append(f"{name} {label}: {value}".replace(" :", ":"))
+        collected = list(self._collected())
+        if collected:
+            lines.append("")
+            lines.append("📦 State:")
+            for name, labels, value in collected:
+                label = ",".join(str(v) for _, v in labels)
+                value = f"{value:.3f}" if isinstance(value, float) else value
+                lines.append(f"{name} {label}: {value}".replace(" :", ":"))
+        return "\n".join(lines)
+
+
+def _ms(bound):
+    return "inf" if bound == INF else f"{bound * 1000:g}"
+
+
+metrics = Metrics()
+
+
+async def handle_http(request):
+    """httpd handler serving `metrics` at /metrics for Prometheus."""
+    if request.path.split("?", 1)[0] != "/metrics":
+        return 404, "text/plain", b"Not Found"
+    if request.method != "GET":
+        return 405, "text/plain", b"Method Not Allowed"
+    return 200, "text/plain; version=0.0.4; charset=utf-8", metrics.prometheus().encode()
@@ -0,0 +1,162 @@
+# ================== outbound.py ==================
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from telegram.error import RetryAfter
+from lifecycle import CallCounter
+
+logger = logging.getLogger(__name__)
+
+# Telegram's documented flood limits: about 30 messages per second overall,
+# one per second in a private chat (short bursts are tolerated) and 20 per
+# minute in a group
+GLOBAL_RATE = 30
+GLOBAL_BURST = 10
+CHAT_RATE = 1
+CHAT_BURST = 3
+GROUP_RATE = 20 / 60
+GROUP_BURST = 3
+MAX_RETRIES = 3
+MAX_LANES = 10000  # idle chat lanes are pruned past this many
+
+
+def is_message_call(endpoint):
+    # Calls that post or change a message count against the flood limits
+    return endpoint.startswith(("send", "edit", "copy", "forward")) and endpoint != "sendChatAction"
+
+
+class TokenBucket:
+    """Reservation-based token bucket: every caller takes a token at once and
+    is told how long to wait, so waiters are served in arrival order."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def reserve(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate) - 1
+        self.updated = now
+        wait = self.paused_until - now
+        if self.tokens < 0:
+            wait = max(wait, -self.tokens / self.rate)
+        return max(wait, 0.0)
+
+    def refund(self):
+        self.tokens = min(self.burst, self.tokens + 1)
+
+    def pause(self, seconds):
+        # Telegram told us to back off: no token is usable before then
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def idle(self, now):
+        return now >= self.paused_until and self.tokens + (now - self.updated) * self.rate >= self.burst
+
+
+class Lane:
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.lock = asyncio.Lock()  # FIFO, so a chat's calls go out in call order
+
+
+class OutboundScheduler(CallCounter):
+    """Rate limiter that paces outgoing Bot API calls instead of hitting 429s.
+
+    Calls for one chat go out one at a time and in order. Message calls take
+    a token from the chat's bucket and from the global one. A 429 pauses the
+    chat (or every chat for calls that have none) for the retry_after
+    Telegram asked for, and the call is retried up to `max_retries` times; a
+    call can pass its own limit as rate_limit_args={"max_retries": n}.
+    """
+
+    def __init__(self, global_rate=GLOBAL_RATE, global_burst=GLOBAL_BURST,
+                 chat_rate=CHAT_RATE, chat_burst=CHAT_BURST,
+                 group_rate=GROUP_RATE, group_burst=GROUP_BURST, max_retries=MAX_RETRIES):
+        super().__init__()
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.chat_limits = (chat_rate, chat_burst)
+        self.group_limits = (group_rate, group_burst)
+        self.max_retries = max_retries
+        self.lanes = {}
+        self.stats = {"delayed": 0, "wait_seconds": 0.0, "flood_waits": 0, "retries": 0, "gave_up": 0}
+
+    def _lane(self, chat_id):
+        lane = self.lanes.get(chat_id)
+        if lane is None:
+            if len(self.lanes) >= MAX_LANES:
+                self._prune()
+            # Group and channel ids are negative (or @usernames)
+            group = not isinstance(chat_id, int) or chat_id < 0
+            lane = self.lanes[chat_id] = Lane(TokenBucket(*(self.group_limits if group else self.chat_limits)))
+        return lane
+
+    def _prune(self):
+        now = time.monotonic()
+        for chat_id, lane in list(self.lanes.items()):
+            if not lane.lock.locked() and lane.bucket.idle(now):
+                del self.lanes[chat_id]
+
+    async def send(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get("chat_id")
+        if chat_id is None:
+            return await self._send(None, callback, args, kwargs, endpoint, rate_limit_args)
+        try:
+            chat_id = int(chat_id)
+        except (TypeError, ValueError):
+            pass
+        lane = self._lane(chat_id)
+        async with lane.lock:
+            return await self._send(lane, callback, args, kwargs, endpoint, rate_limit_args)
+
+    async def _send(self, lane, callback, args, kwargs, endpoint, rate_limit_args):
+        max_retries = (rate_limit_args or {}).get("max_retries", self.max_retries)
+        buckets = [self.global_bucket] if lane is None else [self.global_bucket, lane.bucket]
+        attempt = 0
+        while True:
+            if is_message_call(endpoint):
+                await self._acquire(buckets)
+            else:
+                await self._wait_pause(buckets)
+            try:
+                return await self._call(endpoint, callback, args, kwargs)
+            except RetryAfter as e:
+                retry_after = e.retry_after
+                if isinstance(retry_after, timedelta):
+                    retry_after = retry_after.total_seconds()
+                self.stats["flood_waits"] += 1
+                (self.global_bucket if lane is None else lane.bucket).pause(retry_after)
+                if attempt >= max_retries:
+                    self.stats["gave_up"] += 1
+                    raise
+                attempt += 1
+                self.stats["retries"] += 1
+                logger.warning("%s flood limited, retrying in %s s (attempt %d)", endpoint, retry_after, attempt)
+
+    async def _acquire(self, buckets):
+        now = time.monotonic()
+        wait = max(bucket.reserve(now) for bucket in buckets)
+        if wait > 0:
+            self.stats["delayed"] += 1
+            try:
+                await self._sleep(wait, buckets)
+            except asyncio.CancelledError:
+                # A dropped call hands its tokens back
+                for bucket in buckets:
+                    bucket.refund()
+                raise
+
+    async def _wait_pause(self, buckets):
+        wait = max(bucket.paused_until for bucket in buckets) - time.monotonic()
+        if wait > 0:
+            await self._sleep(wait, buckets)
+
+    async def _sleep(self, wait, buckets):
+        t0 = time.monotonic()
+        while wait > 0:
+            await asyncio.sleep(wait)
+            # A 429 elsewhere may have paused a bucket while we slept
+            wait = max(bucket.paused_until for bucket in buckets) - time.monotonic()
+        self.stats["wait_seconds"] += time.monotonic() - t0
@@ -0,0 +1,96 @@
+# ================== query_cache.py ==================
+import sys
+import time
+from collections import Counter, OrderedDict
+
+CACHE_SIZE = 4096
+TTL = 600           # seconds a found result is reused
+NEGATIVE_TTL = 60   # misses expire sooner; the model may be added or the brand list fixed
+
+_ENTRY_OVERHEAD = 200  # OrderedDict node, entry tuple and float, roughly
+
+
+def _size(key, outcome):
+    result, ids, query = outcome
+    return (_ENTRY_OVERHEAD + sum(sys.getsizeof(part) for part in key)
+            + sys.getsizeof(ids) + sys.getsizeof(query))
+
+
+class QueryCache:
+    """Search outcomes for repeated (category keyword, query) pairs.
+
+    An outcome is (result, row ids, corrected query), where result is "hit",
+    "fuzzy", "multi" or "miss". Row ids only make sense for the index they
+    came from, so the cache belongs to one snapshot generation and brand
+    matcher: a lookup against any other snapshot (reload, deltas, brand
+    retag) empties it first. Least recently used entries are evicted past
+    `size`, misses live `negative_ttl` seconds and everything else `ttl`.
+    """
+
+    def __init__(self, size=CACHE_SIZE, ttl=TTL, negative_ttl=NEGATIVE_TTL, clock=time.monotonic):
+        self.size = size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self.stats = Counter()
+        self.bytes = 0
+        self._entries = OrderedDict()  # key -> (expires, outcome, size)
+        self._generation = None
+        self._matcher = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def hit_ratio(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    def _bind(self, snapshot):
+        matcher = snapshot.index.brand_matcher
+        if snapshot.generation != self._generation or matcher is not self._matcher:
+            if self._entries:
+                self.stats["invalidations"] += 1
+            self.clear()
+            self._generation = snapshot.generation
+            self._matcher = matcher
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def get(self, snapshot, key):
+        self._bind(snapshot)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > self.clock():
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[1]
+            self._drop(key)
+            self.stats["expired"] += 1
+        self.stats["misses"] += 1
+        return None
+
+    def peek(self, snapshot, key):
+        """The live outcome for `key`, without counting a lookup or refreshing it."""
+        self._bind(snapshot)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > self.clock():
+            return entry[1]
+        return None
+
+    def put(self, snapshot, key, outcome):
+        self._bind(snapshot)
+        if key in self._entries:
+            self._drop(key)
+        ttl = self.negative_ttl if outcome[0] == "miss" else self.ttl
+        size = _size(key, outcome)
+        self._entries[key] = (self.clock() + ttl, outcome, size)
+        self.bytes += size
+        while len(self._entries) > self.size:
+            _, (_, _, dropped) = self._entries.popitem(last=False)
+            self.bytes -= dropped
+            self.stats["evictions"] += 1
+
+    def _drop(self, key):
+        self.bytes -= self._entries.pop(key)[2]
@@ -0,0 +1,217 @@
+# ================== reports.py ==================
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from file_utils import write_atomic
+from search_stats import LOG_HEADER, DailyAggregate, build_workbook
+from search_store import DB_FILE, SearchStore
+
+logger = logging.getLogger(__name__)
+
+REPORT_INTERVAL = 3600  # seconds between checks for finished periods
+REPORT_HEADER = ["Date"] + LOG_HEADER
+SATURDAY = 5            # weeks run Saturday to Friday
+
+
+def weeks(first, last):
+    start = first - timedelta(days=(first.weekday() - SATURDAY) % 7)
+    while start <= last:
+        yield start, start + timedelta(days=6)
+        start += timedelta(days=7)
+
+
+def months(first, last):
+    start = first.replace(day=1)
+    while start <= last:
+        following = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+        yield start, following - timedelta(days=1)
+        start = following
+
+
+def report_path(stats_dir, kind, start, end):
+    if kind == "weekly":
+        return os.path.join(stats_dir, "weekly", f"week-{start.isoformat()}_to_{end.isoformat()}.xlsx")
+    return os.path.join(stats_dir, "monthly", f"{start.isoformat()[:7]}.xlsx")
+
+
+def build_report(stats_dir, categories, start, end, path):
+    """Export the searches of start..end from the search store into one workbook.
+
+    Runs in a worker process; returns the number of searches in the report.
+    """
+    store = SearchStore(os.path.join(stats_dir, DB_FILE))
+    first, last = start.isoformat(), end.isoformat()
+    rows = store.rows(first, last)
+    agg = DailyAggregate.from_dict(store.summary(first, last, f"{first}..{last}"))
+    store.close()
+    wb = build_workbook(rows, agg, categories, header=REPORT_HEADER)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    wb.save(tmp_path)
+    os.replace(tmp_path, path)
+    return len(rows)
+
+
+class ReportBuilder:
+    """Weekly (Saturday to Friday) and monthly workbooks exported from the search store.
+
+    Only finished periods are built. Each report's inputs (search count and
+    last row id of every day it covers) are recorded in
+    stats/reports.manifest.json, so a period is rebuilt only when one of its
+    days changed or the workbook is missing. The openpyxl work runs in a
+    process pool.
+    """
+
+    def __init__(self, stats_dir, categories, workers=1, interval=REPORT_INTERVAL):
+        self.stats_dir = stats_dir
+        self.categories = list(categories)
+        self.workers = workers
+        self.interval = interval
+        self.store = SearchStore(os.path.join(stats_dir, DB_FILE))
+        self._pool = None
+        self._task = None
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.stats_dir, "reports.manifest.json")
+
+    def read_manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            logger.warning("Rebuilding all reports, unreadable manifest: %s", e)
+            return {}
+
+    def write_manifest(self, manifest):
+        write_atomic(self.manifest_path, json.dumps(manifest, indent=2, sort_keys=True))
+
+    def plan(self, today=None, since=None, until=None, force=False):
+        """(kind, start, end, path, inputs) for every finished period that needs a build.
+
+        `since`/`until` limit which periods are considered; a period is always
+        built from all of its days.
+        """
+        today = today or date.today()
+        last = min(until, today - timedelta(days=1)) if until else today - timedelta(days=1)
+        inputs_by_day = self.store.day_signatures()
+        if not inputs_by_day:
+            return []
+        first = date.fromisoformat(min(inputs_by_day))
+        manifest = self.read_manifest()
+        due = []
+        for kind, periods in (("weekly", weeks(first, last)), ("monthly", months(first, last))):
+            for start, end in periods:
+                if end > last or (since and end < since):
+                    continue
+                inputs = {d: sig for d, sig in inputs_by_day.items()
+                          if start.isoformat() <= d <= end.isoformat()}
+                if not inputs:
+                    continue
+                path = report_path(self.stats_dir, kind, start, end)
+                entry = manifest.get(os.path.relpath(path, self.stats_dir))
+                if force or entry is None or entry.get("inputs") != inputs or not os.path.exists(path):
+                    due.append((kind, start, end, path, inputs))
+        return due
+
+    def _record(self, manifest, path, inputs, searches):
+        manifest[os.path.relpath(path, self.stats_dir)] = {
+            "inputs": inputs,
+            "searches": searches,
+            "built_at": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    # ---------- backfill ----------
+
+    def backfill(self, since=None, until=None, force=False):
+        due = self.plan(since=since, until=until, force=force)
+        manifest = self.read_manifest()
+        built = 0
+        with ProcessPoolExecutor(self.workers) as pool:
+            futures = {pool.submit(build_report, self.stats_dir, self.categories, start, end, path):
+                       (kind, start, end, path, inputs) for kind, start, end, path, inputs in due}
+            for future in as_completed(futures):
+                kind, start, end, path, inputs = futures[future]
+                try:
+                    searches = future.result()
+                except Exception:
+                    logger.exception("Failed to build %s report %s", kind, path)
+                    continue
+                self._record(manifest, path, inputs, searches)
+                built += 1
+                print(f"{kind} {start}..{end}: {searches} searches -> {path}")
+        if built:
+            self.write_manifest(manifest)
+        return built
+
+    # ---------- scheduled builds ----------
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.build_due()
+            except Exception:
+                logger.exception("Failed to build periodic reports")
+            await asyncio.sleep(self.interval)
+
+    async def build_due(self):
+        due = await asyncio.to_thread(self.plan)
+        if not due:
+            return 0
+        if self._pool is None:
+            # spawn: the bot process has threads, which fork doesn't mix well with
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        loop = asyncio.get_running_loop()
+        manifest = await asyncio.to_thread(self.read_manifest)
+        built = 0
+        for kind, start, end, path, inputs in due:
+            try:
+                searches = await loop.run_in_executor(
+                    self._pool, build_report, self.stats_dir, self.categories, start, end, path)
+            except Exception:
+                logger.exception("Failed to build %s report %s", kind, path)
+                continue
+            self._record(manifest, path, inputs, searches)
+            built += 1
+            logger.info("Built %s report %s (%d searches)", kind, path, searches)
+        await asyncio.to_thread(self.write_manifest, manifest)
+        return built
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build weekly and monthly search reports from the search store.")
+    parser.add_argument("--stats-dir", default="stats")
+    parser.add_argument("--since", type=date.fromisoformat, help="first day to include (YYYY-MM-DD)")
+    parser.add_argument("--until", type=date.fromisoformat, help="last day to include (YYYY-MM-DD)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--force", action="store_true", help="rebuild reports whose inputs did not change")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+    from keyboards import CATEGORIES
+    builder = ReportBuilder(args.stats_dir, CATEGORIES, workers=args.workers)
+    built = builder.backfill(since=args.since, until=args.until, force=args.force)
+    print(f"{built} reports built.")
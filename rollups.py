@@ -0,0 +1,129 @@
+# ================== rollups.py ==================
+import asyncio
+import os
+from collections import Counter
+from datetime import date, timedelta
+from search_stats import DailyAggregate
+from search_store import read_legacy_rows
+
+
+def read_legacy_log(file_path):
+    """DailyAggregate of a legacy "time - model - status" text log, or None."""
+    agg = DailyAggregate(os.path.basename(file_path)[:-4])
+    try:
+        rows = read_legacy_rows(file_path)
+    except FileNotFoundError:
+        return None
+    for row in rows:
+        agg.add(row)
+    return agg
+
+
+class SummaryRollups:
+    """Per-day search summaries merged into month and date-range views.
+
+    Days that are still in the stats writer's memory (today, and yesterday
+    until its workbook is rendered) are read live, since some of their
+    searches may still be queued; a live day whose stored searches the
+    writer has not merged in yet is its stored summary plus the live
+    counters. Every other day comes from the search
+    store: GROUP BY queries over its date index, one month at a time. A
+    month's days and total are kept in memory along with the month's
+    (searches, last id) signature, so a /summary click on a finished month
+    is one index-only COUNT query.
+    """
+
+    def __init__(self, stats_writer):
+        self.stats_writer = stats_writer
+        self.store = stats_writer.store
+        self.months = {}
+        self.totals = {}
+        self.stats = Counter()
+
+    # ---------- views ----------
+
+    async def day(self, date_str):
+        days = await self.month(date_str[:7])
+        return days.get(date_str)
+
+    async def month(self, month_str):
+        """{date: DailyAggregate} for every day of the month with data."""
+        unloaded = self.stats_writer.unloaded
+        live = {d: agg for d, agg in self.stats_writer.days.items()
+                if d.startswith(month_str) and agg.events and d not in unloaded}
+        partial = {d: DailyAggregate(d).merge(agg) for d, agg in self.stats_writer.days.items()
+                   if d.startswith(month_str) and agg.events and d in unloaded}
+        days = dict(await asyncio.to_thread(self._stored_days, month_str, frozenset(live)))
+        days.update(live)
+        for date_str, agg in partial.items():
+            stored = days.get(date_str)
+            days[date_str] = agg if stored is None else DailyAggregate(date_str).merge(stored).merge(agg)
+        return dict(sorted(days.items()))
+
+    async def month_total(self, month_str):
+        """The month's days merged into one aggregate, cached until one changes."""
+        days = await self.month(month_str)
+        version = tuple((date_str, id(agg), agg.events) for date_str, agg in days.items())
+        cached = self.totals.get(month_str)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        total = DailyAggregate(month_str)
+        for agg in days.values():
+            total.merge(agg)
+        self.totals[month_str] = (version, total)
+        return total
+
+    async def range(self, start, end):
+        """One aggregate for start..end inclusive (datetime.date bounds)."""
+        total = DailyAggregate(f"{start.isoformat()}..{end.isoformat()}")
+        first, last = start.isoformat(), end.isoformat()
+        for month_str in _months(start, end):
+            if first <= f"{month_str}-01" and f"{month_str}-31" <= last:
+                total.merge(await self.month_total(month_str))
+                continue
+            for date_str, agg in (await self.month(month_str)).items():
+                if first <= date_str <= last:
+                    total.merge(agg)
+        return total
+
+    # ---------- stored days ----------
+
+    def _stored_days(self, month_str, live):
+        first, last = f"{month_str}-01", f"{month_str}-31"
+        signature = (live, self.store.signature(first, last, live))
+        cached = self.months.get(month_str)
+        if cached is not None and cached[0] == signature:
+            self.stats["month_hits"] += 1
+            return cached[1]
+        self.stats["month_loads"] += 1
+        days = {date_str: DailyAggregate.from_dict(summary)
+                for date_str, summary in self.store.daily(first, last, live).items()}
+        self.months[month_str] = (signature, days)
+        return days
+
+
+def _months(start, end):
+    # "YYYY-MM" strings from start's month through end's
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield f"{year:04d}-{month:02d}"
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def parse_range(args):
+    """(start, end) dates from /summary arguments, or None.
+
+    Accepts "YYYY-MM-DD YYYY-MM-DD", a single day, or a month "YYYY-MM".
+    """
+    try:
+        if len(args) == 1 and len(args[0]) == 7:
+            start = date.fromisoformat(args[0] + "-01")
+            following = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+            return start, following - timedelta(days=1)
+        if len(args) in (1, 2):
+            start = date.fromisoformat(args[0])
+            end = date.fromisoformat(args[-1])
+            return (start, end) if start <= end else (end, start)
+    except ValueError:
+        pass
+    return None
@@ -0,0 +1,362 @@
+# ================== search_stats.py ==================
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+from datetime import datetime
+from openpyxl import Workbook
+from openpyxl.chart import PieChart, BarChart, LineChart, Reference
+from metrics import metrics
+from search_store import DB_FILE, SearchStore, history_sources, import_source
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 10000          # searches buffered before new ones are dropped
+FLUSH_INTERVAL = 2          # seconds between batched inserts
+RENDER_INTERVAL = 60        # seconds between workbook rebuilds
+
+LOG_HEADER = ["Time", "Category", "Model", "Status"]
+
+
+class DailyAggregate:
+    """Running counters for one day of searches, updated in O(1) per event."""
+
+    def __init__(self, date_str):
+        self.date_str = date_str
+        self.events = 0
+        self.categories = Counter()
+        self.hours = Counter()
+        self.statuses = Counter()
+        self.models = Counter()
+        self.unavailable_models = Counter()
+
+    def add(self, row):
+        time_str, category, model, status = row[:4]
+        self.events += 1
+        self.categories[category] += 1
+        self.hours[str(time_str)[:2]] += 1
+        self.statuses[status] += 1
+        self.models[model] += 1
+        if status != "Available":
+            self.unavailable_models[model] += 1
+
+    def merge(self, other):
+        self.events += other.events
+        self.categories.update(other.categories)
+        self.hours.update(other.hours)
+        self.statuses.update(other.statuses)
+        self.models.update(other.models)
+        self.unavailable_models.update(other.unavailable_models)
+        return self
+
+    @property
+    def available(self):
+        return self.statuses.get("Available", 0)
+
+    @property
+    def not_available(self):
+        return self.events - self.available
+
+    def to_dict(self):
+        return {
+            "date": self.date_str,
+            "events": self.events,
+            "categories": dict(self.categories),
+            "hours": dict(self.hours),
+            "statuses": dict(self.statuses),
+            "models": dict(self.models),
+            "unavailable_models": dict(self.unavailable_models),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        agg = cls(data["date"])
+        agg.events = data["events"]
+        agg.categories = Counter(data["categories"])
+        agg.hours = Counter(data["hours"])
+        agg.statuses = Counter(data["statuses"])
+        agg.models = Counter(data["models"])
+        agg.unavailable_models = Counter(data["unavailable_models"])
+        return agg
+
+
+def format_summary(agg):
+    top_models = agg.models.most_common(5)
+    top_text = "\n".join([f"🔹 {model} ({count} demandes)" for model, count in top_models])
+    unavailable_text = "\n".join([f"❌ {model}" for model in sorted(agg.unavailable_models)])
+
+    return (
+        f"🔎 Total: {agg.events}\n"
+        f"✅ Disponibles: {agg.available}\n"
+        f"❌ Non disponibles: {agg.not_available}\n\n"
+        f"📊 Top 5 modèles demandés :\n{top_text or 'Aucune donnée'}\n\n"
+        f"🚫 Modèles non disponibles :\n{unavailable_text or 'Aucun'}"
+    )
+
+
+class SearchStatsWriter:
+    """Queues search events and writes them off the request path.
+
+    Every search updates the day's DailyAggregate in memory and is queued;
+    a background task inserts the queue into the SQLite search store
+    (stats/searches.db) in one transaction every `flush_interval` seconds.
+    A day's counters start empty, so record() never waits on SQLite; the
+    flusher merges in the day's stored searches (after a restart, or its
+    imported history) before storing the day's first batch. The daily
+    workbook is an export of the store, rebuilt on a timer, at day rollover
+    and on shutdown. A batch the store can't take is retried first on the
+    next flush, and a day stays due for a rebuild until its workbook is
+    written. Before a day's first searches are stored, its journal
+    or workbook from before the store existed is imported, so rebuilding
+    the workbook keeps them; a day whose file can't be read is never
+    rebuilt.
+    """
+
+    def __init__(self, stats_dir, categories, queue_size=QUEUE_SIZE,
+                 flush_interval=FLUSH_INTERVAL, render_interval=RENDER_INTERVAL):
+        self.stats_dir = stats_dir
+        self.categories = list(categories)
+        self.queue_size = queue_size
+        self.flush_interval = flush_interval
+        self.render_interval = render_interval
+        self.store = SearchStore(os.path.join(stats_dir, DB_FILE))
+        self.queue = None
+        self.dropped = 0
+        self.written = 0
+        self._task = None
+        self._pending = []           # drained batch the store has not taken yet
+        self._inserting = False
+        self._dirty_days = set()
+        self._checked_days = set()   # days whose older journal or workbook was looked for
+        self._unreadable_days = set()
+        self._last_render = time.monotonic()
+        self.days = {}
+        self.unloaded = set()        # days whose counters lack the searches already stored
+
+    def workbook_path(self, date_str):
+        return os.path.join(self.stats_dir, f"{date_str}.xlsx")
+
+    # ---------- request path ----------
+
+    def record(self, category, model, available, now=None):
+        if self.queue is None:
+            self.queue = asyncio.Queue(maxsize=self.queue_size)
+        now = now or datetime.now()
+        date_str = now.strftime("%Y-%m-%d")
+        status = "Available" if available else "Not available"
+        row = [now.strftime("%H:%M:%S"), category, model, status]
+        try:
+            self.queue.put_nowait((date_str, row))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning("Search stats queue full, %d events dropped", self.dropped)
+            return
+        self.day(date_str).add(row)
+
+    def day(self, date_str):
+        agg = self.days.get(date_str)
+        if agg is None:
+            agg = self.days[date_str] = DailyAggregate(date_str)
+            self.unloaded.add(date_str)
+        return agg
+
+    def today(self):
+        return self.day(datetime.now().strftime("%Y-%m-%d"))
+
+    def load_day(self, date_str):
+        return DailyAggregate.from_dict(self.store.summary(date_str, date_str))
+
+    # ---------- background flusher ----------
+
+    def start(self):
+        if self.queue is None:
+            self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.today()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush(render=True)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            render = time.monotonic() - self._last_render >= self.render_interval
+            try:
+                await self.flush(render=render)
+            except Exception:
+                logger.exception("Failed to flush search stats")
+
+    def _drain(self):
+        batch = []
+        while self.queue is not None and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def flush(self, render=False):
+        # While a batch is pending the queue fills up, and record() drops
+        # new searches before counting them
+        batch, self._pending = self._pending or self._drain(), []
+        if batch:
+            self._inserting = False
+            try:
+                await self._store(batch)
+            except asyncio.CancelledError:
+                # Once handed to the store's thread, a cancelled insert still runs
+                if not self._inserting:
+                    self._pending = batch
+                raise
+            except Exception:
+                self._pending = batch
+                raise
+            days = {date_str for date_str, _ in batch}
+            # Day rollover: render yesterday's workbook as soon as today starts
+            if self._dirty_days - days:
+                render = True
+            self._dirty_days |= days
+        if render and self._dirty_days:
+            self._last_render = time.monotonic()
+            for date_str in sorted(self._dirty_days):
+                try:
+                    with metrics.time("stage_seconds", stage="workbook_render"):
+                        await asyncio.to_thread(self.render_day, date_str)
+                except Exception:
+                    logger.exception("Could not rebuild the workbook of %s", date_str)
+                    continue
+                self._dirty_days.discard(date_str)
+            # Past days are finished; only keep today's counters in memory
+            today = datetime.now().strftime("%Y-%m-%d")
+            for date_str in list(self.days):
+                if date_str < today and date_str not in self._dirty_days:
+                    del self.days[date_str]
+                    self.unloaded.discard(date_str)
+
+    async def _store(self, batch):
+        days = {date_str for date_str, _ in batch}
+        new_days = days - self._checked_days
+        if new_days:
+            await asyncio.to_thread(self.import_days, new_days)
+            self._checked_days |= new_days
+        unloaded = sorted(days & self.unloaded)
+        if unloaded:
+            stored = await asyncio.to_thread(lambda: [self.store.summary(d, d) for d in unloaded])
+            for date_str, summary in zip(unloaded, stored):
+                # Before this batch is stored, so its searches count once
+                agg = self.days.get(date_str)
+                if agg is not None and date_str in self.unloaded:
+                    self.days[date_str] = DailyAggregate.from_dict(summary).merge(agg)
+                self.unloaded.discard(date_str)
+        self._inserting = True
+        with metrics.time("stage_seconds", stage="stats_flush"):
+            await asyncio.to_thread(self.store.add, batch)
+        self.written += len(batch)
+
+    # ---------- history import ----------
+
+    def import_days(self, days):
+        """Import the older journal or workbook of `days`; the rows added."""
+        sources = history_sources(self.stats_dir)
+        imported = 0
+        for date_str in sorted(days):
+            path = sources.get(date_str)
+            if path is None:
+                continue
+            added = import_source(self.store, date_str, path)
+            if added is None:
+                self._unreadable_days.add(date_str)
+            elif added:
+                logger.info("Imported %d searches of %s from %s", added, date_str, path)
+                imported += added
+        return imported
+
+    # ---------- workbook export ----------
+
+    def render_day(self, date_str):
+        if date_str in self._unreadable_days:
+            logger.warning("Not rebuilding %s, its history could not be imported", self.workbook_path(date_str))
+            return
+        rows = [row[1:] for row in self.store.rows(date_str, date_str)]
+        agg = self.days.get(date_str) if date_str not in self.unloaded else None
+        agg = agg or self.load_day(date_str)
+        excel_file = self.workbook_path(date_str)
+        wb = build_workbook(rows, agg, self.categories)
+        tmp_file = excel_file + ".tmp"
+        wb.save(tmp_file)
+        os.replace(tmp_file, excel_file)
+
+
+def build_workbook(rows, agg, categories, header=LOG_HEADER):
+    wb = Workbook()
+    ws_log = wb.active
+    ws_log.title = "Search Log"
+    ws_summary = wb.create_sheet("Category Summary")
+    ws_na = wb.create_sheet("Not Available")
+    ws_charts = wb.create_sheet("Charts")
+    ws_trends = wb.create_sheet("Daily Trends")
+
+    # Raw rows only feed the two listing sheets; everything else comes from the aggregate
+    status = header.index("Status")
+    ws_log.append(header)
+    ws_na.append(header)
+    for row in rows:
+        ws_log.append(row)
+        if row[status] == "Not available":
+            ws_na.append(row)
+
+    ws_summary.append(["Category", "Searches"])
+    for cat in categories:
+        ws_summary.append([cat, agg.categories.get(cat, 0)])
+
+    ws_trends.append(["Hour", "Searches"])
+    for h in range(24):
+        hour_str = f"{h:02d}"
+        ws_trends.append([hour_str, agg.hours.get(hour_str, 0)])
+
+    # Pie chart
+    pie = PieChart()
+    data = Reference(ws_summary, min_col=2, min_row=1, max_row=1+len(categories))
+    labels = Reference(ws_summary, min_col=1, min_row=2, max_row=1+len(categories))
+    pie.add_data(data, titles_from_data=True)
+    pie.set_categories(labels)
+    pie.title = "Searches by Category"
+    ws_charts.add_chart(pie, "B2")
+
+    # Bar chart
+    ws_charts["E1"] = "Status"
+    ws_charts["F1"] = "Count"
+    ws_charts["E2"] = "Available"
+    ws_charts["F2"] = agg.statuses.get("Available", 0)
+    ws_charts["E3"] = "Not available"
+    ws_charts["F3"] = agg.statuses.get("Not available", 0)
+
+    bar = BarChart()
+    data = Reference(ws_charts, min_col=6, min_row=1, max_row=3)
+    labels = Reference(ws_charts, min_col=5, min_row=2, max_row=3)
+    bar.add_data(data, titles_from_data=True)
+    bar.set_categories(labels)
+    bar.title = "Availability Status"
+    bar.y_axis.title = "Count"
+    bar.x_axis.title = "Status"
+    ws_charts.add_chart(bar, "E5")
+
+    # Line chart (Daily Trends)
+    line = LineChart()
+    data = Reference(ws_trends, min_col=2, min_row=1, max_row=25)
+    labels = Reference(ws_trends, min_col=1, min_row=2, max_row=25)
+    line.add_data(data, titles_from_data=True)
+    line.set_categories(labels)
+    line.title = "Searches by Hour"
+    line.x_axis.title = "Hour"
+    line.y_axis.title = "Searches"
+    ws_charts.add_chart(line, "B20")
+
+    return wb
@@ -0,0 +1,281 @@
+# ================== search_store.py ==================
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import Counter
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DB_FILE = "searches.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS searches (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL,
+    category TEXT NOT NULL,
+    model TEXT NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS searches_date ON searches (date);
+CREATE INDEX IF NOT EXISTS searches_category ON searches (category, date);
+CREATE INDEX IF NOT EXISTS searches_model ON searches (model, date);
+CREATE INDEX IF NOT EXISTS searches_status ON searches (status, date);
+CREATE TABLE IF NOT EXISTS imports (
+    source TEXT PRIMARY KEY,
+    date TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    imported_at TEXT NOT NULL
+);
+"""
+
+INSERT = "INSERT INTO searches (date, time, category, model, status) VALUES (?, ?, ?, ?, ?)"
+
+
+def _values(date_str, row):
+    time_str, category, model, status = row[:4]
+    return date_str, str(time_str), category or "", model or "", status or ""
+
+
+class SearchStore:
+    """Search events in SQLite (WAL mode), one row per search.
+
+    Each thread gets its own connection, so the stats flusher, /summary
+    queries and report workers in other processes read and write
+    concurrently. Summaries come back as dicts shaped like
+    DailyAggregate.to_dict().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    @property
+    def db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(SCHEMA)
+            self._local.db = db
+        return db
+
+    def close(self):
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+    # ---------- writes ----------
+
+    def add(self, batch):
+        """Insert [(date, [time, category, model, status]), ...] in one transaction."""
+        with self.db:
+            self.db.executemany(INSERT, (_values(date_str, row) for date_str, row in batch))
+
+    def has_history(self, source, date_str):
+        """True when `source` was imported or the day already has searches."""
+        if self.db.execute("SELECT 1 FROM imports WHERE source = ?", (source,)).fetchone():
+            return True
+        return self.db.execute("SELECT 1 FROM searches WHERE date = ? LIMIT 1", (date_str,)).fetchone() is not None
+
+    def import_day(self, source, date_str, rows):
+        """Bulk-load one day of history; skipped when the source was imported
+        or the day already has searches. Returns the rows added."""
+        with self.db:
+            if self.has_history(source, date_str):
+                return 0
+            self.db.executemany(INSERT, (_values(date_str, row) for row in rows))
+            self.db.execute("INSERT INTO imports VALUES (?, ?, ?, ?)",
+                            (source, date_str, len(rows), datetime.now().isoformat(timespec="seconds")))
+        return len(rows)
+
+    # ---------- queries ----------
+
+    def rows(self, first, last):
+        """[date, time, category, model, status] for first..last, in insertion order."""
+        return [list(row) for row in self.db.execute(
+            "SELECT date, time, category, model, status FROM searches WHERE date BETWEEN ? AND ? ORDER BY id",
+            (first, last))]
+
+    def summary(self, first, last, name=None, exclude=()):
+        """One summary of first..last, leaving out the dates in `exclude`."""
+        where, args = _range(first, last, exclude)
+        summary = _empty(name or first)
+        for dimension, column in (("categories", "category"), ("hours", "substr(time, 1, 2)")):
+            for key, n in self.db.execute(f"SELECT {column}, COUNT(*) FROM searches {where} GROUP BY 1", args):
+                summary[dimension][key] = n
+        # In order of first search, like a DailyAggregate fed row by row
+        for model, status, n in self.db.execute(
+                f"SELECT model, status, COUNT(*) FROM searches {where} GROUP BY 1, 2 ORDER BY MIN(id)", args):
+            _count(summary, model, status, n)
+        return summary
+
+    def daily(self, first, last, exclude=()):
+        """{date: summary} for the days of first..last that have searches."""
+        where, args = _range(first, last, exclude)
+        days = {}
+
+        def day(date_str):
+            if date_str not in days:
+                days[date_str] = _empty(date_str)
+            return days[date_str]
+
+        for dimension, column in (("categories", "category"), ("hours", "substr(time, 1, 2)")):
+            for date_str, key, n in self.db.execute(
+                    f"SELECT date, {column}, COUNT(*) FROM searches {where} GROUP BY 1, 2", args):
+                day(date_str)[dimension][key] = n
+        for date_str, model, status, n in self.db.execute(
+                f"SELECT date, model, status, COUNT(*) FROM searches {where} GROUP BY 1, 2, 3 ORDER BY MIN(id)",
+                args):
+            _count(day(date_str), model, status, n)
+        return dict(sorted(days.items()))
+
+    def signature(self, first, last, exclude=()):
+        """(searches, last id) of first..last; changes whenever the range gets a search."""
+        where, args = _range(first, last, exclude)
+        return tuple(self.db.execute(f"SELECT COUNT(*), MAX(id) FROM searches {where}", args).fetchone())
+
+    def day_signatures(self):
+        """{date: [searches, last id]}, which changes whenever a day gets a search."""
+        return {date_str: [n, last] for date_str, n, last in self.db.execute(
+            "SELECT date, COUNT(*), MAX(id) FROM searches GROUP BY date")}
+
+    def top_models(self, first, last, n=10, status=None):
+        """[(model, searches)] most requested over first..last, optionally for one status."""
+        where, args = _range(first, last)
+        if status is not None:
+            where, args = where + " AND status = ?", args + [status]
+        return self.db.execute(
+            f"SELECT model, COUNT(*) FROM searches {where} GROUP BY model ORDER BY 2 DESC, model LIMIT ?",
+            args + [n]).fetchall()
+
+
+def _range(first, last, exclude=()):
+    where = "WHERE date BETWEEN ? AND ?"
+    args = [first, last]
+    if exclude:
+        where += f" AND date NOT IN ({','.join('?' * len(exclude))})"
+        args += sorted(exclude)
+    return where, args
+
+
+def _empty(name):
+    return {"date": name, "events": 0, "categories": {}, "hours": {}, "statuses": {},
+            "models": Counter(), "unavailable_models": Counter()}
+
+
+def _count(summary, model, status, n):
+    summary["events"] += n
+    summary["statuses"][status] = summary["statuses"].get(status, 0) + n
+    summary["models"][model] += n
+    if status != "Available":
+        summary["unavailable_models"][model] += n
+
+
+# ---------- history import ----------
+
+def read_journal_rows(path):
+    # stats/YYYY-MM-DD.jsonl written before the store existed
+    rows = []
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue
+            if row:
+                rows.append(row)
+    return rows
+
+
+def read_workbook_rows(path):
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True)
+    try:
+        return [list(row) for row in wb["Search Log"].iter_rows(min_row=2, values_only=True) if row[0]]
+    finally:
+        wb.close()
+
+
+def read_legacy_rows(path):
+    # logs/YYYY-MM-DD.log lines: "time - model - status"
+    rows = []
+    with open(path, "r") as f:
+        for line in f:
+            parts = line.strip().split(" - ")
+            if len(parts) < 3:
+                continue
+            status = "Available" if "Available" in parts[2] else "Not available"
+            rows.append([parts[0], "", parts[1], status])
+    return rows
+
+
+def history_sources(stats_dir, log_dir=None):
+    """{date: path} of the history to import. For a day with several, the
+    journal wins over the workbook, which wins over a legacy log."""
+    sources = {}
+    for directory, suffix in ((log_dir, ".log"), (stats_dir, ".xlsx"), (stats_dir, ".jsonl")):
+        if not directory:
+            continue
+        try:
+            names = sorted(os.listdir(directory))
+        except FileNotFoundError:
+            continue
+        for name in names:
+            if name.endswith(suffix) and len(name) == 10 + len(suffix):
+                sources[name[:10]] = os.path.join(directory, name)
+    return dict(sorted(sources.items()))
+
+
+READERS = {".jsonl": read_journal_rows, ".xlsx": read_workbook_rows, ".log": read_legacy_rows}
+
+
+def import_source(store, date_str, path):
+    """Import one history file; the rows added, or None if it can't be read.
+    Files already imported, or for days the store has, are not read."""
+    source = os.path.abspath(path)
+    if store.has_history(source, date_str):
+        return 0
+    try:
+        rows = READERS[os.path.splitext(path)[1]](path)
+    except Exception as e:
+        logger.error("Could not read %s: %s", path, e)
+        return None
+    return store.import_day(source, date_str, rows)
+
+
+def import_history(store, stats_dir, log_dir=None):
+    """Load every day of journals, workbooks and legacy logs into `store`.
+
+    Safe to run again: imported files and days the store already has are
+    skipped. Returns (days imported, rows imported).
+    """
+    days = imported = 0
+    for date_str, path in history_sources(stats_dir, log_dir).items():
+        added = import_source(store, date_str, path)
+        if added:
+            days += 1
+            imported += added
+    return days, imported
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import search history (journals, daily workbooks and "
+                                                 "legacy logs) into the SQLite search store.")
+    parser.add_argument("--stats-dir", default="stats")
+    parser.add_argument("--log-dir", default="logs")
+    parser.add_argument("--db", help=f"defaults to <stats-dir>/{DB_FILE}")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+    store = SearchStore(args.db or os.path.join(args.stats_dir, DB_FILE))
+    days, rows = import_history(store, args.stats_dir, args.log_dir)
+    print(f"{rows} searches from {days} days imported into {store.path}.")
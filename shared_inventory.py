@@ -0,0 +1,437 @@
+# ================== shared_inventory.py ==================
+import asyncio
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from brands import BrandMatcher
+from file_utils import file_signature, write_atomic
+from inventory_cache import CHECK_INTERVAL, InventorySnapshot, notify_restocked
+from inventory_index import InventoryIndex
+from sheet import Article
+
+logger = logging.getLogger(__name__)
+
+SHARED_DIR = "shared"
+POINTER_FILE = "current.json"
+FORMAT_VERSION = 3
+MAGIC = b"INVSNAP\x01"
+KEEP = 3            # published files left on disk for workers still opening an older one
+STARTUP_WAIT = 120  # seconds a worker waits for the loader's first snapshot
+
+
+def _gram_key(gram):
+    # Three code points (21 bits each) in one sortable 64-bit integer
+    a, b, c = map(ord, gram)
+    return a << 42 | b << 21 | c
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+
+def _strings(values):
+    offsets = array("Q", [0])
+    blob = bytearray()
+    for value in values:
+        blob += value.encode("utf-8")
+        offsets.append(len(blob))
+    return blob, offsets
+
+
+def _grouped(groups):
+    # {key: [ids]} -> (keys, offsets, ids), keys sorted
+    keys = sorted(groups)
+    offsets = array("I", [0])
+    ids = array("I")
+    for key in keys:
+        ids.extend(groups[key])
+        offsets.append(len(ids))
+    return keys, offsets, ids
+
+
+def write_snapshot(path, snapshot, previous=None):
+    """Write the snapshot's index as one flat file that SharedIndex maps.
+
+    Every structure the searches use is an array (row ids, trigram keys,
+    offsets) or a UTF-8 blob with offsets, laid out after a JSON header, so
+    attaching costs nothing per row. `previous` names the published file
+    the snapshot's restocked rows are relative to, if any.
+    """
+    index = snapshot.index
+    matcher = index.brand_matcher
+    sections = {}
+    designations, designation_offsets = _strings(row.designation if row is not None else "" for row in index.rows)
+    names, name_offsets = _strings(index.names)
+    sections.update({
+        "designations": designations, "designation_offsets": designation_offsets,
+        "names": names, "name_offsets": name_offsets,
+        "pu": array("d", (row.pu if row is not None else 0.0 for row in index.rows)),
+        "qt": array("d", (row.qt if row is not None else 0.0 for row in index.rows)),
+        # -1 marks a row removed by a delta
+        "article_ids": array("q", (index.article_ids[i] if row is not None else -1
+                                   for i, row in enumerate(index.rows))),
+    })
+    by_id = sorted(index.by_id.items())
+    sections["id_keys"] = array("q", (article_id for article_id, _ in by_id))
+    sections["id_rows"] = array("I", (i for _, i in by_id))
+    brand_offsets = array("I", [0])
+    brand_codes = array("I")
+    for tags in index.row_brands:
+        brand_codes.extend(matcher.exact[brand] for brand in tags)
+        brand_offsets.append(len(brand_codes))
+    sections["brand_offsets"] = brand_offsets
+    sections["brand_codes"] = brand_codes
+    sections["restocked"] = array("I", snapshot.restocked if previous is not None else ())
+
+    keywords = list(index.partitions)
+    for n, keyword in enumerate(keywords):
+        part = index.partitions[keyword]
+        prefix = f"p{n}."
+        sections[prefix + "ids"] = array("I", part.ids)
+        grams, sections[prefix + "gram_offsets"], sections[prefix + "postings"] = _grouped(
+            {_gram_key(gram): ids for gram, ids in part.postings.items() if ids})
+        sections[prefix + "gram_keys"] = array("Q", grams)
+        lengths, sections[prefix + "length_offsets"], sections[prefix + "length_ids"] = _grouped(
+            {length: ids for length, ids in part.by_length.items() if ids})
+        sections[prefix + "lengths"] = array("I", lengths)
+        codes, sections[prefix + "brand_offsets"], sections[prefix + "brand_ids"] = _grouped(
+            {matcher.exact[brand]: ids for brand, ids in part.brand_postings.items() if ids}
+            if matcher is not None else {})
+        sections[prefix + "brand_codes"] = array("I", codes)
+
+    layout = {}
+    offset = 0
+    for name, data in sections.items():
+        typecode = data.typecode if isinstance(data, array) else "B"
+        size = len(data) * (data.itemsize if isinstance(data, array) else 1)
+        layout[name] = [offset, size, typecode]
+        offset = _align(offset + size)
+    header = json.dumps({
+        "version": FORMAT_VERSION,
+        "generation": snapshot.generation,
+        "export_generation": snapshot.export_generation,
+        "checksum": snapshot.checksum,
+        "live": index.live,
+        "next_id": index.next_id,
+        "id_epoch": index.id_epoch,
+        "brands": matcher.brands if matcher is not None else None,
+        "brand_cutoff": matcher.cutoff if matcher is not None else None,
+        "keywords": keywords,
+        "previous": previous,
+        "sections": layout,
+    }).encode("utf-8")
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".snap")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC + struct.pack("<I", len(header)) + header)
+            f.write(b"\0" * (_align(f.tell()) - f.tell()))
+            start = f.tell()
+            for name, data in sections.items():
+                f.write(b"\0" * (start + layout[name][0] - f.tell()))
+                f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return os.path.getsize(path)
+
+
+# ---------- read-only views over the mapped file ----------
+
+class _Strings:
+    # Slicing the mmap itself is about twice as fast as decoding a memoryview
+    def __init__(self, data, start, offsets):
+        self.data = data
+        self.start = start
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        start = self.start
+        return self.data[start + self.offsets[i]:start + self.offsets[i + 1]].decode("utf-8")
+
+    def __iter__(self):
+        return map(self.__getitem__, range(len(self)))
+
+
+class _Rows:
+    def __init__(self, designations, pu, qt, article_ids):
+        self.designations = designations
+        self.pu = pu
+        self.qt = qt
+        self.article_ids = article_ids
+
+    def __len__(self):
+        return len(self.pu)
+
+    def __getitem__(self, i):
+        if self.article_ids[i] < 0:
+            return None
+        return Article(self.designations[i], self.pu[i], self.qt[i])
+
+    def __iter__(self):
+        return map(self.__getitem__, range(len(self)))
+
+
+class _RowBrands:
+    def __init__(self, offsets, codes, brands):
+        self.offsets = offsets
+        self.codes = codes
+        self.brands = brands
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return tuple(self.brands[code] for code in self.codes[self.offsets[i]:self.offsets[i + 1]])
+
+
+class _Sorted:
+    # Sorted keys with a value (or a posting slice) per key, looked up by bisection
+    def __init__(self, keys, values, offsets=None, encode=None):
+        self.keys = keys
+        self.values = values
+        self.offsets = offsets
+        self.encode = encode
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get(self, key, default=None):
+        if self.encode is not None:
+            if len(key) != 3:
+                return default
+            key = self.encode(key)
+        k = bisect_left(self.keys, key)
+        if k == len(self.keys) or self.keys[k] != key:
+            return default
+        if self.offsets is None:
+            return self.values[k]
+        return self.values[self.offsets[k]:self.offsets[k + 1]]
+
+
+class _SharedPartition:
+    def __init__(self, section, prefix, brands):
+        self.ids = section(prefix + "ids")
+        self.postings = _Sorted(section(prefix + "gram_keys"), section(prefix + "postings"),
+                                section(prefix + "gram_offsets"), _gram_key)
+        # A few hundred lengths and brands; plain dicts of slices
+        offsets, ids = section(prefix + "length_offsets"), section(prefix + "length_ids")
+        self.by_length = {length: ids[offsets[k]:offsets[k + 1]]
+                          for k, length in enumerate(section(prefix + "lengths"))}
+        offsets, ids = section(prefix + "brand_offsets"), section(prefix + "brand_ids")
+        self.brand_postings = {brands[code]: ids[offsets[k]:offsets[k + 1]]
+                               for k, code in enumerate(section(prefix + "brand_codes"))}
+
+
+class SharedIndex(InventoryIndex):
+    """An InventoryIndex mapped read-only from a file written by write_snapshot.
+
+    Rows, names, postings and brand tags stay in the page cache, shared by
+    every process that maps the same file; only the small per-length and
+    per-brand tables are built on attach. Searches run the InventoryIndex
+    code unchanged and give the same results as the index that was written.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(self._map)
+        if bytes(buf[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path} is not an inventory snapshot")
+        (length,) = struct.unpack_from("<I", buf, len(MAGIC))
+        header = json.loads(bytes(buf[len(MAGIC) + 4:len(MAGIC) + 4 + length]))
+        if header["version"] != FORMAT_VERSION:
+            raise ValueError(f"{path} has format version {header['version']}")
+        start = _align(len(MAGIC) + 4 + length)
+
+        def section(name):
+            offset, size, typecode = header["sections"][name]
+            return buf[start + offset:start + offset + size].cast(typecode)
+
+        def strings(name):
+            return _Strings(self._map, start + header["sections"][name][0], section(name[:-1] + "_offsets"))
+
+        self.header = header
+        self.restocked = section("restocked")
+        self.keys = {}
+        self.live = header["live"]
+        self.next_id = header["next_id"]
+        self.id_epoch = header["id_epoch"]
+        self.article_ids = section("article_ids")
+        self.rows = _Rows(strings("designations"),
+                          section("pu"), section("qt"), self.article_ids)
+        self.names = strings("names")
+        self.by_id = _Sorted(section("id_keys"), section("id_rows"))
+        brands = header["brands"]
+        self.brand_matcher = BrandMatcher(brands, header["brand_cutoff"]) if brands is not None else None
+        self.brand_key = self.brand_matcher.key if self.brand_matcher is not None else None
+        brands = self.brand_matcher.brands if self.brand_matcher is not None else []
+        self.row_brands = _RowBrands(section("brand_offsets"), section("brand_codes"), brands)
+        self.partitions = {keyword: _SharedPartition(section, f"p{n}.", brands)
+                           for n, keyword in enumerate(header["keywords"])}
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("SharedIndex is read-only; the loader process publishes changes")
+
+    update = add = remove = tag_brands = _read_only
+
+
+# ---------- loader side ----------
+
+class SnapshotPublisher:
+    """Writes each inventory snapshot to `directory` for worker processes.
+
+    A snapshot goes to a new inventory-<generation>-<ns>.snap file, then
+    current.json is replaced to point at it. Files are never rewritten, so
+    a worker can keep a mapping as long as it likes; the oldest ones are
+    unlinked past `keep` (their pages live on while still mapped).
+    """
+
+    def __init__(self, directory=SHARED_DIR, keep=KEEP):
+        self.directory = directory
+        self.keep = keep
+        self.last = None  # (generation, file name) of the last publish
+
+    @property
+    def pointer_path(self):
+        return os.path.join(self.directory, POINTER_FILE)
+
+    def publish(self, snapshot):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"inventory-{snapshot.generation}-{time.time_ns()}.snap"
+        # Restocked rows only mean something to a worker holding the generation before
+        previous = None
+        if self.last is not None and snapshot.restocked is not None and self.last[0] == snapshot.generation - 1:
+            previous = self.last[1]
+        t0 = time.perf_counter()
+        size = write_snapshot(os.path.join(self.directory, name), snapshot, previous)
+        write_atomic(self.pointer_path, json.dumps({"file": name, "generation": snapshot.generation}))
+        self.last = (snapshot.generation, name)
+        logger.info("Published inventory generation %d to %s (%d KB in %.0f ms)", snapshot.generation,
+                    name, size // 1024, (time.perf_counter() - t0) * 1000)
+        self._prune(name)
+
+    def _prune(self, current):
+        published = sorted((entry for entry in os.scandir(self.directory)
+                            if entry.name.endswith(".snap") and entry.name.startswith("inventory-")),
+                           key=lambda entry: entry.stat().st_mtime_ns)
+        for entry in published[:-self.keep]:
+            if entry.name != current:
+                try:
+                    os.unlink(entry.path)
+                except OSError:
+                    pass
+
+
+# ---------- worker side ----------
+
+class SharedInventory:
+    """InventoryCache for worker processes: serves the loader's published snapshot.
+
+    current.json is stat()ed at most every `check_interval` seconds; when the
+    loader points it at a new file, the file is mapped in a worker thread and
+    swapped in while callers keep the previous one. On a cold start, callers
+    wait up to `wait` seconds for the first publish. `on_restock` gets the
+    rows back in stock when the new file follows the mapped one directly.
+    """
+
+    def __init__(self, directory=SHARED_DIR, check_interval=CHECK_INTERVAL, wait=STARTUP_WAIT, on_restock=None):
+        self.directory = directory
+        self.check_interval = check_interval
+        self.wait = wait
+        self.on_restock = on_restock
+        self.snapshot = None
+        self.stats = Counter()
+        self._refresh_task = None
+        self._last_check = 0
+
+    @property
+    def pointer_path(self):
+        return os.path.join(self.directory, POINTER_FILE)
+
+    async def get(self):
+        snapshot = self.snapshot
+        if snapshot is None:
+            self.stats["misses"] += 1
+            return await self.refresh()
+        self.stats["hits"] += 1
+        now = time.monotonic()
+        if now - self._last_check >= self.check_interval:
+            self._last_check = now
+            if file_signature(self.pointer_path) != snapshot.file_stat:
+                self.refresh_in_background()
+        return snapshot
+
+    def refresh_in_background(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh())
+        return self._refresh_task
+
+    async def refresh(self):
+        task = self._refresh_task
+        if task is not None and not task.done():
+            self.stats["coalesced"] += 1
+        return await asyncio.shield(self.refresh_in_background())
+
+    async def _refresh(self):
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + self.wait
+        while True:
+            try:
+                snapshot = await loop.run_in_executor(None, self._attach)
+                break
+            except FileNotFoundError:
+                # Nothing published yet, or the file was pruned under us
+                if self.snapshot is not None:
+                    return self.snapshot
+                if time.monotonic() >= deadline:
+                    raise
+                await asyncio.sleep(self.check_interval)
+            except Exception:
+                self.stats["errors"] += 1
+                logger.exception("Could not attach the shared inventory snapshot")
+                if self.snapshot is None:
+                    raise
+                return self.snapshot
+        self._last_check = time.monotonic()
+        if snapshot is not None:
+            self.snapshot = snapshot
+            self.stats["attaches"] += 1
+            logger.info("Attached inventory generation %d (%d articles) from %s",
+                        snapshot.generation, len(snapshot.index), os.path.basename(snapshot.index.path))
+            notify_restocked(self.on_restock, snapshot)
+        return self.snapshot
+
+    def _attach(self):
+        # Runs in a worker thread; None when current.json still names the mapped file
+        signature = file_signature(self.pointer_path)
+        with open(self.pointer_path, "r", encoding="utf-8") as f:
+            pointer = json.load(f)
+        path = os.path.join(self.directory, pointer["file"])
+        current = self.snapshot
+        if current is not None and current.index.path == path:
+            current.file_stat = signature
+            return None
+        index = SharedIndex(path)
+        header = index.header
+        restocked = None
+        if current is not None and header["previous"] == os.path.basename(current.index.path):
+            restocked = list(index.restocked)
+        elif current is not None and header["generation"] > current.generation + 1:
+            logger.info("Skipped inventory generations before %d, restocked rows unknown", header["generation"])
+        return InventorySnapshot(header["generation"], signature, header["checksum"], index.rows, index,
+                                 export_generation=header["export_generation"], restocked=restocked)
@@ -1,4 +1,6 @@
 # ================== sheet.py ==================
+import asyncio
+from typing import NamedTuple
 import pandas as pd
 
 CATEGORY_KEYWORDS = {
@@ -8,33 +10,85 @@ CATEGORY_KEYWORDS = {
     "Glass": "GLASS"
 }
 
+INVENTORY_COLUMNS = ["Designation1", "PU", "QT"]
+
+# Cells pandas reads as missing by default
+NA_VALUES = {
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a",
+    "nan", "null"
+}
+
+
+class Article(NamedTuple):
+    designation: str
+    pu: float
+    qt: float
+
+
+def parse_article(designation, pu_raw, qt_raw):
+    """Single-row version of the rules in load_inventory, for delta updates."""
+    def number(raw):
+        if raw is None or raw in NA_VALUES:
+            return 0.0, False
+        try:
+            value = float(raw.strip())
+        except ValueError:
+            return 0.0, bool(raw.strip())
+        return (0.0 if value != value else value), False
+
+    qt, qt_invalid = number(qt_raw)
+    pu, pu_invalid = number(pu_raw)
+    if qt_invalid or pu_invalid:
+        return Article(designation.strip(), 0.0, 0.0)
+    return Article(designation.strip(), pu, qt if qt > 0 else 0.0)
+
+
 class SheetHandler:
     def __init__(self, csv_path='Article.csv'):
         self.csv_path = csv_path
 
     async def get_inventory(self):
+        # Parsing a few thousand rows takes long enough to stall every chat
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.load_inventory)
+
+    def load_inventory(self):
         try:
-            df = pd.read_csv(self.csv_path, encoding='utf-8', delimiter=',', low_memory=False)
+            df = pd.read_csv(
+                self.csv_path,
+                encoding='utf-8',
+                delimiter=',',
+                usecols=lambda column: column in INVENTORY_COLUMNS,
+                dtype=str
+            )
         except Exception as e:
             print(f"[ERROR] Failed to read CSV file '{self.csv_path}': {e}")
             return []
 
-        # Drop rows where Designation1 is missing
-        if "Designation1" not in df.columns or "PU" not in df.columns or "QT" not in df.columns:
+        if any(column not in df.columns for column in INVENTORY_COLUMNS):
             print("[ERROR] Required columns not found in CSV")
             return []
 
+        # Drop rows where Designation1 is missing
         df = df.dropna(subset=["Designation1"])
 
-        inventory = []
-        for _, row in df.iterrows():
-            inventory.append({
-                "Designation1": str(row["Designation1"]).strip(),
-                "PU": str(row["PU"]).strip(),
-                "QT": str(row["QT"]).strip()
-            })
+        qt_raw = df["QT"].str.strip()
+        pu_raw = df["PU"].str.strip()
+        qt = pd.to_numeric(qt_raw, errors="coerce")
+        pu = pd.to_numeric(pu_raw, errors="coerce")
+
+        # A non-empty value that doesn't parse zeroes both fields; missing
+        # values and non-positive quantities count as 0
+        invalid = (qt.isna() & qt_raw.fillna("").ne("")) | (pu.isna() & pu_raw.fillna("").ne(""))
+        qt = qt.where(qt > 0, 0.0).mask(invalid, 0.0)
+        pu = pu.fillna(0.0).mask(invalid, 0.0)
 
-        return inventory
+        return list(map(Article._make, zip(
+            df["Designation1"].str.strip().tolist(),
+            pu.astype(float).tolist(),
+            qt.astype(float).tolist()
+        )))
 
 
 sheet_handler = SheetHandler()
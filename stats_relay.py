@@ -0,0 +1,201 @@
+# ================== stats_relay.py ==================
+import asyncio
+import json
+import logging
+import os
+from collections import deque
+from datetime import datetime
+from search_store import DB_FILE, SearchStore
+
+logger = logging.getLogger(__name__)
+
+STATS_SOCKET = "stats.sock"
+QUEUE_SIZE = 10000
+BACKLOG_SIZE = 10000  # unsent searches kept while the relay is unreachable
+RETRY_INTERVAL = 1    # seconds between attempts to reach the relay
+
+
+class StatsRelay:
+    """Loader side: feeds search events sent by worker processes into one
+    SearchStatsWriter, so the store and the daily workbooks have a single
+    writer however many bot processes run.
+
+    Workers connect to a unix socket and send one JSON line per search:
+    [timestamp, category, model, available].
+    """
+
+    def __init__(self, stats_writer, path=STATS_SOCKET):
+        self.stats_writer = stats_writer
+        self.path = path
+        self.received = 0
+        self.rejected = 0
+        self.server = None
+        self._connections = set()
+
+    async def start(self):
+        try:
+            os.unlink(self.path)  # left over from a process that didn't stop cleanly
+        except FileNotFoundError:
+            pass
+        self.server = await asyncio.start_unix_server(self._serve, self.path)
+        return self
+
+    async def stop(self, timeout=5):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        if self._connections:
+            # Lines already sent by workers that are shutting down still count
+            _, pending = await asyncio.wait(self._connections, timeout=timeout)
+            for task in pending:
+                task.cancel()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    async def _serve(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while line := await reader.readline():
+                try:
+                    timestamp, category, model, available = json.loads(line)
+                    now = datetime.fromisoformat(timestamp)
+                except (ValueError, TypeError):
+                    self.rejected += 1
+                    continue
+                self.stats_writer.record(category, model, available, now=now)
+                self.received += 1
+        except (OSError, asyncio.CancelledError):
+            # Cancelled by stop(); asyncio logs a connection task that ends cancelled
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+
+class StatsForwarder:
+    """Worker side stand-in for SearchStatsWriter.
+
+    record() only queues; a background task sends the queue to the loader's
+    StatsRelay over one connection, reconnecting when the loader restarts.
+    While the relay is unreachable, unsent events wait in `backlog` and go
+    out first once it answers again; the oldest are dropped past
+    `backlog_size`. Events that can't be queued, kept or sent by shutdown
+    are counted in `dropped`. /summary in a worker reads the shared store
+    directly, so `days` stays empty.
+    """
+
+    def __init__(self, stats_dir, path=STATS_SOCKET, queue_size=QUEUE_SIZE, backlog_size=BACKLOG_SIZE,
+                 retry_interval=RETRY_INTERVAL):
+        self.path = path
+        self.queue_size = queue_size
+        self.backlog_size = backlog_size
+        self.retry_interval = retry_interval
+        self.store = SearchStore(os.path.join(stats_dir, DB_FILE))
+        self.days = {}
+        self.queue = None
+        self.backlog = deque()
+        self.dropped = 0
+        self.sent = 0
+        self._reader = self._writer = None
+        self._task = None
+        self._unreachable = False
+
+    def record(self, category, model, available, now=None):
+        if self.queue is None:
+            self.queue = asyncio.Queue(maxsize=self.queue_size)
+        now = now or datetime.now()
+        try:
+            self.queue.put_nowait(json.dumps([now.isoformat(), category, model, bool(available)]))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning("Search stats relay queue full, %d events dropped", self.dropped)
+
+    def start(self):
+        if self.queue is None:
+            self.queue = asyncio.Queue(maxsize=self.queue_size)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout=5):
+        if self._task is not None:
+            try:
+                # The sender gets to deliver what is already queued or kept
+                await asyncio.wait_for(self.queue.join(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        left = len(self.backlog) + len(self._drain())
+        self.backlog.clear()
+        if left:
+            self.dropped += left
+            logger.warning("Search stats relay unreachable, %d events dropped at shutdown", left)
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def _drain(self):
+        batch = []
+        while self.queue is not None and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _send(self, batch):
+        if not batch:
+            return
+        if self._writer is not None and self._reader.at_eof():
+            # The relay never writes, so EOF means it closed the connection
+            self._writer.close()
+            self._writer = None
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_unix_connection(self.path)
+        try:
+            self._writer.write("".join(line + "\n" for line in batch).encode("utf-8"))
+            await self._writer.drain()
+        except OSError:
+            self._writer.close()
+            self._writer = None
+            raise
+        self.sent += len(batch)
+
+    async def _run(self):
+        # A line is task_done() once it is sent or dropped, so stop() waits
+        # for the backlog as well as the queue
+        while True:
+            if not self.backlog:
+                self.backlog.append(await self.queue.get())
+            self._keep(self._drain())
+            batch = list(self.backlog)
+            try:
+                await self._send(batch)
+            except OSError as e:
+                if not self._unreachable:
+                    self._unreachable = True
+                    logger.warning("Search stats relay unreachable, keeping events to retry: %r", e)
+                await asyncio.sleep(self.retry_interval)
+                continue
+            if self._unreachable:
+                self._unreachable = False
+                logger.info("Search stats relay reached again, %d events sent", len(batch))
+            self.backlog.clear()
+            for _ in batch:
+                self.queue.task_done()
+
+    def _keep(self, lines):
+        self.backlog.extend(lines)
+        over = len(self.backlog) - self.backlog_size
+        if over > 0:
+            for _ in range(over):
+                self.backlog.popleft()
+                self.queue.task_done()
+            self.dropped += over
+            logger.warning("Search stats relay backlog full, %d oldest events dropped", over)
@@ -0,0 +1,317 @@
+# ================== stock_alerts.py ==================
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from telegram.error import Forbidden, TelegramError
+from inventory_index import trigrams
+from outbound import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIPTIONS_FILE = "subscriptions.db"
+SEND_RATE = 10      # notifications per second, leaving most of the 30/s for live replies
+SEND_BURST = 10
+BATCH_SIZE = 100    # notifications whose subscriptions are deleted in one transaction
+MAX_PER_CHAT = 20   # open subscriptions per chat
+MAX_LINES = 10      # articles listed in one notification
+
+ARTICLE, QUERY = "article", "query"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscriptions (
+    id INTEGER PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    keyword TEXT NOT NULL,
+    key TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    UNIQUE (chat_id, kind, keyword, key)
+);
+"""
+
+
+def normalize_query(text):
+    return " ".join(text.lower().split())
+
+
+class Subscription:
+    """One chat waiting for an article (its lowercase designation) or for any
+    article of a category keyword whose name contains a query."""
+
+    __slots__ = ("id", "chat_id", "kind", "keyword", "key")
+
+    def __init__(self, id, chat_id, kind, keyword, key):
+        self.id = id
+        self.chat_id = chat_id
+        self.kind = kind
+        self.keyword = keyword
+        self.key = key
+
+    @property
+    def ident(self):
+        return self.chat_id, self.kind, self.keyword, self.key
+
+    def matches(self, name):
+        if self.kind == ARTICLE:
+            return name == self.key
+        return self.keyword in name and self.key in name
+
+
+def grams(text):
+    """Every substring of up to three characters, what query subscriptions are filed under."""
+    return {text[i:i + n] for n in (1, 2, 3) for i in range(len(text) - n + 1)}
+
+
+class SubscriptionIndex:
+    """Open subscriptions, filed under what a restocked row can match.
+
+    Article subscriptions are keyed by designation. A query subscription is
+    filed under one trigram of the query (the query itself when shorter):
+    a name can only contain the query if it contains that trigram, so a
+    restocked row visits just the subscriptions filed under its own grams.
+    Each query takes its least used trigram, which keeps popular prefixes
+    like "sam" from collecting every Samsung subscription.
+    """
+
+    def __init__(self):
+        self.by_ident = {}
+        self.articles = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.filed = {}  # query subscription ident -> its gram
+        self.per_chat = Counter()
+
+    def __len__(self):
+        return len(self.by_ident)
+
+    def get(self, ident):
+        return self.by_ident.get(ident)
+
+    def add(self, sub):
+        if sub.ident in self.by_ident:
+            return
+        self.by_ident[sub.ident] = sub
+        if sub.kind == ARTICLE:
+            self.articles[sub.key].append(sub)
+        else:
+            options = trigrams(sub.key) or [sub.key]
+            gram = self.filed[sub.ident] = min(options, key=lambda g: len(self.queries.get(g, ())))
+            self.queries[gram].append(sub)
+        self.per_chat[sub.chat_id] += 1
+
+    def discard(self, sub):
+        if self.by_ident.pop(sub.ident, None) is None:
+            return
+        if sub.kind == ARTICLE:
+            buckets, key = self.articles, sub.key
+        else:
+            buckets, key = self.queries, self.filed.pop(sub.ident)
+        buckets[key].remove(sub)
+        if not buckets[key]:
+            del buckets[key]
+        self.per_chat[sub.chat_id] -= 1
+        if not self.per_chat[sub.chat_id]:
+            del self.per_chat[sub.chat_id]
+
+    def chat(self, chat_id):
+        return [sub for sub in self.by_ident.values() if sub.chat_id == chat_id]
+
+    def match(self, names, rows):
+        """([(subscription, [row ids])], subscriptions evaluated) for the
+        restocked `rows`. Subscriptions that fire are removed."""
+        fired = {}
+        evaluated = 0
+        for i in rows:
+            name = names[i]
+            if not name:
+                continue
+            candidates = [self.articles.get(name, ())]
+            candidates.extend(self.queries[gram] for gram in grams(name) if gram in self.queries)
+            for bucket in candidates:
+                evaluated += len(bucket)
+                for sub in bucket:
+                    if sub.matches(name):
+                        fired.setdefault(sub.ident, (sub, []))[1].append(i)
+        for sub, _ in fired.values():
+            self.discard(sub)
+        return list(fired.values()), evaluated
+
+
+def notification_text(index, rows):
+    lines = [f"• {index.rows[i].designation} — 💵 {index.rows[i].pu} DA" for i in rows[:MAX_LINES]]
+    if len(rows) > MAX_LINES:
+        lines.append(f"… et {len(rows) - MAX_LINES} autres")
+    return "🔔 De retour en stock :\n" + "\n".join(lines)
+
+
+class StockAlerts:
+    """Back-in-stock subscriptions for one bot.
+
+    Subscriptions are kept in SQLite and in a SubscriptionIndex. restocked()
+    is the inventory's on_restock hook: only the subscriptions the restocked
+    rows can match are evaluated, the ones that fire are dropped (they are
+    one-shot) and each chat gets one notification. A background task sends
+    them at `rate` messages per second, after deleting the fired
+    subscriptions in batches of `batch_size`.
+    """
+
+    def __init__(self, path=SUBSCRIPTIONS_FILE, rate=SEND_RATE, burst=SEND_BURST, batch_size=BATCH_SIZE,
+                 max_per_chat=MAX_PER_CHAT):
+        self.path = path
+        self.bucket = TokenBucket(rate, burst)
+        self.batch_size = batch_size
+        self.max_per_chat = max_per_chat
+        self.index = SubscriptionIndex()
+        self.stats = Counter()
+        self.bot = None
+        self.queue = None
+        self._task = None
+        self._local = threading.local()
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(SCHEMA)
+            self._local.db = db
+        return db
+
+    async def start(self, bot):
+        self.bot = bot
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+        subscriptions = await asyncio.to_thread(self.load)
+        for sub in subscriptions:
+            self.index.add(sub)
+        logger.info("%d back-in-stock subscriptions loaded", len(subscriptions))
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout=5):
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self.queue is not None and not self.queue.empty():
+            # Not deleted yet: these subscriptions load again on the next start
+            self.queue.get_nowait()
+            self.stats["unsent"] += 1
+        if self.stats["unsent"]:
+            logger.warning("%d back-in-stock notifications not sent", self.stats["unsent"])
+        await asyncio.to_thread(self.close)
+
+    def close(self):
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+    # ---------- database, in worker threads ----------
+
+    def load(self):
+        return [Subscription(*row) for row in
+                self.db.execute("SELECT id, chat_id, kind, keyword, key FROM subscriptions ORDER BY id")]
+
+    def _insert(self, chat_id, kind, keyword, key):
+        with self.db:
+            cursor = self.db.execute(
+                "INSERT OR IGNORE INTO subscriptions (chat_id, kind, keyword, key, created_at) VALUES (?, ?, ?, ?, ?)",
+                (chat_id, kind, keyword, key, datetime.now().isoformat(timespec="seconds")))
+        return cursor.lastrowid if cursor.rowcount else None
+
+    def _delete(self, ids):
+        with self.db:
+            self.db.executemany("DELETE FROM subscriptions WHERE id = ?", ((sub_id,) for sub_id in ids))
+
+    # ---------- subscriptions ----------
+
+    async def subscribe(self, chat_id, kind, keyword, key):
+        """"added", "exists" or "full" (the chat has max_per_chat open)."""
+        keyword = keyword.lower()
+        key = normalize_query(key) if kind == QUERY else key.lower()
+        if self.index.get((chat_id, kind, keyword, key)) is not None:
+            return "exists"
+        if self.index.per_chat[chat_id] >= self.max_per_chat:
+            return "full"
+        sub_id = await asyncio.to_thread(self._insert, chat_id, kind, keyword, key)
+        if sub_id is None:
+            return "exists"
+        self.index.add(Subscription(sub_id, chat_id, kind, keyword, key))
+        self.stats["subscribed"] += 1
+        return "added"
+
+    def restocked(self, snapshot):
+        """on_restock hook: queue a notification per chat with fired subscriptions."""
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+        index = snapshot.index
+        t0 = time.perf_counter()
+        fired, evaluated = self.index.match(index.names, snapshot.restocked)
+        by_chat = defaultdict(list)
+        for sub, rows in fired:
+            by_chat[sub.chat_id].append((sub, rows))
+        for chat_id, subs in by_chat.items():
+            rows = list(dict.fromkeys(i for _, sub_rows in subs for i in sub_rows))
+            self.queue.put_nowait((chat_id, notification_text(index, rows), [sub.id for sub, _ in subs]))
+        self.stats["restocks"] += 1
+        self.stats["evaluated"] += evaluated
+        self.stats["fired"] += len(fired)
+        logger.info("Generation %d: %d rows back in stock, %d of %d subscriptions evaluated, %d fired in %.1f ms",
+                    snapshot.generation, len(snapshot.restocked), evaluated, len(self.index) + len(fired),
+                    len(fired), (time.perf_counter() - t0) * 1000)
+
+    # ---------- sender ----------
+
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            done = 0
+            try:
+                # Deleted before sending, so a crash never notifies twice
+                try:
+                    await asyncio.to_thread(self._delete, [sub_id for _, _, ids in batch for sub_id in ids])
+                except sqlite3.Error:
+                    logger.exception("Could not delete %d fired subscriptions", len(batch))
+                for chat_id, text, _ in batch:
+                    wait = self.bucket.reserve(time.monotonic())
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                    await self._send(chat_id, text)
+                    done += 1
+            finally:
+                self.stats["unsent"] += len(batch) - done
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _send(self, chat_id, text):
+        try:
+            await self.bot.send_message(chat_id, text)
+            self.stats["sent"] += 1
+        except Forbidden:
+            # Blocked by the user: the chat's other subscriptions go too
+            self.stats["blocked"] += 1
+            subs = self.index.chat(chat_id)
+            for sub in subs:
+                self.index.discard(sub)
+            await asyncio.to_thread(self._delete, [sub.id for sub in subs])
+        except TelegramError as e:
+            self.stats["failed"] += 1
+            logger.warning("Back-in-stock notification to %s failed: %r", chat_id, e)
@@ -0,0 +1,138 @@
+# ================== webhook.py ==================
+import asyncio
+import json
+import logging
+import signal
+from collections import Counter, deque
+from urllib.parse import urlsplit
+from telegram import Update
+from httpd import HTTPServer
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENT = 32  # updates processed at once across all chats
+
+
+def lane_key(update):
+    # Updates of one chat share a lane so ConversationHandler state sees
+    # them in order; updates without a chat or user get a lane of their own
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return ("user", update.effective_user.id)
+    return ("update", update.update_id)
+
+
+class ChatDispatcher:
+    """Processes updates concurrently across chats and in arrival order within one.
+
+    Each busy chat has a deque of pending updates drained by a single task;
+    the task ends as soon as its deque is empty, so idle chats cost nothing.
+    """
+
+    def __init__(self, process, max_concurrent=MAX_CONCURRENT):
+        self.process = process
+        self.slots = asyncio.Semaphore(max_concurrent)
+        self.lanes = {}
+        self.tasks = set()
+        self.stats = Counter()
+
+    def submit(self, update):
+        self.stats["received"] += 1
+        key = lane_key(update)
+        lane = self.lanes.get(key)
+        if lane is not None:
+            self.stats["queued_behind"] += 1
+            lane.append(update)
+            return
+        lane = self.lanes[key] = deque([update])
+        task = asyncio.create_task(self._drain(key, lane))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _drain(self, key, lane):
+        try:
+            while lane:
+                async with self.slots:
+                    try:
+                        await self.process(lane[0])
+                    except Exception:
+                        logger.exception("Update %s failed", lane[0].update_id)
+                        self.stats["errors"] += 1
+                lane.popleft()
+                self.stats["processed"] += 1
+        finally:
+            del self.lanes[key]
+
+    async def join(self):
+        while self.tasks:
+            await asyncio.wait(list(self.tasks))
+
+
+class WebhookServer:
+    """Accepts Telegram's webhook POSTs and hands the updates to a ChatDispatcher.
+
+    Telegram gets its 200 as soon as the update is queued, so a slow handler
+    never holds up delivery to other chats.
+    """
+
+    def __init__(self, bot, dispatcher, path="/", secret_token=None):
+        self.bot = bot
+        self.dispatcher = dispatcher
+        self.path = path
+        self.secret_token = secret_token
+
+    async def handle(self, request):
+        if request.path != self.path:
+            return 404, "text/plain", b"Not Found"
+        if request.method != "POST":
+            return 405, "text/plain", b"Method Not Allowed"
+        if self.secret_token and request.headers.get("x-telegram-bot-api-secret-token") != self.secret_token:
+            return 403, "text/plain", b"Forbidden"
+        try:
+            update = Update.de_json(json.loads(request.body), self.bot)
+        except Exception as e:
+            logger.warning("Rejected webhook payload: %r", e)
+            return 400, "text/plain", b"Bad Request"
+        if update is not None:
+            self.dispatcher.submit(update)
+        return 200, "text/plain", b"OK"
+
+
+async def run_webhook(app, webhook_url, listen="127.0.0.1", port=8443, secret_token=None,
+                      max_concurrent=MAX_CONCURRENT, stop_event=None):
+    """Webhook counterpart of app.run_polling(), with per-chat ordered concurrency.
+
+    Runs the same post_init/post_stop/post_shutdown hooks. Stops on SIGINT or
+    SIGTERM, or when `stop_event` is set.
+    """
+    stop_event = stop_event or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    await app.initialize()
+    if app.post_init:
+        await app.post_init(app)
+    await app.start()
+    dispatcher = ChatDispatcher(app.process_update, max_concurrent)
+    webhook = WebhookServer(app.bot, dispatcher, urlsplit(webhook_url).path or "/", secret_token)
+    server = await HTTPServer(webhook.handle, listen, port).start()
+    try:
+        await app.bot.set_webhook(webhook_url, secret_token=secret_token,
+                                  max_connections=min(max(max_concurrent, 1), 100), allowed_updates=Update.ALL_TYPES)
+        logger.info("Webhook listening on %s:%d for %s", listen, server.port, webhook_url)
+        await stop_event.wait()
+    finally:
+        await server.stop()
+        await dispatcher.join()
+        await app.stop()
+        if app.post_stop:
+            await app.post_stop(app)
+        await app.shutdown()
+        if app.post_shutdown:
+            await app.post_shutdown(app)
+        logger.info("Webhook stopped, dispatcher stats %s", dict(dispatcher.stats))
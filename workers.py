@@ -0,0 +1,158 @@
+# ================== workers.py ==================
+# One loader process and a bot worker per BOT_TOKENS entry:
+#   BOT_TOKENS=<token1>,<token2> python workers.py
+import asyncio
+import logging
+import os
+import signal
+import sys
+from config import (
+    BOT_ROLE,
+    BOT_TOKENS,
+    BOT_WORKER,
+    WEBHOOK_SECRET,
+    LOG_FILE,
+    SEARCH_EVENTS_FILE,
+    LOG_LEVEL,
+    LOG_LEVELS,
+    LOG_MAX_BYTES,
+    LOG_BACKUPS,
+    LOG_ROTATE_WHEN,
+    LOG_HTTP_SAMPLE,
+    SHARED_DIR,
+    STATS_SOCKET
+)
+
+logger = logging.getLogger(__name__)
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.py")
+RESTART_DELAY = 5   # seconds before a worker that exited is started again
+STOP_TIMEOUT = 20   # seconds a worker gets to flush and exit before it is killed
+
+
+def worker_path(path):
+    """bot.log -> bot.worker2.log in worker 2; processes never share a rotating file."""
+    if BOT_ROLE != "worker":
+        return path
+    base, ext = os.path.splitext(path)
+    return f"{base}.worker{BOT_WORKER}{ext}"
+
+
+class Supervisor:
+    """Runs `bot.py` once per token with BOT_ROLE=worker and restarts a worker
+    that exits until stop() is called."""
+
+    def __init__(self, tokens, restart_delay=RESTART_DELAY, command=None):
+        self.tokens = list(tokens)
+        self.restart_delay = restart_delay
+        self.command = command or [sys.executable, BOT_SCRIPT]
+        self.processes = {}
+        self.restarts = 0
+        self._tasks = []
+        self._stopping = False
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._watch(n, token)) for n, token in enumerate(self.tokens)]
+
+    async def stop(self, timeout=STOP_TIMEOUT):
+        self._stopping = True
+        for process in self.processes.values():
+            if process.returncode is None:
+                process.terminate()
+        for n, process in list(self.processes.items()):
+            try:
+                await asyncio.wait_for(process.wait(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Worker %d did not stop in %d s, killing it", n, timeout)
+                process.kill()
+                await process.wait()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _watch(self, n, token):
+        env = dict(os.environ, BOT_ROLE="worker", BOT_WORKER=str(n), BOT_TOKEN=token)
+        while not self._stopping:
+            process = self.processes[n] = await asyncio.create_subprocess_exec(*self.command, env=env)
+            logger.info("Started worker %d (pid %d)", n, process.pid)
+            code = await process.wait()
+            if self._stopping:
+                return
+            self.restarts += 1
+            logger.warning("Worker %d exited with %s, restarting in %d s", n, code, self.restart_delay)
+            await asyncio.sleep(self.restart_delay)
+
+
+async def run_loader(tokens, stop_event=None):
+    """Owns the CSV, brands.txt and the search store for all workers.
+
+    Every inventory generation (full reload, deltas or brand retag) is
+    published to SHARED_DIR for the workers to map, and their search events
+    come in over STATS_SOCKET into the one SearchStatsWriter. Stops on
+    SIGINT or SIGTERM, or when `stop_event` is set.
+    """
+    import handlers
+    from inventory_cache import CHECK_INTERVAL
+    from shared_inventory import SnapshotPublisher
+    from stats_relay import StatsRelay
+
+    stop_event = stop_event or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    handlers.inventory_cache.publish = SnapshotPublisher(SHARED_DIR).publish
+    # Each worker notifies its own subscribers from the published snapshots
+    handlers.inventory_cache.on_restock = None
+    handlers.stats_writer.start()
+    handlers.brands.start()
+    handlers.report_builder.start()
+    relay = await StatsRelay(handlers.stats_writer, STATS_SOCKET).start()
+    supervisor = Supervisor(tokens)
+    try:
+        await handlers.inventory_cache.refresh()
+        supervisor.start()
+        while not stop_event.is_set():
+            # Reloads, deltas and retags happen here, each one published
+            await handlers.inventory_cache.get()
+            try:
+                await asyncio.wait_for(stop_event.wait(), CHECK_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        # Workers send their queued searches before the relay goes away
+        await supervisor.stop()
+        await relay.stop()
+        await handlers.stats_writer.stop()
+        await handlers.brands.stop()
+        await handlers.report_builder.stop()
+        logger.info("Loader stopped, %d searches relayed, %d worker restarts, inventory stats %s",
+                    relay.received, supervisor.restarts, dict(handlers.inventory_cache.stats))
+
+
+def main():
+    from logsetup import setup_logging, parse_levels
+
+    tokens = [token for token in BOT_TOKENS if token]
+    if not tokens or len(set(tokens)) != len(tokens):
+        sys.exit("workers.py needs BOT_TOKENS (or BOT_TOKEN): one distinct token per worker")
+    setup_logging(
+        log_file=LOG_FILE,
+        events_file=SEARCH_EVENTS_FILE,
+        level=LOG_LEVEL,
+        levels=parse_levels(LOG_LEVELS),
+        http_sample=LOG_HTTP_SAMPLE,
+        max_bytes=LOG_MAX_BYTES,
+        when=LOG_ROTATE_WHEN,
+        backups=LOG_BACKUPS,
+        secrets=tokens + [WEBHOOK_SECRET]
+    )
+    logging.info("Loader started for %d workers...", len(tokens))
+    asyncio.run(run_loader(tokens))
+
+
+if __name__ == "__main__":
+    main()